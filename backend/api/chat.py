@@ -4,23 +4,33 @@ Handles chat messages with emotion detection, anxiety classification, and crisis
 Now with database persistence!
 """
 
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, Dict, List
 from datetime import datetime
 from sqlalchemy.orm import Session
+import asyncio
+import json
 import uuid
 
 from nlp import (
     get_emotion_detector,
     get_anxiety_classifier,
     get_crisis_detector,
-    get_context_manager
+    get_context_manager,
+    get_analysis_pipeline,
+    InferenceOverloaded
 )
-from database import get_db, User, Conversation, Message as DBMessage
+from database import get_db, get_job_queue, get_message_writer, JobDeferred, User, Conversation, Message as DBMessage
+from journal import get_reflection_scheduler
+from ordering import get_conversation_sequencer
 
 router = APIRouter()
 
+# Durable job type for background analysis and persistence (see worker.py)
+ANALYZE_MESSAGE_JOB = "analyze_message"
+
 # Request/Response Models
 class ChatRequest(BaseModel):
     """Chat message request"""
@@ -58,70 +68,98 @@ def get_nlp_modules():
     
     return _emotion_detector, _anxiety_classifier, _crisis_detector, _context_manager
 
+async def _prepare_chat_turn(request: ChatRequest, db: Session) -> Dict:
+    """
+    Shared fast-path setup for the chat endpoints
+    
+    Creates the user/conversation if needed, loads the context, runs the
+    synchronous crisis prescreen and reserves the message's place in the
+    conversation's analysis job order. Database work runs in a thread so
+    the event loop keeps serving other chats.
+    
+    Returns:
+        Dictionary with conversation_id, job_id, history, crisis_prescreen
+        and the placeholder analysis used for the prompt
+    """
+    conversation_id, context = await asyncio.to_thread(_load_conversation, request, db)
+    
+    # Synchronous crisis prescreen (compiled keyword scan, sub-millisecond budget)
+    # so the first response to a crisis message is generated with crisis context
+    crisis_prescreen = get_crisis_detector().prescreen(request.message)
+    
+    # Reserve this message's place in the conversation's analysis order
+    job_id = await asyncio.to_thread(get_job_queue().reserve, ANALYZE_MESSAGE_JOB, conversation_id)
+    
+    return {
+        "conversation_id": conversation_id,
+        "job_id": job_id,
+        "history": context.get_recent_messages(),
+        "summary": context.summary,
+        "crisis_prescreen": crisis_prescreen,
+        # Temporary placeholder emotion/anxiety for the prompt (we refine this later in background)
+        # This avoids waiting for the heavy BERT/BART models
+        "emotion": {"primary_emotion": "neutral"},
+        "anxiety": {"severity": "none"}
+    }
+
+def _load_conversation(request: ChatRequest, db: Session):
+    """Create the user/conversation if needed and load its context (blocking; runs in a thread)"""
+    # Get NLP modules (lazy load if needed)
+    _, _, _, context_manager = get_nlp_modules()
+    
+    # Get or create user and conversation (Lightweight DB ops)
+    user = db.query(User).filter(User.id == request.user_id).first()
+    if not user:
+        user = User(id=request.user_id)
+        db.add(user)
+        db.flush() # flush instead of commit to keep transaction open if needed
+    
+    conversation_id = request.conversation_id or str(uuid.uuid4())
+    conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+    
+    if not conversation:
+        conversation = Conversation(id=conversation_id, user_id=request.user_id)
+        db.add(conversation)
+        db.commit()
+        db.refresh(conversation) # Get the clean state
+    
+    # Get context
+    context = context_manager.get_or_create_context(conversation_id, request.user_id, db)
+    return conversation_id, context
+
 @router.post("/", response_model=ChatResponse)
-async def chat(request: ChatRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def chat(request: ChatRequest, db: Session = Depends(get_db)):
     """
     Process a chat message with optimized performance:
     1. Generate AI response immediately
-    2. Perform NLP analysis and DB persistence in background
+    2. Queue a durable job for NLP analysis and DB persistence (run by a worker)
     """
+    turn = None
+    scheduled = False
     try:
-        # Get NLP modules (lazy load if needed)
-        _, _, _, context_manager = get_nlp_modules()
-        
-        # Get or create user and conversation (Lightweight DB ops)
-        user = db.query(User).filter(User.id == request.user_id).first()
-        if not user:
-            user = User(id=request.user_id)
-            db.add(user)
-            db.flush() # flush instead of commit to keep transaction open if needed
-        
-        conversation_id = request.conversation_id or str(uuid.uuid4())
-        conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
-        
-        if not conversation:
-            conversation = Conversation(id=conversation_id, user_id=request.user_id)
-            db.add(conversation)
-            db.commit()
-            db.refresh(conversation) # Get the clean state
-        
-        # Get context
-        context = context_manager.get_or_create_context(conversation_id, request.user_id)
+        turn = await _prepare_chat_turn(request, db)
+        conversation_id = turn["conversation_id"]
+        crisis_prescreen = turn["crisis_prescreen"]
         
         # --- FAST PATH: Generate Response ---
-        history = context.get_recent_messages()
-        
-        # Use a lightweight check for crisis/safety via simple keywords first if needed
-        # But for speed, we generate response directly 
         from nlp import get_gemini_chat
         gemini = get_gemini_chat()
-
-        # Temporary placeholder analysis for the prompt (we refine this later in background)
-        # This avoids waiting for the heavy BERT/BART models
-        temp_analysis = {
-            "emotion": {"primary_emotion": "neutral"},  
-            "anxiety": {"severity": "none"},
-            "crisis": {"crisis_detected": False}
-        }
         
         # Generate AI Response immediately
-        ai_response = gemini.generate_response(
+        ai_response = await gemini.generate_response_async(
             user_message=request.message,
-            emotion=temp_analysis["emotion"],
-            anxiety=temp_analysis["anxiety"],
-            crisis=temp_analysis["crisis"],
-            conversation_history=history
+            emotion=turn["emotion"],
+            anxiety=turn["anxiety"],
+            crisis=crisis_prescreen,
+            conversation_history=turn["history"],
+            conversation_summary=turn["summary"]
         )
         
-        # --- BACKGROUND TASKS: Heavy Analysis & Storage ---
-        background_tasks.add_task(
-            perform_background_analysis_and_save,
-            request.user_id,
-            conversation_id,
-            request.message,
-            ai_response,
-            db # Pass DB session or handle new session in task
+        # --- BACKGROUND JOB: Heavy Analysis & Storage (survives restarts) ---
+        await asyncio.to_thread(
+            _publish_analysis_job, turn["job_id"], request.user_id, conversation_id, request.message, ai_response
         )
+        scheduled = True
 
         # Return fast response
         return ChatResponse(
@@ -130,16 +168,123 @@ async def chat(request: ChatRequest, background_tasks: BackgroundTasks, db: Sess
             timestamp=datetime.now().isoformat(),
             sentiment={"label": "analyzing", "confidence": 0.0}, # Placeholder
             anxiety={"detected": False, "severity": "none"},
-            crisis={"detected": False, "severity": "none"}, 
+            crisis={"detected": crisis_prescreen["crisis_detected"], "severity": crisis_prescreen["severity"]},
             context_summary=None
         )
         
     except Exception as e:
         print(f"Error in chat endpoint: {str(e)}")
+        if turn is not None and not scheduled:
+            await asyncio.to_thread(get_job_queue().abandon, turn["job_id"])
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+def _publish_analysis_job(job_id: int, user_id: str, conversation_id: str, user_message: str, ai_response: str):
+    """Attach the finished turn to its reserved analysis job"""
+    get_job_queue().publish(job_id, ANALYZE_MESSAGE_JOB, {
+        # Stable across retries: the saved messages' ids derive from it
+        "turn_id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "conversation_id": conversation_id,
+        "user_message": user_message,
+        "ai_response": ai_response
+    })
+
+def _sse_event(data: Dict, event: Optional[str] = None) -> str:
+    """Format one server-sent event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@router.post("/stream")
+async def chat_stream(request: ChatRequest, db: Session = Depends(get_db)):
+    """
+    Streaming variant of the chat endpoint (server-sent events)
+    
+    Events:
+    - "meta": conversation_id and the crisis prescreen result
+    - default (no event name): {"delta": "..."} response text chunks
+    - "done": the full response text and timestamp
+    
+    The analysis job is published once the stream completes.
+    """
+    try:
+        turn = await _prepare_chat_turn(request, db)
+    except Exception as e:
+        print(f"Error in chat stream endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    
+    conversation_id = turn["conversation_id"]
+    crisis_prescreen = turn["crisis_prescreen"]
+    chunks: List[str] = []
+    state = {"completed": False}
+    
+    from nlp import get_gemini_chat
+    gemini = get_gemini_chat()
+    
+    async def event_stream():
+        try:
+            yield _sse_event({
+                "conversation_id": conversation_id,
+                "crisis": {"detected": crisis_prescreen["crisis_detected"], "severity": crisis_prescreen["severity"]}
+            }, event="meta")
+            
+            async for chunk in gemini.stream_response_async(
+                user_message=request.message,
+                emotion=turn["emotion"],
+                anxiety=turn["anxiety"],
+                crisis=crisis_prescreen,
+                conversation_history=turn["history"],
+                conversation_summary=turn["summary"]
+            ):
+                chunks.append(chunk)
+                yield _sse_event({"delta": chunk})
+            
+            await asyncio.to_thread(
+                _publish_analysis_job, turn["job_id"], request.user_id, conversation_id, request.message, "".join(chunks)
+            )
+            state["completed"] = True
+            yield _sse_event({
+                "conversation_id": conversation_id,
+                "response": "".join(chunks),
+                "timestamp": datetime.now().isoformat()
+            }, event="done")
+        finally:
+            if not state["completed"]:
+                # Client went away or generation failed: nothing will be persisted. Not awaited,
+                # so the reservation is still dropped when the stream task is being cancelled
+                asyncio.get_running_loop().run_in_executor(None, get_job_queue().abandon, turn["job_id"])
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-async def perform_background_analysis_and_save(user_id: str, conversation_id: str, user_message_content: str, ai_response_content: str, db: Session):
-    """Background task to run heavy NLP models and save to DB"""
+async def perform_background_analysis_and_save(
+    user_id: str,
+    conversation_id: str,
+    user_message_content: str,
+    ai_response_content: str,
+    db: Session,
+    ticket: Optional[int] = None,
+    turn_id: Optional[str] = None
+):
+    """
+    Job handler that runs the heavy NLP models and saves to DB
+    
+    Runs from the analysis job worker (see worker.py). The job queue hands
+    out one job per conversation at a time in arrival order, and within a
+    worker process context and database writes for one conversation are
+    also serialized. Emotion/anxiety results are None when their stage
+    timed out or failed; the messages are then saved with crisis detection
+    only. When inference is overloaded the job is deferred (JobDeferred)
+    rather than saved without model results. Errors are re-raised so the
+    job is retried; with a turn_id the turn is added to the context and
+    saved to the database at most once across retries.
+    """
+    sequencer = get_conversation_sequencer()
+    if ticket is None:
+        ticket = sequencer.reserve(conversation_id)
+    entered_turn = False
     try:
         # Re-acquire separate DB session if needed, but for now we reuse passed logic
         # Ideally create new session for background task to avoid async issues
@@ -147,72 +292,69 @@ async def perform_background_analysis_and_save(user_id: str, conversation_id: st
         
         # Get NLP modules
         emotion_detector, anxiety_classifier, crisis_detector, context_manager = get_nlp_modules()
-        context = context_manager.get_or_create_context(conversation_id, user_id)
-
-        # 1. Heavy NLP Analysis
-        emotion_result = emotion_detector.detect_emotion(user_message_content, top_k=3)
-        anxiety_result = anxiety_classifier.detect_anxiety(user_message_content)
-        crisis_result = crisis_detector.detect_crisis(user_message_content)
-        
-        # 2. Save User Message
-        user_msg_db = DBMessage(
-            conversation_id=conversation_id,
-            role="user",
-            content=user_message_content,
-            emotion=emotion_result["primary_emotion"],
-            emotion_confidence=emotion_result["confidence"],
-            emotion_details=emotion_result,
-            anxiety_detected=anxiety_result["anxiety_detected"],
-            anxiety_severity=anxiety_result["severity"],
-            anxiety_confidence=anxiety_result["confidence"],
-            crisis_detected=crisis_result["crisis_detected"],
-            crisis_severity=crisis_result["severity"],
-            crisis_keywords=crisis_result.get("keywords_found", [])
-        )
-        db.add(user_msg_db)
-        
-        # 3. Add to Context
-        context.add_message(
-            role="user",
-            content=user_message_content,
-            emotion=emotion_result,
-            anxiety=anxiety_result,
-            crisis=crisis_result
-        )
-        
-        # 4. Save AI Response
-        ai_msg_db = DBMessage(
-            conversation_id=conversation_id,
-            role="assistant",
-            content=ai_response_content
-        )
-        db.add(ai_msg_db)
-        context.add_message(role="assistant", content=ai_response_content)
 
-        # 5. Update Conversation Stats
-        conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
-        if conversation:
-            conversation.message_count += 2
-            conversation.updated_at = datetime.utcnow()
-            conversation.dominant_emotion = emotion_result["primary_emotion"]
-            conversation.average_anxiety_level = anxiety_result["severity"]
-            if crisis_result["crisis_detected"]:
-                conversation.crisis_detected = True
+        # 1. Heavy NLP Analysis: one pipeline pass (shared preprocessing, crisis alongside
+        # the emotion -> anxiety chain, per-stage timeouts); deferred under backpressure
+        try:
+            analysis = await get_analysis_pipeline().analyze(user_message_content)
+        except InferenceOverloaded as e:
+            raise JobDeferred(str(e)) from e
         
-        db.commit()
+        # Writes for this conversation are applied in message order
+        async with sequencer.turn(conversation_id, ticket):
+            entered_turn = True
+            context = context_manager.get_or_create_context(conversation_id, user_id, db)
+            
+            # 2. Add to Context (once: a retried job finds its turn already applied)
+            if turn_id is None or context.last_turn_id != turn_id:
+                context.add_message(
+                    role="user",
+                    content=user_message_content,
+                    emotion=analysis.emotion,
+                    anxiety=analysis.anxiety,
+                    crisis=analysis.crisis
+                )
+                context.add_message(role="assistant", content=ai_response_content)
+                context.last_turn_id = turn_id
+                context_manager.save_context(context)
+            message_count = context.message_count
+            
+            # 3. Queue both messages and the conversation stats update for the
+            # write-behind buffer (batched insert, atomic message_count increment)
+            saved = get_message_writer().submit(
+                conversation_id,
+                {
+                    "content": user_message_content,
+                    "emotion": analysis.primary_emotion,
+                    "emotion_confidence": analysis.emotion_confidence,
+                    "emotion_details": analysis.emotion,
+                    "anxiety_detected": analysis.anxiety_detected,
+                    "anxiety_severity": analysis.anxiety_severity,
+                    "anxiety_confidence": analysis.anxiety_confidence,
+                    "crisis_detected": analysis.crisis_detected,
+                    "crisis_severity": analysis.crisis_severity,
+                    "crisis_keywords": analysis.crisis_keywords
+                },
+                {"content": ai_response_content},
+                turn_id=turn_id
+            )
         
-        # 6. Auto-Reflection check
-        if conversation and conversation.message_count >= 3:
-             try:
-                from .journal import auto_generate_reflection
-                auto_generate_reflection(user_id=user_id, conversation_id=conversation_id, db=db)
-             except Exception as e:
-                print(f"Auto-reflection error: {e}")
+        # 4. Auto-Reflection: mark the conversation dirty; the scheduler regenerates
+        # once it goes idle (reads the messages back, so wait for the flush first)
+        if not await asyncio.wrap_future(saved):
+            raise RuntimeError("messages could not be saved")
+        if message_count >= 3:
+            get_reflection_scheduler().mark_dirty(user_id, conversation_id, new_messages=2)
 
+    except JobDeferred:
+        raise  # Rescheduled by the worker, nothing written yet
     except Exception as e:
         print(f"Background analysis failed: {e}")
         db.rollback()
+        raise  # Let the job queue retry
     finally:
+        if not entered_turn:
+            await sequencer.abandon(conversation_id, ticket)
         db.close()
 
 def generate_ai_response(
@@ -249,7 +391,8 @@ def generate_ai_response(
         emotion=emotion,
         anxiety=anxiety,
         crisis=crisis,
-        conversation_history=history
+        conversation_history=history,
+        conversation_summary=context.summary
     )
     
     return response
@@ -28,6 +28,22 @@ class Settings(BaseSettings):
     GEMINI_API_KEY: str = ""
     OPENAI_API_KEY: str = ""
     
+    # Gemini client: optional REST endpoint override (e.g. a local stub server)
+    # and the maximum number of concurrent in-flight requests per worker
+    GEMINI_API_ENDPOINT: str = ""
+    GEMINI_MAX_CONCURRENCY: int = 256
+    
+    # Gemini resilience: hard per-call deadline, circuit breaker, and optional
+    # hedged mode that serves the local fallback after GEMINI_HEDGE_SECONDS (0 = off)
+    GEMINI_TIMEOUT_SECONDS: float = 15.0
+    GEMINI_BREAKER_FAILURES: int = 5
+    GEMINI_BREAKER_RESET_SECONDS: float = 30.0
+    GEMINI_HEDGE_SECONDS: float = 0.0
+    
+    # Prompt size: input token budget (estimated) and per-turn cap for history
+    GEMINI_INPUT_TOKEN_BUDGET: int = 1200
+    GEMINI_MAX_TURN_TOKENS: int = 200
+    
     # CORS
     ALLOWED_ORIGINS: List[str] = ["http://localhost:3000", "http://localhost:3001"]
     
@@ -35,6 +51,91 @@ class Settings(BaseSettings):
     EMOTION_MODEL_PATH: str = "./models/emotion_model"
     ANXIETY_MODEL_PATH: str = "./models/anxiety_model"
     
+    # Emotion inference backend: "torch" (fp32) or "onnx" (int8 ONNX Runtime, cached under EMOTION_MODEL_PATH)
+    EMOTION_BACKEND: str = "torch"
+    
+    # Inference Batching
+    BATCH_MAX_SIZE: int = 32
+    BATCH_MAX_WAIT_MS: float = 10.0
+    
+    # Inference executor: model worker threads, bounded submission queue, and the
+    # queue fill ratio above which background analysis is deferred
+    INFERENCE_WORKERS: int = 2
+    INFERENCE_MAX_QUEUE: int = 64
+    INFERENCE_SHED_THRESHOLD: float = 0.8
+    
+    # Per-stage timeouts for background message analysis
+    ANALYSIS_EMOTION_TIMEOUT_SECONDS: float = 10.0
+    ANALYSIS_ANXIETY_TIMEOUT_SECONDS: float = 10.0
+    ANALYSIS_CRISIS_TIMEOUT_SECONDS: float = 2.0
+    
+    # Tokenize each message once for both models when their vocabularies match
+    ANALYSIS_SHARED_TOKENIZATION: bool = True
+    
+    # Anxiety zero-shot scoring: "pipeline", "batched" or "compare"
+    ANXIETY_SCORING_MODE: str = "batched"
+    ANXIETY_MAX_PAIRS_PER_PASS: int = 256
+    
+    # Anxiety model weight precision: "fp32", "int8" or "bf16"
+    ANXIETY_MODEL_PRECISION: str = "fp32"
+    ANXIETY_PRECISION_REPORT: bool = False
+    
+    # Anxiety cascade gating (zero-shot model runs only inside [LOW, HIGH))
+    ANXIETY_CASCADE_ENABLED: bool = True
+    ANXIETY_CASCADE_LOW: float = 0.15
+    ANXIETY_CASCADE_HIGH: float = 0.75
+    
+    # NLP Result Cache (in-process LRU + optional shared SQLite tier)
+    NLP_CACHE_ENABLED: bool = True
+    NLP_CACHE_MAX_ENTRIES: int = 10000
+    NLP_CACHE_TTL_SECONDS: float = 86400
+    NLP_CACHE_DB_PATH: str = ""
+    
+    # Conversation context store limits
+    CONTEXT_MAX_ENTRIES: int = 1000
+    CONTEXT_IDLE_TTL_SECONDS: float = 3600
+    CONTEXT_MAX_BYTES: int = 64 * 1024 * 1024
+    # Emotion/anxiety/crisis history entries kept per conversation (0 = complete history)
+    CONTEXT_HISTORY_CAPACITY: int = 0
+    CONTEXT_REHYDRATE_MESSAGES: int = 50
+    CONTEXT_WINDOW_SIZE: int = 10
+    CONTEXT_SUMMARY_MAX_CHARS: int = 800
+    
+    # Conversation context backend: "memory" (per worker) or "sqlite" (shared by all workers)
+    CONTEXT_BACKEND: str = "memory"
+    CONTEXT_DB_PATH: str = "./data/contexts.db"
+    
+    # Per-conversation write ordering for background analysis
+    CONVERSATION_ORDER_TIMEOUT_SECONDS: float = 30.0
+    
+    # Write-behind persistence of analyzed messages: flush interval and batch size (rows)
+    WRITE_BEHIND_FLUSH_MS: float = 50.0
+    WRITE_BEHIND_MAX_ROWS: int = 200
+    
+    # Durable analysis job queue: table in the main database, or a separate
+    # database (e.g. "sqlite:///./data/jobs.db") via JOB_QUEUE_DATABASE_URL
+    JOB_QUEUE_DATABASE_URL: str = ""
+    JOB_VISIBILITY_TIMEOUT_SECONDS: float = 60.0
+    JOB_MAX_ATTEMPTS: int = 5
+    JOB_RETRY_BASE_SECONDS: float = 2.0
+    JOB_RESERVE_TIMEOUT_SECONDS: float = 120.0
+    # Delay before a job deferred under inference backpressure is retried (not counted as an attempt)
+    JOB_DEFER_SECONDS: float = 5.0
+    
+    # Analysis job worker: max jobs in flight, idle poll interval, and whether the
+    # API process runs a worker itself (disable when running worker.py separately)
+    JOB_WORKER_BATCH_SIZE: int = 16
+    JOB_WORKER_POLL_SECONDS: float = 0.5
+    JOB_WORKER_EMBEDDED: bool = True
+    
+    # Auto-reflections: regenerate after the conversation has been idle this long,
+    # or right away once this many new messages are pending
+    REFLECTION_IDLE_SECONDS: float = 30.0
+    REFLECTION_MAX_PENDING_MESSAGES: int = 10
+    
+    # Synchronous crisis prescreen in the chat fast path
+    CRISIS_PRESCREEN_BUDGET_MS: float = 1.0
+    
     # Crisis Resources
     CRISIS_HOTLINE_US: str = "988"
     CRISIS_HOTLINE_TEXT: str = "741741"
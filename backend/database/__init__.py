@@ -3,8 +3,10 @@ Database Package
 SQLAlchemy models and connection management
 """
 
-from .models import Base, User, Conversation, Message, Reflection, Insight
+from .models import Base, User, Conversation, Message, Reflection, Insight, AnalysisJob
 from .connection import engine, SessionLocal, get_db, init_db, test_connection
+from .write_behind import MessageWriter, get_message_writer, shutdown_message_writer
+from .job_queue import JobDeferred, JobQueue, get_job_queue
 
 __all__ = [
     "Base",
@@ -13,9 +15,16 @@ __all__ = [
     "Message",
     "Reflection",
     "Insight",
+    "AnalysisJob",
     "engine",
     "SessionLocal",
     "get_db",
     "init_db",
-    "test_connection"
+    "test_connection",
+    "MessageWriter",
+    "get_message_writer",
+    "shutdown_message_writer",
+    "JobDeferred",
+    "JobQueue",
+    "get_job_queue"
 ]
@@ -0,0 +1,381 @@
+"""
+Durable Job Queue
+Outbox table of analysis jobs claimed by workers with SKIP LOCKED semantics
+"""
+
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import create_engine, delete, event, exists, func, select, update
+from sqlalchemy.orm import Session, aliased, sessionmaker
+
+from config import settings
+from metrics import register_stats
+
+from .connection import SessionLocal
+from .models import AnalysisJob
+
+
+class JobDeferred(Exception):
+    """Raised by a job handler to run the job again later without using up an attempt"""
+    
+    def __init__(self, reason: str, delay_seconds: Optional[float] = None):
+        super().__init__(reason)
+        self.delay_seconds = delay_seconds
+
+
+class JobQueue:
+    """
+    Database-backed job queue with per-conversation ordering
+    
+    The chat endpoint reserves a job when a message arrives (fixing its
+    place in the conversation's order), publishes the payload once the
+    reply is generated, or abandons the reservation if generation fails.
+    
+    Workers claim batches with one UPDATE whose candidate subquery uses
+    FOR UPDATE SKIP LOCKED, so concurrent workers on Postgres never claim
+    the same row; SQLite has a single writer, which gives the same
+    guarantee. A job is only claimable when no earlier job of the same
+    conversation is still unfinished, so each conversation is processed
+    in arrival order, one job at a time.
+    
+    A claim hides the job for visibility_timeout_seconds. If the worker
+    dies, the job becomes claimable again once that passes. Failures are
+    retried with exponential backoff until max_attempts, then the job is
+    marked failed. A handler that cannot run the job right now (e.g. the
+    models are overloaded) defers it, which reschedules it without using
+    up an attempt. Completed jobs are deleted.
+    """
+    
+    # Jobs that hold back later jobs of the same conversation
+    _UNFINISHED = ("reserved", "pending", "running")
+    
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        visibility_timeout_seconds: float = 60.0,
+        max_attempts: int = 5,
+        retry_base_seconds: float = 2.0,
+        reserve_timeout_seconds: float = 120.0,
+        defer_seconds: float = 5.0
+    ):
+        """
+        Initialize the queue
+        
+        Args:
+            session_factory: Creates sessions bound to the database holding analysis_jobs
+            visibility_timeout_seconds: Time a claimed job stays hidden from other workers
+            max_attempts: Attempts before a job is marked failed
+            retry_base_seconds: Backoff before the first retry (doubles per attempt)
+            reserve_timeout_seconds: Time after which an unpublished reservation is dropped
+            defer_seconds: Default delay before a deferred job is claimable again
+        """
+        self.session_factory = session_factory
+        self.visibility_timeout = timedelta(seconds=visibility_timeout_seconds)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base_seconds = retry_base_seconds
+        self.reserve_timeout = timedelta(seconds=reserve_timeout_seconds)
+        self.defer_seconds = defer_seconds
+        
+        # Stats
+        self.reserved = 0
+        self.published = 0
+        self.abandoned = 0
+        self.claimed = 0
+        self.completed = 0
+        self.retried = 0
+        self.deferred = 0
+        self.failed = 0
+        self.expired_reservations = 0
+        self.lost_claims = 0
+    
+    def reserve(self, kind: str, conversation_id: str) -> int:
+        """
+        Reserve a job slot in the conversation's order
+        
+        Args:
+            kind: Job type
+            conversation_id: Conversation the job belongs to
+        
+        Returns:
+            Job ID to pass to publish() or abandon()
+        """
+        with self.session_factory() as session:
+            job = AnalysisJob(
+                kind=kind,
+                conversation_id=conversation_id,
+                status="reserved",
+                available_at=datetime.utcnow() + self.reserve_timeout
+            )
+            session.add(job)
+            session.commit()
+            self.reserved += 1
+            return job.id
+    
+    def publish(self, job_id: int, kind: str, payload: Dict):
+        """
+        Attach the payload to a reserved job and make it claimable
+        
+        If the reservation already expired (and was dropped by claim()), the
+        job is re-created at the end of the conversation's order rather than
+        lost.
+        
+        Args:
+            job_id: Job ID from reserve()
+            kind: Job type (the one passed to reserve())
+            payload: JSON-serializable job arguments
+        """
+        with self.session_factory() as session:
+            updated = session.execute(
+                update(AnalysisJob)
+                .where(AnalysisJob.id == job_id, AnalysisJob.status == "reserved")
+                .values(payload=payload, status="pending", available_at=datetime.utcnow())
+            ).rowcount
+            if not updated:
+                print(f"Job {job_id}: reservation expired, re-queueing")
+                session.add(AnalysisJob(
+                    kind=kind,
+                    conversation_id=payload["conversation_id"],
+                    payload=payload,
+                    status="pending",
+                    available_at=datetime.utcnow()
+                ))
+                self.expired_reservations += 1
+            session.commit()
+        self.published += 1
+    
+    def abandon(self, job_id: int):
+        """Drop a reserved job that will never be published"""
+        with self.session_factory() as session:
+            session.execute(
+                delete(AnalysisJob).where(AnalysisJob.id == job_id, AnalysisJob.status == "reserved")
+            )
+            session.commit()
+        self.abandoned += 1
+    
+    def claim(self, limit: int = 16) -> List[Dict]:
+        """
+        Claim up to limit due jobs for this worker
+        
+        Args:
+            limit: Maximum number of jobs to claim
+        
+        Returns:
+            Claimed jobs as dicts with id, kind, conversation_id, payload, attempts and claim_token
+        """
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        
+        with self.session_factory() as session:
+            # Housekeeping: drop stale reservations, fail abandoned jobs that used up their attempts
+            expired = session.execute(
+                delete(AnalysisJob).where(AnalysisJob.status == "reserved", AnalysisJob.available_at <= now)
+            ).rowcount
+            exhausted = session.execute(
+                update(AnalysisJob)
+                .where(
+                    AnalysisJob.status == "running",
+                    AnalysisJob.available_at <= now,
+                    AnalysisJob.attempts >= self.max_attempts
+                )
+                .values(status="failed", last_error="visibility timeout on final attempt")
+            ).rowcount
+            
+            earlier = aliased(AnalysisJob)
+            blocked = exists().where(
+                earlier.conversation_id == AnalysisJob.conversation_id,
+                earlier.id < AnalysisJob.id,
+                earlier.status.in_(self._UNFINISHED)
+            )
+            candidates = (
+                select(AnalysisJob.id)
+                .where(
+                    AnalysisJob.status.in_(("pending", "running")),
+                    AnalysisJob.available_at <= now,
+                    ~blocked
+                )
+                .order_by(AnalysisJob.id)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            )
+            session.execute(
+                update(AnalysisJob)
+                .where(AnalysisJob.id.in_(candidates))
+                .values(
+                    status="running",
+                    claim_token=token,
+                    attempts=AnalysisJob.attempts + 1,
+                    available_at=now + self.visibility_timeout
+                )
+                .execution_options(synchronize_session=False)
+            )
+            session.commit()
+            
+            rows = session.execute(
+                select(AnalysisJob).where(AnalysisJob.claim_token == token).order_by(AnalysisJob.id)
+            ).scalars().all()
+            jobs = [
+                {
+                    "id": job.id,
+                    "kind": job.kind,
+                    "conversation_id": job.conversation_id,
+                    "payload": job.payload,
+                    "attempts": job.attempts,
+                    "claim_token": token
+                }
+                for job in rows
+            ]
+        
+        self.expired_reservations += expired
+        self.failed += exhausted
+        self.claimed += len(jobs)
+        return jobs
+    
+    def complete(self, job: Dict):
+        """Delete a finished job (ignored if another worker has since re-claimed it)"""
+        with self.session_factory() as session:
+            removed = session.execute(
+                delete(AnalysisJob).where(
+                    AnalysisJob.id == job["id"],
+                    AnalysisJob.claim_token == job["claim_token"]
+                )
+            ).rowcount
+            session.commit()
+        if removed:
+            self.completed += 1
+        else:
+            self.lost_claims += 1
+            print(f"Job {job['id']}: claim expired before completion")
+    
+    def fail(self, job: Dict, error: str):
+        """
+        Record a failed attempt: schedule a retry, or mark the job failed after max_attempts
+        
+        Args:
+            job: Claimed job
+            error: Error description stored on the job
+        """
+        final = job["attempts"] >= self.max_attempts
+        values = {"claim_token": None, "last_error": error[:2000]}
+        if final:
+            values["status"] = "failed"
+        else:
+            backoff = self.retry_base_seconds * (2 ** (job["attempts"] - 1))
+            values["status"] = "pending"
+            values["available_at"] = datetime.utcnow() + timedelta(seconds=backoff)
+        
+        with self.session_factory() as session:
+            updated = session.execute(
+                update(AnalysisJob)
+                .where(
+                    AnalysisJob.id == job["id"],
+                    AnalysisJob.claim_token == job["claim_token"]
+                )
+                .values(**values)
+            ).rowcount
+            session.commit()
+        
+        if not updated:
+            self.lost_claims += 1
+        elif final:
+            self.failed += 1
+            print(f"Job {job['id']} failed permanently after {job['attempts']} attempts: {error}")
+        else:
+            self.retried += 1
+    
+    def defer(self, job: Dict, delay_seconds: Optional[float] = None):
+        """
+        Put a claimed job back without counting the attempt
+        
+        Args:
+            job: Claimed job
+            delay_seconds: Time before it is claimable again (default: defer_seconds)
+        """
+        delay = self.defer_seconds if delay_seconds is None else delay_seconds
+        with self.session_factory() as session:
+            updated = session.execute(
+                update(AnalysisJob)
+                .where(
+                    AnalysisJob.id == job["id"],
+                    AnalysisJob.claim_token == job["claim_token"]
+                )
+                .values(
+                    status="pending",
+                    claim_token=None,
+                    attempts=AnalysisJob.attempts - 1,
+                    available_at=datetime.utcnow() + timedelta(seconds=delay)
+                )
+            ).rowcount
+            session.commit()
+        if updated:
+            self.deferred += 1
+        else:
+            self.lost_claims += 1
+    
+    def get_stats(self) -> Dict:
+        """
+        Get queue statistics
+        
+        Returns:
+            Dictionary with job counts by status and this process's counters
+        """
+        stats = {
+            "reserved": self.reserved,
+            "published": self.published,
+            "abandoned": self.abandoned,
+            "claimed": self.claimed,
+            "completed": self.completed,
+            "retried": self.retried,
+            "deferred": self.deferred,
+            "failed": self.failed,
+            "expired_reservations": self.expired_reservations,
+            "lost_claims": self.lost_claims
+        }
+        try:
+            with self.session_factory() as session:
+                counts = session.execute(
+                    select(AnalysisJob.status, func.count()).group_by(AnalysisJob.status)
+                ).all()
+            stats["jobs_by_status"] = {status: count for status, count in counts}
+        except Exception as e:
+            stats["jobs_by_status"] = {"error": str(e)}
+        return stats
+
+
+def _queue_session_factory() -> Callable[[], Session]:
+    """Session factory for the queue: the main database, or a separate one from JOB_QUEUE_DATABASE_URL"""
+    if not settings.JOB_QUEUE_DATABASE_URL:
+        return SessionLocal
+    
+    url = settings.JOB_QUEUE_DATABASE_URL
+    if url.startswith("sqlite"):
+        queue_engine = create_engine(url, connect_args={"check_same_thread": False, "timeout": 30})
+        
+        @event.listens_for(queue_engine, "connect")
+        def _enable_wal(dbapi_connection, _):
+            dbapi_connection.execute("PRAGMA journal_mode=WAL")
+    else:
+        queue_engine = create_engine(url)
+    
+    AnalysisJob.__table__.create(bind=queue_engine, checkfirst=True)
+    return sessionmaker(autocommit=False, autoflush=False, bind=queue_engine)
+
+
+# Singleton instance
+_job_queue = None
+
+def get_job_queue() -> JobQueue:
+    """Get or create the analysis job queue singleton"""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(
+            session_factory=_queue_session_factory(),
+            visibility_timeout_seconds=settings.JOB_VISIBILITY_TIMEOUT_SECONDS,
+            max_attempts=settings.JOB_MAX_ATTEMPTS,
+            retry_base_seconds=settings.JOB_RETRY_BASE_SECONDS,
+            reserve_timeout_seconds=settings.JOB_RESERVE_TIMEOUT_SECONDS,
+            defer_seconds=settings.JOB_DEFER_SECONDS
+        )
+        register_stats("job_queue", _job_queue.get_stats)
+    return _job_queue
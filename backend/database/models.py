@@ -3,7 +3,7 @@ Database Models for Serenia
 SQLAlchemy ORM models for conversations, messages, reflections, and insights
 """
 
-from sqlalchemy import Column, String, Integer, Float, DateTime, Boolean, Text, JSON, ForeignKey
+from sqlalchemy import Column, String, Integer, Float, DateTime, Boolean, Text, JSON, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -73,6 +73,11 @@ class Message(Base):
     
     # Relationships
     conversation = relationship("Conversation", back_populates="messages")
+    
+    # Recent-history lookups (context rehydration) filter by conversation and order by time
+    __table_args__ = (
+        Index("ix_messages_conversation_id_timestamp", "conversation_id", "timestamp"),
+    )
 
 class Reflection(Base):
     """AI-generated reflection model"""
@@ -138,3 +143,31 @@ class Insight(Base):
     
     # Note: No direct relationship to User to keep it simple
     # We'll query by user_id
+
+class AnalysisJob(Base):
+    """Durable background job (outbox row) for message analysis and persistence"""
+    __tablename__ = "analysis_jobs"
+    
+    # Autoincrement id doubles as the per-conversation processing order
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String, nullable=False)
+    conversation_id = Column(String, nullable=False)  # No foreign key: the queue may live in its own database
+    payload = Column(JSON, nullable=True)
+    
+    # 'reserved' (waiting for its payload), 'pending', 'running' or 'failed'
+    status = Column(String, nullable=False, default="reserved")
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow)  # Retry time / visibility deadline
+    claim_token = Column(String, nullable=True)
+    last_error = Column(Text, nullable=True)
+    
+    # Timestamps
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Claims scan by status and due time; ordering checks look up earlier jobs per conversation
+    __table_args__ = (
+        Index("ix_analysis_jobs_status_available_at", "status", "available_at"),
+        Index("ix_analysis_jobs_conversation_id_id", "conversation_id", "id"),
+        Index("ix_analysis_jobs_claim_token", "claim_token"),
+    )
@@ -0,0 +1,358 @@
+"""
+Write-Behind Message Persistence
+Buffers analyzed chat turns and writes them to the database in batched transactions
+"""
+
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import Boolean, bindparam, func, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from config import settings
+from metrics import LatencyTracker, register_stats
+
+from .connection import SessionLocal
+from .models import Conversation, Message, generate_uuid
+
+
+def _message_row_template() -> Dict:
+    """Every message column with its scalar default (None if it has none)"""
+    return {
+        column.name: column.default.arg if column.default is not None and column.default.is_scalar else None
+        for column in Message.__table__.columns
+    }
+
+
+# One executemany UPDATE applies every conversation's folded stats
+_STATS_UPDATE = (
+    update(Conversation)
+    .where(Conversation.id == bindparam("b_id"))
+    .values(
+        message_count=func.coalesce(Conversation.message_count, 0) + bindparam("b_count"),
+        updated_at=bindparam("b_now"),
+        dominant_emotion=func.coalesce(bindparam("b_emotion"), Conversation.dominant_emotion),
+        average_anxiety_level=func.coalesce(bindparam("b_anxiety"), Conversation.average_anxiety_level),
+        crisis_detected=or_(
+            func.coalesce(Conversation.crisis_detected, False),
+            bindparam("b_crisis", type_=Boolean)
+        )
+    )
+)
+
+
+class _PendingTurn:
+    """One user/assistant message pair waiting to be written"""
+    
+    __slots__ = ("conversation_id", "rows", "emotion", "anxiety_severity", "crisis_detected", "future")
+    
+    def __init__(
+        self,
+        conversation_id: str,
+        rows: List[Dict],
+        emotion: Optional[str],
+        anxiety_severity: Optional[str],
+        crisis_detected: bool
+    ):
+        self.conversation_id = conversation_id
+        self.rows = rows
+        self.emotion = emotion
+        self.anxiety_severity = anxiety_severity
+        self.crisis_detected = crisis_detected
+        self.future: Future = Future()
+
+
+class MessageWriter:
+    """
+    Write-behind buffer for chat messages and conversation stats
+    
+    Turns are queued in arrival order and a worker thread flushes them once
+    max_rows message rows are pending or flush_ms has passed since the
+    oldest one arrived. A flush is one transaction: a bulk INSERT of every
+    message row plus one executemany UPDATE that increments each touched
+    conversation's message_count by its number of new rows. If a batch
+    fails, its turns are retried one transaction each, so one bad turn does
+    not drop the others. Turns submitted with a turn_id that is already in
+    the table (a redelivered job) are skipped, messages and counts alike.
+    Each turn's future resolves to True once written; a turn whose caller
+    stopped waiting (cancelled future) is still written.
+    """
+    
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        flush_ms: float = 50.0,
+        max_rows: int = 200
+    ):
+        """
+        Initialize the writer
+        
+        Args:
+            session_factory: Creates the database session used by each flush
+            flush_ms: Maximum time a turn waits in the buffer (milliseconds)
+            max_rows: Message rows that trigger an immediate flush
+        """
+        self.session_factory = session_factory
+        # Bulk INSERT needs the same columns in every row
+        self._row_template = _message_row_template()
+        self.flush_wait = max(0.0, flush_ms) / 1000.0
+        self.max_turns = max(1, max_rows // 2)
+        
+        self._queue: queue.Queue = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        
+        # Stats
+        self.flush_latency = LatencyTracker()
+        self.flushes = 0
+        self.rows_written = 0
+        self.conversations_updated = 0
+        self.max_batch_rows = 0
+        self.fallback_flushes = 0
+        self.failed_turns = 0
+        self.duplicate_turns = 0
+    
+    def submit(
+        self,
+        conversation_id: str,
+        user_message: Dict,
+        assistant_message: Dict,
+        timestamp: Optional[datetime] = None,
+        turn_id: Optional[str] = None
+    ) -> Future:
+        """
+        Queue one analyzed turn for writing
+        
+        Args:
+            conversation_id: Conversation the messages belong to
+            user_message: Message column values for the user message (role is set here)
+            assistant_message: Message column values for the assistant reply
+            timestamp: Time of the turn (default: now)
+            turn_id: Stable ID of the turn; its message IDs derive from it, so a
+                retried turn that was already written is skipped
+        
+        Returns:
+            Future resolved with True once written (or already written), False if the write failed
+        """
+        timestamp = timestamp or datetime.utcnow()
+        user_row = {
+            **self._row_template,
+            **user_message,
+            "id": f"{turn_id}-user" if turn_id else generate_uuid(),
+            "conversation_id": conversation_id,
+            "role": "user",
+            "timestamp": timestamp
+        }
+        # Keep the reply strictly after the user message for timestamp ordering
+        assistant_row = {
+            **self._row_template,
+            **assistant_message,
+            "id": f"{turn_id}-assistant" if turn_id else generate_uuid(),
+            "conversation_id": conversation_id,
+            "role": "assistant",
+            "timestamp": timestamp + timedelta(microseconds=1)
+        }
+        turn = _PendingTurn(
+            conversation_id,
+            [user_row, assistant_row],
+            user_message.get("emotion"),
+            user_message.get("anxiety_severity"),
+            bool(user_message.get("crisis_detected"))
+        )
+        self._ensure_worker()
+        self._queue.put(turn)
+        return turn.future
+    
+    async def submit_async(
+        self,
+        conversation_id: str,
+        user_message: Dict,
+        assistant_message: Dict,
+        timestamp: Optional[datetime] = None,
+        turn_id: Optional[str] = None
+    ) -> bool:
+        """Queue one turn and await its write without blocking the event loop"""
+        return await asyncio.wrap_future(
+            self.submit(conversation_id, user_message, assistant_message, timestamp, turn_id)
+        )
+    
+    def shutdown(self):
+        """Flush every queued turn and stop the worker thread"""
+        with self._lock:
+            if self._worker is not None:
+                self._queue.put(None)
+                self._worker.join()
+                self._worker = None
+    
+    def get_stats(self) -> Dict:
+        """
+        Get write-behind statistics
+        
+        Returns:
+            Dictionary with pending turns, flush counts, batch sizes and flush latency
+        """
+        return {
+            "flush_ms": self.flush_wait * 1000.0,
+            "max_rows": self.max_turns * 2,
+            "pending_turns": self._queue.qsize(),
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "average_batch_rows": (self.rows_written / self.flushes) if self.flushes else 0.0,
+            "max_batch_rows": self.max_batch_rows,
+            "conversations_updated": self.conversations_updated,
+            "fallback_flushes": self.fallback_flushes,
+            "failed_turns": self.failed_turns,
+            "duplicate_turns": self.duplicate_turns,
+            "flush_latency": self.flush_latency.get_stats()
+        }
+    
+    def _ensure_worker(self):
+        """Start the worker thread on first use"""
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run,
+                    name="message-writer",
+                    daemon=True
+                )
+                self._worker.start()
+    
+    def _run(self):
+        """Worker loop: collect turns until the size or time limit, then flush"""
+        stopping = False
+        while not stopping:
+            turn = self._queue.get()
+            if turn is None:
+                break
+            
+            batch = [turn]
+            deadline = time.perf_counter() + self.flush_wait
+            
+            while len(batch) < self.max_turns:
+                remaining = deadline - time.perf_counter()
+                try:
+                    turn = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if turn is None:
+                    stopping = True
+                    break
+                batch.append(turn)
+            
+            try:
+                self._flush(batch)
+            except Exception as e:
+                # Keep the thread alive: later turns would otherwise wait forever
+                print(f"Message write-behind flush failed: {getattr(e, 'orig', e)}")
+                for turn in batch:
+                    if not turn.future.done():
+                        self._resolve(turn, False)
+    
+    def _flush(self, batch: List[_PendingTurn]):
+        """Write a batch in one transaction, falling back to one transaction per turn"""
+        start = time.perf_counter()
+        try:
+            self._write(batch)
+            written = batch
+        except Exception as e:
+            # Report the driver error only: the full exception would log message content
+            print(f"Message write-behind batch of {len(batch)} turns failed, retrying individually: {getattr(e, 'orig', e)}")
+            self.fallback_flushes += 1
+            written = []
+            for turn in batch:
+                try:
+                    self._write([turn])
+                    written.append(turn)
+                except Exception as turn_error:
+                    self.failed_turns += 1
+                    print(f"Failed to save messages for {turn.conversation_id}: {getattr(turn_error, 'orig', turn_error)}")
+                    self._resolve(turn, False)
+        
+        rows = sum(len(turn.rows) for turn in written)
+        self.flushes += 1
+        self.rows_written += rows
+        self.max_batch_rows = max(self.max_batch_rows, rows)
+        self.flush_latency.record((time.perf_counter() - start) * 1000.0)
+        
+        for turn in written:
+            self._resolve(turn, True)
+    
+    @staticmethod
+    def _resolve(turn: _PendingTurn, saved: bool):
+        """Hand the caller the outcome, unless it cancelled its future"""
+        if turn.future.set_running_or_notify_cancel():
+            turn.future.set_result(saved)
+    
+    def _write(self, batch: List[_PendingTurn]):
+        """Bulk-insert the batch's messages and apply per-conversation stat updates"""
+        session = self.session_factory()
+        try:
+            # Turns already written by an earlier delivery of the same job are skipped
+            # (a turn's rows are always inserted together, so its user row decides)
+            existing = set(session.execute(
+                select(Message.id).where(Message.id.in_([turn.rows[0]["id"] for turn in batch]))
+            ).scalars())
+            fresh = [turn for turn in batch if turn.rows[0]["id"] not in existing]
+            if fresh:
+                connection = session.connection()
+                connection.execute(insert(Message), [row for turn in fresh for row in turn.rows])
+                connection.execute(_STATS_UPDATE, self._fold_stats(fresh))
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+        
+        self.duplicate_turns += len(batch) - len(fresh)
+        self.conversations_updated += len({turn.conversation_id for turn in fresh})
+    
+    def _fold_stats(self, batch: List[_PendingTurn]) -> List[Dict]:
+        """Fold the batch into one stats update per conversation (latest turn wins)"""
+        stats: Dict[str, Dict] = {}
+        for turn in batch:
+            entry = stats.setdefault(turn.conversation_id, {
+                "b_id": turn.conversation_id,
+                "b_count": 0,
+                "b_emotion": None,
+                "b_anxiety": None,
+                "b_crisis": False
+            })
+            entry["b_count"] += len(turn.rows)
+            if turn.emotion is not None:
+                entry["b_emotion"] = turn.emotion
+            if turn.anxiety_severity is not None:
+                entry["b_anxiety"] = turn.anxiety_severity
+            entry["b_crisis"] = entry["b_crisis"] or turn.crisis_detected
+        
+        now = datetime.utcnow()
+        for entry in stats.values():
+            entry["b_now"] = now
+        return list(stats.values())
+
+
+# Singleton instance
+_message_writer = None
+
+def get_message_writer() -> MessageWriter:
+    """Get or create the message write-behind singleton"""
+    global _message_writer
+    if _message_writer is None:
+        _message_writer = MessageWriter(
+            flush_ms=settings.WRITE_BEHIND_FLUSH_MS,
+            max_rows=settings.WRITE_BEHIND_MAX_ROWS
+        )
+        register_stats("message_writer", _message_writer.get_stats)
+    return _message_writer
+
+def shutdown_message_writer():
+    """Flush pending messages on application shutdown"""
+    if _message_writer is not None:
+        _message_writer.shutdown()
@@ -5,6 +5,14 @@ Phase 3 implementation
 """
 
 from .generator import ReflectionGenerator, get_reflection_generator
+from .scheduler import ReflectionScheduler, get_reflection_scheduler, shutdown_reflection_scheduler
 from database.models import Reflection
 
-__all__ = ["ReflectionGenerator", "get_reflection_generator", "Reflection"]
+__all__ = [
+    "ReflectionGenerator",
+    "get_reflection_generator",
+    "ReflectionScheduler",
+    "get_reflection_scheduler",
+    "shutdown_reflection_scheduler",
+    "Reflection"
+]
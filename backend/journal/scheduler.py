@@ -0,0 +1,186 @@
+"""
+Reflection Scheduler
+Debounced, coalesced auto-reflection generation for active conversations
+"""
+
+import asyncio
+from typing import Callable, Dict, Optional
+
+from config import settings
+from metrics import register_stats
+
+
+class _DirtyConversation:
+    """A conversation with messages not yet covered by its reflection"""
+    
+    __slots__ = ("user_id", "new_messages", "timer")
+    
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.new_messages = 0
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class ReflectionScheduler:
+    """
+    Regenerates conversation reflections once per burst of messages
+    
+    Each saved chat turn marks its conversation dirty instead of rebuilding
+    the reflection right away. A dirty conversation is regenerated once it
+    has been idle for idle_seconds, or as soon as max_pending_messages new
+    messages have piled up, so a long active conversation still gets
+    periodic updates. Marks that arrive while a conversation is already
+    dirty are folded into that pending run and counted as skipped. At most
+    one generation per conversation runs at a time; marks made during a
+    run schedule one follow-up run.
+    
+    Generation is blocking (database reads, optional Gemini call) and runs
+    in a worker thread. Must be used from the event loop.
+    """
+    
+    def __init__(
+        self,
+        generate: Callable[[str, str], object],
+        idle_seconds: float = 30.0,
+        max_pending_messages: int = 10
+    ):
+        """
+        Initialize the scheduler
+        
+        Args:
+            generate: Blocking function (user_id, conversation_id) that rebuilds a reflection
+            idle_seconds: Quiet period after the last message before regenerating
+            max_pending_messages: New messages that trigger regeneration without waiting
+        """
+        self.generate = generate
+        self.idle_seconds = max(0.0, idle_seconds)
+        self.max_pending_messages = max(1, max_pending_messages)
+        self._dirty: Dict[str, _DirtyConversation] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        
+        # Stats
+        self.requests = 0
+        self.skipped = 0
+        self.generated = 0
+        self.failed = 0
+        self.idle_triggers = 0
+        self.count_triggers = 0
+    
+    def mark_dirty(self, user_id: str, conversation_id: str, new_messages: int = 1):
+        """
+        Record new messages in a conversation and (re)arm its regeneration
+        
+        Args:
+            user_id: Owner of the conversation
+            conversation_id: Conversation that changed
+            new_messages: Number of messages added since the last mark
+        """
+        self.requests += 1
+        entry = self._dirty.get(conversation_id)
+        if entry is None:
+            entry = self._dirty[conversation_id] = _DirtyConversation(user_id)
+        else:
+            self.skipped += 1
+        entry.new_messages += new_messages
+        self._arm(conversation_id, entry)
+    
+    async def flush(self):
+        """Regenerate every dirty conversation now and wait for all runs (used on shutdown)"""
+        for conversation_id in list(self._dirty):
+            self._fire(conversation_id)
+        while self._running:
+            await asyncio.gather(*list(self._running.values()), return_exceptions=True)
+    
+    def get_stats(self) -> Dict:
+        """
+        Get scheduler statistics
+        
+        Returns:
+            Dictionary with request, skipped and generated counts and pending conversations
+        """
+        return {
+            "idle_seconds": self.idle_seconds,
+            "max_pending_messages": self.max_pending_messages,
+            "requests": self.requests,
+            "skipped": self.skipped,
+            "generated": self.generated,
+            "failed": self.failed,
+            "idle_triggers": self.idle_triggers,
+            "count_triggers": self.count_triggers,
+            "pending_conversations": len(self._dirty),
+            "running": len(self._running)
+        }
+    
+    def _arm(self, conversation_id: str, entry: _DirtyConversation):
+        """Restart the idle timer, or fire at once when enough messages are pending"""
+        if entry.timer is not None:
+            entry.timer.cancel()
+        delay = 0.0 if entry.new_messages >= self.max_pending_messages else self.idle_seconds
+        entry.timer = asyncio.get_running_loop().call_later(delay, self._fire, conversation_id)
+    
+    def _fire(self, conversation_id: str):
+        """Start regeneration for a dirty conversation unless one is already running"""
+        entry = self._dirty.get(conversation_id)
+        if entry is None:
+            return
+        if entry.timer is not None:
+            entry.timer.cancel()
+            entry.timer = None
+        if conversation_id in self._running:
+            return  # Picked up when the current run finishes
+        
+        del self._dirty[conversation_id]
+        if entry.new_messages >= self.max_pending_messages:
+            self.count_triggers += 1
+        else:
+            self.idle_triggers += 1
+        self._running[conversation_id] = asyncio.get_running_loop().create_task(
+            self._generate(conversation_id, entry.user_id)
+        )
+    
+    async def _generate(self, conversation_id: str, user_id: str):
+        """Run one regeneration in a thread, then start a follow-up run if one is due"""
+        try:
+            await asyncio.to_thread(self.generate, user_id, conversation_id)
+            self.generated += 1
+        except Exception as e:
+            self.failed += 1
+            print(f"Auto-reflection error for {conversation_id}: {e}")
+        finally:
+            del self._running[conversation_id]
+            pending = self._dirty.get(conversation_id)
+            if pending is not None and pending.timer is None:
+                self._fire(conversation_id)
+
+
+def _generate_reflection(user_id: str, conversation_id: str):
+    """Rebuild a conversation's reflection in its own database session"""
+    from api.journal import auto_generate_reflection
+    from database import SessionLocal
+    
+    db = SessionLocal()
+    try:
+        auto_generate_reflection(user_id=user_id, conversation_id=conversation_id, db=db)
+    finally:
+        db.close()
+
+
+# Singleton instance
+_reflection_scheduler = None
+
+def get_reflection_scheduler() -> ReflectionScheduler:
+    """Get or create the reflection scheduler singleton"""
+    global _reflection_scheduler
+    if _reflection_scheduler is None:
+        _reflection_scheduler = ReflectionScheduler(
+            _generate_reflection,
+            idle_seconds=settings.REFLECTION_IDLE_SECONDS,
+            max_pending_messages=settings.REFLECTION_MAX_PENDING_MESSAGES
+        )
+        register_stats("reflection_scheduler", _reflection_scheduler.get_stats)
+    return _reflection_scheduler
+
+async def shutdown_reflection_scheduler():
+    """Generate reflections still pending on application shutdown"""
+    if _reflection_scheduler is not None:
+        await _reflection_scheduler.flush()
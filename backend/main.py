@@ -43,6 +43,7 @@ app.add_middleware(
 @app.on_event("startup")
 async def startup_event():
     """Initialize database tables on application startup"""
+    from config import settings
     from database import init_db, test_connection
     
     print("=" * 50)
@@ -62,9 +63,27 @@ async def startup_event():
     else:
         print("✗ Database connection failed")
     
+    # Process queued analysis jobs in this process unless dedicated workers do it
+    if settings.JOB_WORKER_EMBEDDED:
+        from worker import start_embedded_worker
+        start_embedded_worker()
+        print("✓ Embedded analysis worker started")
+    
     print("=" * 50)
 
 
+# Stop the embedded worker and flush pending reflections and buffered writes on shutdown
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Finish claimed analysis jobs and pending reflections, then write out buffered messages"""
+    from database import shutdown_message_writer
+    from journal import shutdown_reflection_scheduler
+    from worker import stop_embedded_worker
+    await stop_embedded_worker()
+    await shutdown_reflection_scheduler()
+    shutdown_message_writer()
+
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -83,6 +102,12 @@ async def health_check():
         "environment": os.getenv("APP_ENV", "development")
     }
 
+# Runtime metrics endpoint
+@app.get("/api/metrics")
+async def runtime_metrics():
+    from metrics import collect_stats
+    return collect_stats()
+
 # API Info endpoint
 @app.get("/api/info")
 async def api_info():
@@ -91,8 +116,10 @@ async def api_info():
         "description": "AI-powered mental wellness platform",
         "endpoints": {
             "chat": "/api/chat",
+            "chat_stream": "/api/chat/stream",
             "reflections": "/api/reflections",
-            "insights": "/api/insights"
+            "insights": "/api/insights",
+            "metrics": "/api/metrics"
         }
     }
 
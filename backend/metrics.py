@@ -0,0 +1,105 @@
+"""
+Runtime Metrics Module
+Lightweight in-process stats registry exposed through /api/metrics
+"""
+
+import threading
+from collections import deque
+from typing import Callable, Dict, Optional
+
+# Registered stats providers (name -> callable returning a dict)
+_stats_providers: Dict[str, Callable[[], Dict]] = {}
+
+
+def register_stats(name: str, provider: Callable[[], Dict]):
+    """
+    Register a stats provider
+
+    Args:
+        name: Unique metrics section name
+        provider: Callable returning a JSON-serializable dictionary
+    """
+    _stats_providers[name] = provider
+
+
+def collect_stats() -> Dict:
+    """
+    Collect stats from every registered provider
+
+    Returns:
+        Dictionary keyed by provider name
+    """
+    stats = {}
+    for name, provider in list(_stats_providers.items()):
+        try:
+            stats[name] = provider()
+        except Exception as e:
+            stats[name] = {"error": str(e)}
+    return stats
+
+
+class LatencyTracker:
+    """
+    Latency recorder with an optional budget
+    
+    Keeps running totals plus a bounded window of recent samples for
+    percentile estimates.
+    """
+    
+    def __init__(self, budget_ms: Optional[float] = None, window: int = 1024):
+        """
+        Initialize the tracker
+        
+        Args:
+            budget_ms: Optional latency budget; samples above it are counted
+            window: Number of recent samples kept for percentiles
+        """
+        self.budget_ms = budget_ms
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.over_budget = 0
+    
+    def record(self, elapsed_ms: float) -> bool:
+        """
+        Record one sample
+        
+        Args:
+            elapsed_ms: Elapsed time in milliseconds
+        
+        Returns:
+            True if the sample was within budget (or no budget is set)
+        """
+        within_budget = self.budget_ms is None or elapsed_ms <= self.budget_ms
+        with self._lock:
+            self._samples.append(elapsed_ms)
+            self.count += 1
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+            if not within_budget:
+                self.over_budget += 1
+        return within_budget
+    
+    def get_stats(self) -> Dict:
+        """
+        Get latency statistics
+        
+        Returns:
+            Dictionary with count, mean, max and recent percentiles (milliseconds)
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+            stats = {
+                "count": self.count,
+                "mean_ms": (self.total_ms / self.count) if self.count else 0.0,
+                "max_ms": self.max_ms
+            }
+            if self.budget_ms is not None:
+                stats["budget_ms"] = self.budget_ms
+                stats["over_budget"] = self.over_budget
+        
+        for name, quantile in (("p50_ms", 0.50), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+            stats[name] = samples[min(len(samples) - 1, int(quantile * len(samples)))] if samples else 0.0
+        return stats
@@ -7,7 +7,13 @@ from .sentiment import EmotionDetector, get_emotion_detector
 from .anxiety import AnxietyClassifier, get_anxiety_classifier
 from .crisis import CrisisDetector, get_crisis_detector
 from .context import ConversationContext, ContextManager, get_context_manager
+from .context_store import ContextBackend, InMemoryContextBackend, SQLiteContextBackend
 from .gemini_chat import GeminiChat, get_gemini_chat
+from .cache import ResultCache, get_result_cache
+from .executor import InferenceExecutor, InferenceOverloaded, get_inference_executor
+from .batching import MicroBatcher, get_emotion_batcher, get_anxiety_batcher
+from .orchestrator import AnalysisOrchestrator, get_analysis_orchestrator
+from .pipeline import AnalysisPipeline, AnalysisResult, get_analysis_pipeline
 
 __all__ = [
     "EmotionDetector",
@@ -19,6 +25,22 @@ __all__ = [
     "ConversationContext",
     "ContextManager",
     "get_context_manager",
+    "ContextBackend",
+    "InMemoryContextBackend",
+    "SQLiteContextBackend",
     "GeminiChat",
-    "get_gemini_chat"
+    "get_gemini_chat",
+    "ResultCache",
+    "get_result_cache",
+    "InferenceExecutor",
+    "InferenceOverloaded",
+    "get_inference_executor",
+    "MicroBatcher",
+    "get_emotion_batcher",
+    "get_anxiety_batcher",
+    "AnalysisOrchestrator",
+    "get_analysis_orchestrator",
+    "AnalysisPipeline",
+    "AnalysisResult",
+    "get_analysis_pipeline"
 ]
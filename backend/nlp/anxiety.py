@@ -4,10 +4,54 @@ Detects anxiety levels and patterns in user messages
 Based on clinical interview patterns from DAIC-WOZ dataset
 """
 
+import copy
 import re
-from typing import Dict, List, Tuple
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
 import numpy as np
+import torch
 from transformers import pipeline
+from config import settings
+from metrics import register_stats
+from .cache import get_result_cache
+from .sentiment import detached_backend_tokenizer
+
+# Supported zero-shot scoring modes
+SCORING_MODES = ("pipeline", "batched", "compare")
+
+# Supported weight precisions for the zero-shot model
+PRECISION_MODES = ("fp32", "int8", "bf16")
+
+# Reference texts used to measure the effect of reduced precision
+PRECISION_REFERENCE_TEXTS = [
+    "I'm feeling really anxious about my presentation tomorrow. My heart is racing.",
+    "I feel a bit nervous about the meeting, but I think I'll be okay.",
+    "I'm constantly worried about everything and I can't sleep.",
+    "Had a great day today! Feeling calm and relaxed.",
+    "I avoid social events because I get so anxious around people."
+]
+
+def model_size_bytes(model: torch.nn.Module) -> int:
+    """
+    Approximate the memory held by a model's weights
+    
+    Counts every tensor in the state dict, including packed int8 weights of
+    dynamically quantized layers.
+    
+    Args:
+        model: PyTorch model
+    
+    Returns:
+        Size in bytes
+    """
+    total = 0
+    for value in model.state_dict().values():
+        tensors = value if isinstance(value, tuple) else (value,)
+        for tensor in tensors:
+            if isinstance(tensor, torch.Tensor):
+                total += tensor.numel() * tensor.element_size()
+    return total
 
 class AnxietyClassifier:
     """
@@ -20,10 +64,30 @@ class AnxietyClassifier:
     - Severe: 0.7 - 1.0
     """
     
-    def __init__(self):
-        """Initialize the anxiety classifier"""
+    def __init__(self, scoring_mode: Optional[str] = None, precision: Optional[str] = None):
+        """
+        Initialize the anxiety classifier
+        
+        Args:
+            scoring_mode: Zero-shot scoring mode (default: ANXIETY_SCORING_MODE setting)
+                - pipeline: Hugging Face zero-shot pipeline, one pass per label
+                - batched: all premise/hypothesis pairs in a single forward pass
+                - compare: run both and report the maximum score deviation
+            precision: Zero-shot model weight precision (default: ANXIETY_MODEL_PRECISION setting)
+                - fp32: full precision
+                - int8: dynamic int8 quantization of linear layers
+                - bf16: bfloat16 weights
+        """
         print("Loading anxiety classification model...")
         
+        self.scoring_mode = scoring_mode or settings.ANXIETY_SCORING_MODE
+        if self.scoring_mode not in SCORING_MODES:
+            raise ValueError(f"Unknown anxiety scoring mode: {self.scoring_mode}")
+        
+        self.precision = precision or settings.ANXIETY_MODEL_PRECISION
+        if self.precision not in PRECISION_MODES:
+            raise ValueError(f"Unknown anxiety model precision: {self.precision}")
+        
         # Use zero-shot classification for anxiety detection
         self.classifier = pipeline(
             "zero-shot-classification",
@@ -41,6 +105,39 @@ class AnxietyClassifier:
             "overwhelm"
         ]
         
+        # NLI setup for batched scoring (mirrors the zero-shot pipeline defaults)
+        self.hypothesis_template = "This example is {}."
+        self.entailment_id = -1
+        for label, idx in self.classifier.model.config.label2id.items():
+            if label.lower().startswith("entail"):
+                self.entailment_id = idx
+                break
+        self.contradiction_id = -1 if self.entailment_id == 0 else 0
+        self.max_pairs_per_pass = settings.ANXIETY_MAX_PAIRS_PER_PASS
+        self.backend_tokenizer = detached_backend_tokenizer(self.classifier.tokenizer)
+        self._hypothesis_cache = None
+        
+        # Cascade gating: the zero-shot model only runs when cheap signals
+        # land inside the [low, high) uncertainty band
+        self.cascade_enabled = settings.ANXIETY_CASCADE_ENABLED
+        self.cascade_low = settings.ANXIETY_CASCADE_LOW
+        self.cascade_high = settings.ANXIETY_CASCADE_HIGH
+        self.cascade_stats = {"cheap_negative": 0, "cheap_positive": 0, "model": 0}
+        self._stats_lock = threading.Lock()
+        
+        # Result cache (version covers model, precision and cascade settings)
+        self.version = (
+            f"facebook/bart-large-mnli:{self.precision}:"
+            f"cascade={self.cascade_enabled}:{self.cascade_low}:{self.cascade_high}"
+        )
+        self.cache = get_result_cache()
+        
+        # Reduced precision for the zero-shot model
+        self.model_bytes = model_size_bytes(self.classifier.model)
+        self.precision_report: Optional[Dict] = None
+        if self.precision != "fp32":
+            self._apply_precision(report=settings.ANXIETY_PRECISION_REPORT)
+        
         # Anxiety linguistic markers (from DAIC-WOZ research)
         self.anxiety_markers = {
             # Cognitive markers
@@ -91,12 +188,13 @@ class AnxietyClassifier:
         
         print("✅ Anxiety classifier loaded")
     
-    def detect_anxiety(self, text: str) -> Dict:
+    def detect_anxiety(self, text: str, emotion_scores: Optional[Dict[str, float]] = None) -> Dict:
         """
         Detect anxiety in the given text
         
         Args:
             text: Input text to analyze
+            emotion_scores: Optional GoEmotions scores for the same text (enables cascade gating)
         
         Returns:
             Dictionary containing:
@@ -105,10 +203,409 @@ class AnxietyClassifier:
             - confidence: Confidence score (0-1)
             - markers_found: List of detected anxiety markers
             - category_scores: Scores for each anxiety category
+            - cascade_stage: Stage that produced the ML score
+        """
+        return self.detect_anxiety_batch([text], [emotion_scores])[0]
+    
+    def detect_anxiety_batch(
+        self,
+        texts: List[str],
+        emotion_scores: Optional[List[Optional[Dict[str, float]]]] = None,
+        texts_lower: Optional[List[str]] = None,
+        encode: Optional[Callable[[List[int]], List]] = None,
+        emotion_version: str = ""
+    ) -> List[Dict]:
+        """
+        Detect anxiety for multiple texts with shared zero-shot scoring
+        
+        Only texts whose cheap cascade score is ambiguous are sent to the
+        zero-shot model.
+        
+        Args:
+            texts: List of input texts
+            emotion_scores: Optional GoEmotions scores per text
+            texts_lower: Optional lowercased texts (computed here if omitted)
+            encode: Optional function returning tokenizers.Encoding (without special
+                tokens) for the given text indices, from a tokenizer sharing the NLI
+                model's vocabulary; only called for texts the zero-shot model scores
+            emotion_version: Version of the emotion detector that produced
+                emotion_scores (part of the cache key, since the scores drive the cascade)
+        
+        Returns:
+            List of anxiety detection results (same order as texts)
+        """
+        if not texts:
+            return []
+        if emotion_scores is None:
+            emotion_scores = [None] * len(texts)
+        if texts_lower is None:
+            texts_lower = [text.lower() for text in texts]
+        
+        if self.cache is None:
+            return self._analyze_batch(texts, emotion_scores, texts_lower, encode)
+        
+        # Cascade results depend on the emotion scores and the model that produced them
+        params = [f"emotion={emotion_version}" if scores else "" for scores in emotion_scores]
+        results = [
+            self.cache.get("anxiety", self.version, text, param)
+            for text, param in zip(texts, params)
+        ]
+        missing = [i for i, result in enumerate(results) if result is None]
+        
+        if missing:
+            computed = self._analyze_batch(
+                [texts[i] for i in missing],
+                [emotion_scores[i] for i in missing],
+                [texts_lower[i] for i in missing],
+                (lambda indices: encode([missing[i] for i in indices])) if encode is not None else None
+            )
+            for i, result in zip(missing, computed):
+                results[i] = result
+                self.cache.set("anxiety", self.version, texts[i], result, params[i])
+        
+        return results
+    
+    def _analyze_batch(
+        self,
+        texts: List[str],
+        emotion_scores: List[Optional[Dict[str, float]]],
+        texts_lower: List[str],
+        encode: Optional[Callable[[List[int]], List]] = None
+    ) -> List[Dict]:
+        """
+        Run the cascade and zero-shot scoring for texts not found in the cache
+        
+        Args:
+            texts: List of input texts
+            emotion_scores: GoEmotions scores per text (entries may be None)
+            texts_lower: Lowercased texts
+            encode: Optional function returning tokenizers.Encoding for the given text indices
+        
+        Returns:
+            List of anxiety detection results (same order as texts)
+        """
+        # 1. Cheap stage: markers and emotion probabilities
+        prepared = []
+        model_indices = []
+        for i, (text_lower, scores) in enumerate(zip(texts_lower, emotion_scores)):
+            markers_found, category_scores = self._find_markers(text_lower)
+            stage, cheap_score = self._cascade_stage(category_scores, scores)
+            prepared.append((text_lower, markers_found, category_scores, stage, cheap_score))
+            if stage == "model":
+                model_indices.append(i)
+        
+        # 2. Zero-shot model only for ambiguous texts
+        model_results = self._zero_shot(
+            [texts[i] for i in model_indices],
+            encode(model_indices) if encode is not None else None
+        ) if model_indices else []
+        model_results = dict(zip(model_indices, model_results))
+        
+        outputs = []
+        for i, (text_lower, markers_found, category_scores, stage, cheap_score) in enumerate(prepared):
+            result = model_results.get(i) or {"labels": ["anxiety"], "scores": [cheap_score]}
+            output = self._build_result(text_lower, markers_found, category_scores, result)
+            output["cascade_stage"] = stage
+            outputs.append(output)
+        
+        with self._stats_lock:
+            for _, _, _, stage, _ in prepared:
+                self.cascade_stats[stage] += 1
+        
+        return outputs
+    
+    def get_cascade_stats(self) -> Dict:
+        """
+        Get cascade gating statistics
+        
+        Returns:
+            Per-stage hit counts and the fraction of texts that skipped the zero-shot model
+        """
+        with self._stats_lock:
+            stats = dict(self.cascade_stats)
+        total = sum(stats.values())
+        skipped = stats["cheap_negative"] + stats["cheap_positive"]
+        return {
+            "enabled": self.cascade_enabled,
+            "uncertainty_band": [self.cascade_low, self.cascade_high],
+            "stages": stats,
+            "total": total,
+            "model_skip_rate": (skipped / total) if total else 0.0
+        }
+    
+    def _cascade_stage(
+        self,
+        category_scores: Dict[str, int],
+        emotion_scores: Optional[Dict[str, float]]
+    ) -> Tuple[str, float]:
+        """
+        Decide whether the cheap signals are conclusive
+        
+        The cheap score is the strongest of the normalized marker score and the
+        GoEmotions nervousness/fear probabilities. Scores below the uncertainty
+        band can only be trusted when emotion scores are available, since the
+        regex markers alone miss many anxious phrasings.
+        
+        Args:
+            category_scores: Marker counts per category
+            emotion_scores: Optional GoEmotions scores
+        
+        Returns:
+            Tuple of (stage, cheap_score) where stage is
+            cheap_negative/cheap_positive/model
+        """
+        marker_score = min(sum(category_scores.values()) / 10, 1.0)
+        cheap_score = marker_score
+        if emotion_scores:
+            cheap_score = max(
+                cheap_score,
+                emotion_scores.get("nervousness", 0.0),
+                emotion_scores.get("fear", 0.0)
+            )
+        
+        if not self.cascade_enabled:
+            return "model", cheap_score
+        if cheap_score >= self.cascade_high:
+            return "cheap_positive", cheap_score
+        if emotion_scores and cheap_score < self.cascade_low:
+            return "cheap_negative", cheap_score
+        return "model", cheap_score
+    
+    def compare_scoring(self, texts: List[str]) -> Dict:
+        """
+        Compare pipeline and batched zero-shot scores on the same texts
+        
+        Args:
+            texts: List of input texts
+        
+        Returns:
+            Dictionary with the maximum absolute score deviation overall and per text
+        """
+        return self._compare(texts, self._score_batched(texts))
+    
+    def _compare(self, texts: List[str], batched_results: List[Dict]) -> Dict:
+        """Deviation of already computed batched scores from the pipeline's scores"""
+        pipeline_results = self._score_pipeline(texts)
+        
+        deviations = []
+        for old, new in zip(pipeline_results, batched_results):
+            old_scores = dict(zip(old["labels"], old["scores"]))
+            new_scores = dict(zip(new["labels"], new["scores"]))
+            deviations.append(max(
+                abs(old_scores[label] - new_scores[label]) for label in self.anxiety_labels
+            ))
+        
+        return {
+            "texts": len(texts),
+            "max_abs_deviation": max(deviations) if deviations else 0.0,
+            "per_text_deviation": deviations
+        }
+    
+    def _zero_shot(self, texts: List[str], encodings: Optional[List] = None) -> List[Dict]:
+        """
+        Score anxiety labels for each text using the configured scoring mode
+        
+        Args:
+            texts: List of input texts
+            encodings: Optional pre-computed premise encodings (batched scoring only)
+        
+        Returns:
+            List of dicts with 'labels' and 'scores' (one per text)
+        """
+        if self.scoring_mode == "pipeline":
+            return self._score_pipeline(texts)
+        
+        batched_results = self._score_batched(texts, encodings)
+        
+        if self.scoring_mode == "compare":
+            # The batched results are returned, so only the pipeline runs in addition
+            comparison = self._compare(texts, batched_results)
+            print(f"Anxiety scoring deviation (pipeline vs batched): {comparison['max_abs_deviation']:.6f}")
+        
+        return batched_results
+    
+    def _score_pipeline(self, texts: List[str]) -> List[Dict]:
+        """Score texts with the Hugging Face zero-shot pipeline"""
+        results = self.classifier(
+            texts,
+            candidate_labels=self.anxiety_labels,
+            multi_label=True
+        )
+        if isinstance(results, dict):
+            results = [results]
+        return results
+    
+    def _score_batched(self, texts: List[str], encodings: Optional[List] = None) -> List[Dict]:
+        """
+        Score texts by running every premise/hypothesis pair through the NLI model at once
+        
+        Produces the same multi-label entailment scores as the pipeline:
+        softmax over [contradiction, entailment] logits per pair. With
+        pre-computed premise encodings, pairs are assembled from token ids
+        instead of tokenizing each premise once per label.
+        
+        Args:
+            texts: List of input texts
+            encodings: Optional pre-computed tokenizers.Encoding per text (without special tokens)
+        
+        Returns:
+            List of dicts with 'labels' and 'scores' (one per text, label order preserved)
+        """
+        tokenizer = self.classifier.tokenizer
+        model = self.classifier.model
+        
+        hypotheses = [self.hypothesis_template.format(label) for label in self.anxiety_labels]
+        if encodings is not None:
+            hypothesis_encodings = self._hypothesis_encodings()
+            pairs = [
+                (encoding, hypothesis)
+                for encoding in encodings for hypothesis in hypothesis_encodings
+            ]
+        else:
+            pairs = [(text, hypothesis) for text in texts for hypothesis in hypotheses]
+        
+        chunk = self.max_pairs_per_pass if self.max_pairs_per_pass > 0 else len(pairs)
+        entailment_scores = []
+        
+        for start in range(0, len(pairs), chunk):
+            batch = pairs[start:start + chunk]
+            if encodings is not None:
+                inputs = tokenizer.pad(
+                    [self._pair_features(premise, hypothesis) for premise, hypothesis in batch],
+                    padding=True,
+                    return_tensors="pt"
+                ).to(model.device)
+            else:
+                inputs = tokenizer(
+                    [premise for premise, _ in batch],
+                    [hypothesis for _, hypothesis in batch],
+                    return_tensors="pt",
+                    padding=True,
+                    truncation="only_first"
+                ).to(model.device)
+            
+            with torch.no_grad():
+                logits = model(**inputs).logits.float()
+            
+            entail_contr_logits = logits[:, [self.contradiction_id, self.entailment_id]]
+            scores = torch.softmax(entail_contr_logits, dim=-1)[:, 1]
+            entailment_scores.extend(scores.cpu().tolist())
+        
+        n_labels = len(self.anxiety_labels)
+        return [
+            {
+                "labels": list(self.anxiety_labels),
+                "scores": entailment_scores[i * n_labels:(i + 1) * n_labels]
+            }
+            for i in range(len(texts))
+        ]
+    
+    def _hypothesis_encodings(self) -> List:
+        """Encodings of the label hypotheses without special tokens (computed once)"""
+        if self._hypothesis_cache is None:
+            backend = self.backend_tokenizer
+            self._hypothesis_cache = [
+                backend.encode(self.hypothesis_template.format(label), add_special_tokens=False)
+                for label in self.anxiety_labels
+            ]
+        return self._hypothesis_cache
+    
+    def _pair_features(self, premise, hypothesis) -> Dict:
+        """NLI inputs for a pre-tokenized premise/hypothesis pair (only the premise is truncated)"""
+        tokenizer = self.classifier.tokenizer
+        backend = self.backend_tokenizer
+        limit = tokenizer.model_max_length - backend.num_special_tokens_to_add(True) - len(hypothesis.ids)
+        if len(premise.ids) > limit:
+            premise = copy.deepcopy(premise)
+            premise.truncate(limit)
+        final = backend.post_process(premise, hypothesis)
+        return {"input_ids": final.ids, "attention_mask": final.attention_mask}
+    
+    def get_model_stats(self) -> Dict:
         """
-        text_lower = text.lower()
+        Get zero-shot model precision and memory statistics
         
-        # 1. Check for linguistic markers
+        Returns:
+            Dictionary with precision, weight memory and the precision report (if measured)
+        """
+        return {
+            "precision": self.precision,
+            "scoring_mode": self.scoring_mode,
+            "weights_mb": self.model_bytes / (1024 * 1024),
+            "precision_report": self.precision_report
+        }
+    
+    def _apply_precision(self, report: bool = False):
+        """
+        Convert the zero-shot model to the configured precision in place
+        
+        Args:
+            report: Measure memory, latency and score deviation on the
+                reference texts before and after conversion
+        """
+        model = self.classifier.model
+        bytes_before = model_size_bytes(model)
+        if report:
+            scores_before, latency_before = self._benchmark_scoring(PRECISION_REFERENCE_TEXTS)
+        
+        if self.precision == "int8":
+            torch.ao.quantization.quantize_dynamic(
+                model,
+                {torch.nn.Linear},
+                dtype=torch.qint8,
+                inplace=True
+            )
+        elif self.precision == "bf16":
+            model.to(torch.bfloat16)
+        model.eval()
+        
+        self.model_bytes = model_size_bytes(model)
+        print(
+            f"Anxiety model converted to {self.precision}: "
+            f"{bytes_before / (1024 * 1024):.1f} MB -> {self.model_bytes / (1024 * 1024):.1f} MB"
+        )
+        
+        if report:
+            scores_after, latency_after = self._benchmark_scoring(PRECISION_REFERENCE_TEXTS)
+            self.precision_report = {
+                "precision": self.precision,
+                "weights_mb_before": bytes_before / (1024 * 1024),
+                "weights_mb_after": self.model_bytes / (1024 * 1024),
+                "latency_ms_before": latency_before,
+                "latency_ms_after": latency_after,
+                "max_score_deviation": float(np.max(np.abs(scores_after - scores_before))),
+                "reference_texts": len(PRECISION_REFERENCE_TEXTS)
+            }
+            print(f"Anxiety precision report: {self.precision_report}")
+    
+    def _benchmark_scoring(self, texts: List[str], repeats: int = 3) -> Tuple[np.ndarray, float]:
+        """
+        Score texts with the batched scorer and time it
+        
+        Args:
+            texts: Reference texts
+            repeats: Number of timed runs (after one warm-up run)
+        
+        Returns:
+            Tuple of (scores array of shape (texts, labels), mean latency in ms)
+        """
+        results = self._score_batched(texts)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            self._score_batched(texts)
+        latency_ms = (time.perf_counter() - start) * 1000 / repeats
+        return np.array([result["scores"] for result in results]), latency_ms
+    
+    def _find_markers(self, text_lower: str) -> Tuple[List[str], Dict[str, int]]:
+        """
+        Find anxiety linguistic markers in text
+        
+        Args:
+            text_lower: Lowercase text
+        
+        Returns:
+            Tuple of (markers_found, category_scores)
+        """
         markers_found = []
         category_scores = {
             "cognitive": 0,
@@ -123,13 +620,27 @@ class AnxietyClassifier:
                     markers_found.append(pattern.replace(r"\b", "").replace("(", "").replace(")", ""))
                     category_scores[category] += 1
         
-        # 2. Use zero-shot classification
-        result = self.classifier(
-            text,
-            candidate_labels=self.anxiety_labels,
-            multi_label=True
-        )
+        return markers_found, category_scores
+    
+    def _build_result(
+        self,
+        text_lower: str,
+        markers_found: List[str],
+        category_scores: Dict[str, int],
+        result: Dict
+    ) -> Dict:
+        """
+        Combine marker-based and zero-shot scores into the anxiety result
         
+        Args:
+            text_lower: Lowercase text
+            markers_found: Detected anxiety markers
+            category_scores: Marker counts per category
+            result: Zero-shot output with 'labels' and 'scores'
+        
+        Returns:
+            Anxiety detection result
+        """
         # Get anxiety-related scores
         anxiety_score = 0
         for label, score in zip(result['labels'], result['scores']):
@@ -281,6 +792,8 @@ def get_anxiety_classifier() -> AnxietyClassifier:
     global _anxiety_classifier
     if _anxiety_classifier is None:
         _anxiety_classifier = AnxietyClassifier()
+        register_stats("anxiety_cascade", _anxiety_classifier.get_cascade_stats)
+        register_stats("anxiety_model", _anxiety_classifier.get_model_stats)
     return _anxiety_classifier
 
 
@@ -0,0 +1,236 @@
+"""
+Micro-Batching Module
+Coalesces concurrent single-text requests into shared model forward passes
+"""
+
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+from config import settings
+from metrics import register_stats
+
+from .executor import InferenceExecutor, InferenceOverloaded, get_inference_executor
+
+class MicroBatcher:
+    """
+    Request-coalescing scheduler in front of a batch function
+
+    Callers submit one item and receive a future. A worker thread collects
+    pending items until either max_batch_size items are queued or
+    max_wait_ms has passed since the first one arrived, then runs the batch
+    function once and resolves each caller's future with its own result.
+    With an executor, batches run on its worker threads so the collector
+    keeps filling the next batch; if the executor rejects a batch, its
+    callers' futures fail with InferenceOverloaded.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 10.0,
+        name: str = "batcher",
+        executor: Optional[InferenceExecutor] = None
+    ):
+        """
+        Initialize the micro-batcher
+
+        Args:
+            batch_fn: Function mapping a list of items to a list of results (same order)
+            max_batch_size: Maximum number of items per batch
+            max_wait_ms: Maximum time to wait for a batch to fill (milliseconds)
+            name: Name used in logs and metrics
+            executor: Inference executor that runs the batches (default: run on the collector thread)
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+        self.executor = executor
+
+        self._queue: queue.Queue = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        # Stats
+        self.batches = 0
+        self.items = 0
+        self.errors = 0
+        self.rejected = 0
+        self.max_observed_batch = 0
+
+    def submit(self, item: Any) -> Future:
+        """
+        Submit a single item for batched processing
+
+        Args:
+            item: Item passed to the batch function
+
+        Returns:
+            Future resolved with this item's result
+        """
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item: Any) -> Any:
+        """Submit an item and block until its result is ready"""
+        return self.submit(item).result()
+
+    async def submit_async(self, item: Any) -> Any:
+        """
+        Submit an item and await its result without blocking the event loop
+
+        Args:
+            item: Item passed to the batch function
+
+        Returns:
+            Result for this item
+        """
+        return await asyncio.wrap_future(self.submit(item))
+
+    def shutdown(self):
+        """Stop the worker thread after pending items are processed"""
+        with self._lock:
+            if self._worker is not None:
+                self._queue.put(None)
+                self._worker.join()
+                self._worker = None
+
+    def get_stats(self) -> Dict:
+        """
+        Get batching statistics
+
+        Returns:
+            Dictionary of batcher stats
+        """
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "pending": self._queue.qsize(),
+            "batches": self.batches,
+            "items": self.items,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "average_batch_size": (self.items / self.batches) if self.batches else 0.0,
+            "max_observed_batch": self.max_observed_batch
+        }
+
+    def _ensure_worker(self):
+        """Start the worker thread on first use"""
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run,
+                    name=f"{self.name}-worker",
+                    daemon=True
+                )
+                self._worker.start()
+
+    def _run(self):
+        """Worker loop: collect a batch, run it, resolve futures"""
+        stopping = False
+        while not stopping:
+            entry = self._queue.get()
+            if entry is None:
+                break
+
+            batch = [entry]
+            deadline = time.perf_counter() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is None:
+                    stopping = True
+                    break
+                batch.append(entry)
+
+            self._dispatch(batch)
+    
+    def _dispatch(self, batch: List):
+        """Hand a collected batch to the executor, or run it on this thread"""
+        if self.executor is None:
+            self._process(batch)
+            return
+        try:
+            self.executor.submit(self._process, batch)
+        except InferenceOverloaded as e:
+            self.rejected += len(batch)
+            for _, future in batch:
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(e)
+
+    def _process(self, batch: List):
+        """Run the batch function and hand each caller its result"""
+        # Drop items whose callers already cancelled
+        batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        self.batches += 1
+        self.items += len(batch)
+        self.max_observed_batch = max(self.max_observed_batch, len(batch))
+
+        try:
+            results = self.batch_fn([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(
+                    f"{self.name}: batch function returned {len(results)} results for {len(batch)} items"
+                )
+        except Exception as e:
+            self.errors += 1
+            print(f"{self.name} batch failed: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+
+# Singleton instances
+_emotion_batcher = None
+_anxiety_batcher = None
+
+def get_emotion_batcher() -> MicroBatcher:
+    """Get or create the emotion detection micro-batcher singleton"""
+    global _emotion_batcher
+    if _emotion_batcher is None:
+        from .pipeline import get_analysis_pipeline
+        # Items are PreparedText objects so the tokenization can be shared with the anxiety model
+        _emotion_batcher = MicroBatcher(
+            get_analysis_pipeline().detect_emotions_batch,
+            max_batch_size=settings.BATCH_MAX_SIZE,
+            max_wait_ms=settings.BATCH_MAX_WAIT_MS,
+            name="emotion_batcher",
+            executor=get_inference_executor()
+        )
+        register_stats("emotion_batcher", _emotion_batcher.get_stats)
+    return _emotion_batcher
+
+def get_anxiety_batcher() -> MicroBatcher:
+    """Get or create the anxiety classification micro-batcher singleton"""
+    global _anxiety_batcher
+    if _anxiety_batcher is None:
+        from .pipeline import get_analysis_pipeline
+        # Items are (PreparedText, emotion_scores) tuples so the cascade can gate the model
+        _anxiety_batcher = MicroBatcher(
+            get_analysis_pipeline().detect_anxiety_batch,
+            max_batch_size=settings.BATCH_MAX_SIZE,
+            max_wait_ms=settings.BATCH_MAX_WAIT_MS,
+            name="anxiety_batcher",
+            executor=get_inference_executor()
+        )
+        register_stats("anxiety_batcher", _anxiety_batcher.get_stats)
+    return _anxiety_batcher
@@ -0,0 +1,259 @@
+"""
+NLP Result Cache Module
+Two-tier cache for detector results keyed by normalized text hash and model version
+Tier 1: in-process LRU with TTL, Tier 2: optional shared SQLite file
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+from config import settings
+from metrics import register_stats
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text for cache keys (Unicode NFC, collapsed whitespace)
+    
+    Case is preserved because the emotion model is case-sensitive.
+    
+    Args:
+        text: Raw input text
+    
+    Returns:
+        Normalized text
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class ResultCache:
+    """
+    Versioned result cache for NLP detectors
+    
+    Keys combine the detector namespace, the detector version (model name,
+    backend, precision, pattern hash...), call parameters and the normalized
+    text. A model change therefore never reuses old results, and stale
+    rows are purged from the shared tier the first time a new version is seen.
+    """
+    
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 86400, db_path: str = ""):
+        """
+        Initialize the result cache
+        
+        Args:
+            max_entries: Maximum number of in-process entries (LRU eviction)
+            ttl_seconds: Time-to-live for entries in both tiers
+            db_path: SQLite file for the shared tier (empty to disable)
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        
+        # Tier 1: key -> (expires_at, serialized value)
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        
+        # Tier 2: shared SQLite file
+        self._db: Optional[sqlite3.Connection] = None
+        self._known_versions: Set[Tuple[str, str]] = set()
+        if db_path:
+            self._open_db(db_path)
+        
+        # Stats
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.disk_errors = 0
+    
+    @staticmethod
+    def make_key(namespace: str, version: str, text: str, params: str = "") -> str:
+        """Build the cache key for a detector call"""
+        raw = "\0".join([namespace, version, params, normalize_text(text)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    
+    def get(self, namespace: str, version: str, text: str, params: str = "") -> Optional[Dict]:
+        """
+        Look up a cached result
+        
+        Args:
+            namespace: Detector name (emotion/anxiety)
+            version: Detector version string
+            text: Input text
+            params: Extra call parameters that affect the result
+        
+        Returns:
+            A fresh copy of the cached result, or None on a miss
+        """
+        key = self.make_key(namespace, version, text, params)
+        now = time.time()
+        
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return json.loads(value)
+                del self._memory[key]
+                self.expirations += 1
+        
+        value = self._disk_get(namespace, version, key, now)
+        if value is not None:
+            with self._lock:
+                self.disk_hits += 1
+            self._memory_set(key, value, now + self.ttl_seconds)
+            return json.loads(value)
+        
+        with self._lock:
+            self.misses += 1
+        return None
+    
+    def set(self, namespace: str, version: str, text: str, result: Dict, params: str = ""):
+        """
+        Store a detector result
+        
+        Args:
+            namespace: Detector name (emotion/anxiety)
+            version: Detector version string
+            text: Input text
+            result: JSON-serializable detector result
+            params: Extra call parameters that affect the result
+        """
+        key = self.make_key(namespace, version, text, params)
+        value = json.dumps(result)
+        expires_at = time.time() + self.ttl_seconds
+        
+        self._memory_set(key, value, expires_at)
+        self._disk_set(namespace, version, key, value, expires_at)
+    
+    def clear(self):
+        """Remove every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM nlp_results")
+                self._db.commit()
+    
+    def get_stats(self) -> Dict:
+        """
+        Get cache statistics
+        
+        Returns:
+            Dictionary of cache stats
+        """
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "shared_tier": bool(self._db),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "disk_errors": self.disk_errors
+        }
+    
+    def _memory_set(self, key: str, value: str, expires_at: float):
+        """Insert into the LRU tier, evicting the least recently used entries"""
+        with self._lock:
+            self._memory[key] = (expires_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self.evictions += 1
+    
+    def _open_db(self, db_path: str):
+        """Open (and create) the shared SQLite tier"""
+        try:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(db_path, timeout=5.0, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS nlp_results ("
+                "key TEXT PRIMARY KEY, namespace TEXT NOT NULL, version TEXT NOT NULL, "
+                "value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"NLP cache: shared tier disabled ({e})")
+            self._db = None
+    
+    def _disk_get(self, namespace: str, version: str, key: str, now: float) -> Optional[str]:
+        """Read from the shared tier"""
+        if self._db is None:
+            return None
+        try:
+            with self._lock:
+                self._purge_stale_versions(namespace, version)
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM nlp_results WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error:
+            with self._lock:
+                self.disk_errors += 1
+            return None
+        if row is None or row[1] <= now:
+            return None
+        return row[0]
+    
+    def _disk_set(self, namespace: str, version: str, key: str, value: str, expires_at: float):
+        """Write to the shared tier"""
+        if self._db is None:
+            return
+        try:
+            with self._lock:
+                self._purge_stale_versions(namespace, version)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO nlp_results (key, namespace, version, value, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, namespace, version, value, expires_at)
+                )
+                self._db.commit()
+        except sqlite3.Error:
+            with self._lock:
+                self.disk_errors += 1
+    
+    def _purge_stale_versions(self, namespace: str, version: str):
+        """Delete shared rows written by other versions of a detector (once per version)"""
+        if (namespace, version) in self._known_versions:
+            return
+        self._db.execute(
+            "DELETE FROM nlp_results WHERE namespace = ? AND (version != ? OR expires_at <= ?)",
+            (namespace, version, time.time())
+        )
+        self._db.commit()
+        self._known_versions.add((namespace, version))
+
+
+# Singleton instance
+_result_cache = None
+
+def get_result_cache() -> Optional[ResultCache]:
+    """Get or create the result cache singleton (None when caching is disabled)"""
+    global _result_cache
+    if not settings.NLP_CACHE_ENABLED:
+        return None
+    if _result_cache is None:
+        _result_cache = ResultCache(
+            max_entries=settings.NLP_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.NLP_CACHE_TTL_SECONDS,
+            db_path=settings.NLP_CACHE_DB_PATH
+        )
+        register_stats("nlp_cache", _result_cache.get_stats)
+    return _result_cache
@@ -4,9 +4,266 @@ Tracks conversation history and emotional state transitions
 Provides context-aware responses and memory
 """
 
-from typing import List, Dict, Optional, Tuple
-from datetime import datetime
-from collections import deque
+from typing import Any, List, Dict, Optional, Tuple
+from datetime import datetime, timezone
+from collections import deque, OrderedDict
+from array import array
+import re
+import threading
+import time
+
+from config import settings, EMOTION_LABELS, ANXIETY_LEVELS
+from metrics import register_stats, LatencyTracker
+from .context_store import ContextBackend, InMemoryContextBackend, create_context_backend
+
+# Approximate in-memory sizes (bytes) used for context memory accounting
+_CONTEXT_BASE_BYTES = 1024
+_MESSAGE_BASE_BYTES = 200
+_EMOTION_SNAPSHOT_BYTES = 400
+_RESULT_DICT_BYTES = 1500
+_CRISIS_EVENT_BYTES = 300
+
+
+class _LabelTable:
+    """Interning table mapping labels to small integer codes"""
+    
+    __slots__ = ("codes", "labels")
+    
+    def __init__(self, labels: List[Any]):
+        self.codes: Dict[Any, int] = {}
+        self.labels: List[Any] = []
+        for label in labels:
+            self.code(label)
+    
+    def code(self, label: Any) -> int:
+        """Get the code for a label, adding unseen labels"""
+        code = self.codes.get(label)
+        if code is None:
+            code = len(self.labels)
+            self.codes[label] = code
+            self.labels.append(label)
+        return code
+    
+    def label(self, code: int) -> Any:
+        """Get the label for a code"""
+        return self.labels[code]
+
+
+# Emotion valence and anxiety ordering used by the trend heuristics
+_POSITIVE_EMOTIONS = {"joy", "gratitude", "love", "amusement", "excitement", "optimism"}
+_NEGATIVE_EMOTIONS = {"sadness", "anger", "fear", "grief", "disappointment"}
+_SEVERITY_ORDER = {"none": 0, "low": 1, "mild": 2, "moderate": 3, "severe": 4}
+_VALENCE_WINDOW = 3
+
+# Rolling summary extraction
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_SUMMARY_SENTENCE_CHARS = 160
+
+# Shared label tables (codes are process-local and never persisted)
+_EMOTION_TABLE = _LabelTable(list(EMOTION_LABELS) + [None])
+_SEVERITY_TABLE = _LabelTable(list(ANXIETY_LEVELS.keys()) + ["low", "medium", "high", None])
+
+
+class _RingBuffer:
+    """Ring buffer backed by a typed array (grows up to capacity; capacity 0 = unbounded)"""
+    
+    __slots__ = ("_data", "_capacity", "_start")
+    
+    def __init__(self, typecode: str, capacity: int):
+        self._data = array(typecode)
+        self._capacity = capacity if capacity > 0 else None
+        self._start = 0
+    
+    def append(self, value):
+        """Append a value, overwriting the oldest once full"""
+        if self._capacity is None or len(self._data) < self._capacity:
+            self._data.append(value)
+        else:
+            self._data[self._start] = value
+            self._start = (self._start + 1) % self._capacity
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def __iter__(self):
+        data, start = self._data, self._start
+        for i in range(len(data)):
+            yield data[(start + i) % len(data)]
+    
+    def __getitem__(self, index: int):
+        length = len(self._data)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("ring buffer index out of range")
+        return self._data[(self._start + index) % length]
+    
+    def nbytes(self) -> int:
+        """Bytes used by the backing array"""
+        return self._data.itemsize * len(self._data)
+
+
+class _Trajectory:
+    """
+    Label/confidence/timestamp history stored as parallel ring buffers
+    
+    Also keeps running per-label counts and the total number of entries
+    ever appended; the label list is materialized on demand and cached
+    until the next append.
+    """
+    
+    __slots__ = ("codes", "confidences", "timestamps", "table", "counts", "total", "_labels_cache")
+    
+    def __init__(self, table: _LabelTable, capacity: int):
+        self.table = table
+        self.codes = _RingBuffer("H", capacity)
+        self.confidences = _RingBuffer("d", capacity)
+        self.timestamps = _RingBuffer("d", capacity)
+        self.counts: Dict[int, int] = {}
+        self.total = 0
+        self._labels_cache: Optional[List[Any]] = None
+    
+    def append(self, label: Any, confidence: Optional[float], timestamp: float) -> int:
+        """Append an entry and return its label code"""
+        code = self.table.code(label)
+        self.codes.append(code)
+        # NaN marks a missing confidence
+        self.confidences.append(float("nan") if confidence is None else float(confidence))
+        self.timestamps.append(timestamp)
+        self.counts[code] = self.counts.get(code, 0) + 1
+        self.total += 1
+        self._labels_cache = None
+        return code
+    
+    def __len__(self) -> int:
+        return len(self.codes)
+    
+    def labels(self) -> List[Any]:
+        """
+        Labels in chronological order
+        
+        The returned list is cached and shared between callers; do not modify it.
+        """
+        if self._labels_cache is None:
+            self._labels_cache = [self.table.label(code) for code in self.codes]
+        return self._labels_cache
+    
+    def label_counts(self) -> Dict[Any, int]:
+        """Number of entries per label since the context was created"""
+        return {self.table.label(code): count for code, count in self.counts.items()}
+    
+    def entries(self, label_key: str) -> List[Dict]:
+        """Materialize history entries as dictionaries"""
+        return [
+            {
+                label_key: self.table.label(code),
+                "confidence": None if confidence != confidence else confidence,
+                "timestamp": datetime.fromtimestamp(timestamp).isoformat()
+            }
+            for code, confidence, timestamp in zip(self.codes, self.confidences, self.timestamps)
+        ]
+    
+    def nbytes(self) -> int:
+        return self.codes.nbytes() + self.confidences.nbytes() + self.timestamps.nbytes()
+
+
+class _EmotionSnapshot:
+    """
+    Compact copy of a standard EmotionDetector result
+    
+    Stores all 28 scores in a float64 array and the top emotions as label
+    codes; to_dict() rebuilds the original dictionary exactly.
+    """
+    
+    __slots__ = ("primary", "confidence", "top", "scores")
+    
+    def __init__(self, primary: int, confidence: float, top: array, scores: array):
+        self.primary = primary
+        self.confidence = confidence
+        self.top = top
+        self.scores = scores
+    
+    @classmethod
+    def from_result(cls, result: Dict) -> Optional["_EmotionSnapshot"]:
+        """Compact a result, or return None if it is not in the standard shape"""
+        try:
+            if set(result) != {"primary_emotion", "confidence", "top_emotions", "all_scores"}:
+                return None
+            all_scores = result["all_scores"]
+            if list(all_scores) != EMOTION_LABELS:
+                return None
+            codes = _EMOTION_TABLE.codes
+            top = array("B", [codes[entry["emotion"]] for entry in result["top_emotions"]])
+            for entry in result["top_emotions"]:
+                if set(entry) != {"emotion", "score"} or entry["score"] != all_scores[entry["emotion"]]:
+                    return None
+            if type(result["confidence"]) is not float:
+                return None
+            scores = array("d", all_scores.values())
+            if list(scores) != list(all_scores.values()):
+                return None
+            return cls(codes[result["primary_emotion"]], result["confidence"], top, scores)
+        except (KeyError, TypeError, AttributeError):
+            return None
+    
+    def to_dict(self) -> Dict:
+        labels = _EMOTION_TABLE.labels
+        return {
+            "primary_emotion": labels[self.primary],
+            "confidence": self.confidence,
+            "top_emotions": [
+                {"emotion": labels[code], "score": self.scores[code]}
+                for code in self.top
+            ],
+            "all_scores": dict(zip(EMOTION_LABELS, self.scores))
+        }
+
+
+class _Message:
+    """Compact message record for the sliding window"""
+    
+    __slots__ = ("role", "content", "timestamp", "emotion", "anxiety", "crisis")
+    
+    def __init__(self, role, content, timestamp, emotion, anxiety, crisis):
+        self.role = role
+        self.content = content
+        self.timestamp = timestamp
+        self.emotion = emotion
+        self.anxiety = anxiety
+        self.crisis = crisis
+    
+    def to_dict(self) -> Dict:
+        emotion = self.emotion.to_dict() if isinstance(self.emotion, _EmotionSnapshot) else self.emotion
+        return {
+            "role": self.role,
+            "content": self.content,
+            "timestamp": datetime.fromtimestamp(self.timestamp).isoformat(),
+            "emotion": emotion,
+            "anxiety": self.anxiety,
+            "crisis": self.crisis
+        }
+    
+    def nbytes(self) -> int:
+        size = _MESSAGE_BASE_BYTES + len(self.content)
+        if isinstance(self.emotion, _EmotionSnapshot):
+            size += _EMOTION_SNAPSHOT_BYTES
+        elif self.emotion:
+            size += _RESULT_DICT_BYTES
+        if self.anxiety:
+            size += _RESULT_DICT_BYTES
+        if self.crisis:
+            size += _RESULT_DICT_BYTES
+        return size
+
+
+def _utc_epoch(value: Optional[datetime]) -> float:
+    """Convert a naive UTC datetime (as stored by the models) to epoch seconds"""
+    if value is None:
+        return time.time()
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
 
 class ConversationContext:
     """
@@ -17,8 +274,26 @@ class ConversationContext:
     - Emotional state tracking
     - Topic continuity
     - Crisis history
+    
+    Storage is compact: the window holds __slots__ records with epoch
+    timestamps, standard emotion results are kept as score arrays, and the
+    emotion/anxiety trajectories are typed arrays of integer label codes.
+    Histories are complete by default; a positive CONTEXT_HISTORY_CAPACITY
+    turns them into ring buffers holding only that many latest entries
+    (trajectories, histories and crisis events alike).
     """
     
+    __slots__ = (
+        "conversation_id", "user_id", "window_size", "messages",
+        "_emotion_trajectory", "_anxiety_trajectory", "_crisis_events",
+        "current_emotion", "current_anxiety_level", "crisis_detected",
+        "_created_ts", "_updated_ts", "message_count", "topics",
+        "_recent_valence", "_positive_recent", "_negative_recent",
+        "_last_severity", "_severity_delta", "crisis_count",
+        "_summary_parts", "_summary_chars", "last_turn_id",
+        "_backend_version", "_backend_count"
+    )
+    
     def __init__(self, conversation_id: str, user_id: str, window_size: int = 5):
         """
         Initialize conversation context
@@ -36,22 +311,72 @@ class ConversationContext:
         self.messages: deque = deque(maxlen=window_size)
         
         # Emotional state tracking
-        self.emotion_history: List[Dict] = []
-        self.anxiety_history: List[Dict] = []
-        self.crisis_history: List[Dict] = []
+        capacity = settings.CONTEXT_HISTORY_CAPACITY
+        self._emotion_trajectory = _Trajectory(_EMOTION_TABLE, capacity)
+        self._anxiety_trajectory = _Trajectory(_SEVERITY_TABLE, capacity)
+        self._crisis_events: deque = deque(maxlen=capacity if capacity > 0 else None)
         
         # Current state
         self.current_emotion: Optional[str] = None
         self.current_anxiety_level: Optional[str] = None
         self.crisis_detected: bool = False
         
-        # Conversation metadata
-        self.created_at = datetime.now()
-        self.last_updated = datetime.now()
+        # Running aggregates so stats and trend flags never rescan history
+        self._recent_valence: deque = deque(maxlen=_VALENCE_WINDOW)
+        self._positive_recent = 0
+        self._negative_recent = 0
+        self._last_severity: Optional[int] = None
+        self._severity_delta: Optional[int] = None
+        self.crisis_count = 0
+        
+        # Conversation metadata (epoch seconds)
+        self._created_ts = time.time()
+        self._updated_ts = self._created_ts
         self.message_count = 0
         
         # Topics discussed
         self.topics: List[str] = []
+        
+        # Rolling extractive summary of turns that left the window
+        self._summary_parts: deque = deque()
+        self._summary_chars = 0
+        
+        # Turn ID of the last analysis job applied, so a retried job is not added twice
+        self.last_turn_id: Optional[str] = None
+        
+        # Context backend version this copy is based on, and its message count then
+        self._backend_version: Optional[int] = None
+        self._backend_count = 0
+    
+    @property
+    def created_at(self) -> datetime:
+        return datetime.fromtimestamp(self._created_ts)
+    
+    @property
+    def last_updated(self) -> datetime:
+        return datetime.fromtimestamp(self._updated_ts)
+    
+    @property
+    def emotion_history(self) -> List[Dict]:
+        """Emotion history entries (materialized from the ring buffer)"""
+        return self._emotion_trajectory.entries("emotion")
+    
+    @property
+    def anxiety_history(self) -> List[Dict]:
+        """Anxiety history entries (materialized from the ring buffer)"""
+        return self._anxiety_trajectory.entries("severity")
+    
+    @property
+    def crisis_history(self) -> List[Dict]:
+        """Crisis history entries"""
+        return [
+            {
+                "severity": _SEVERITY_TABLE.label(code),
+                "keywords": list(keywords) if keywords is not None else None,
+                "timestamp": datetime.fromtimestamp(timestamp).isoformat()
+            }
+            for code, keywords, timestamp in self._crisis_events
+        ]
     
     def add_message(
         self, 
@@ -59,7 +384,8 @@ class ConversationContext:
         content: str, 
         emotion: Optional[Dict] = None,
         anxiety: Optional[Dict] = None,
-        crisis: Optional[Dict] = None
+        crisis: Optional[Dict] = None,
+        timestamp: Optional[float] = None
     ):
         """
         Add a message to the conversation context
@@ -70,47 +396,102 @@ class ConversationContext:
             emotion: Emotion detection result
             anxiety: Anxiety detection result
             crisis: Crisis detection result
+            timestamp: Message time in epoch seconds (default: now)
         """
-        message = {
-            "role": role,
-            "content": content,
-            "timestamp": datetime.now().isoformat(),
-            "emotion": emotion,
-            "anxiety": anxiety,
-            "crisis": crisis
-        }
+        now = timestamp if timestamp is not None else time.time()
+        compact_emotion = (_EmotionSnapshot.from_result(emotion) or emotion) if emotion else emotion
         
-        self.messages.append(message)
+        # The oldest message is about to leave the window: keep its gist
+        if len(self.messages) == self.messages.maxlen:
+            self._fold_into_summary(self.messages[0])
+        
+        self.messages.append(_Message(role, content, now, compact_emotion, anxiety, crisis))
         self.message_count += 1
-        self.last_updated = datetime.now()
+        self._updated_ts = now
         
         # Update emotional state
         if emotion and role == "user":
-            self.current_emotion = emotion.get("primary_emotion")
-            self.emotion_history.append({
-                "emotion": self.current_emotion,
-                "confidence": emotion.get("confidence"),
-                "timestamp": datetime.now().isoformat()
-            })
+            self._record_emotion(emotion.get("primary_emotion"), emotion.get("confidence"), now)
         
         # Update anxiety state
         if anxiety and role == "user":
-            self.current_anxiety_level = anxiety.get("severity")
-            self.anxiety_history.append({
-                "severity": self.current_anxiety_level,
-                "confidence": anxiety.get("confidence"),
-                "timestamp": datetime.now().isoformat()
-            })
+            self._record_anxiety(anxiety.get("severity"), anxiety.get("confidence"), now)
         
         # Update crisis state
         if crisis and role == "user":
             if crisis.get("crisis_detected"):
-                self.crisis_detected = True
-                self.crisis_history.append({
-                    "severity": crisis.get("severity"),
-                    "keywords": crisis.get("keywords_found"),
-                    "timestamp": datetime.now().isoformat()
-                })
+                self._record_crisis(crisis.get("severity"), crisis.get("keywords_found"), now)
+    
+    @property
+    def summary(self) -> str:
+        """Rolling summary of messages that have left the sliding window"""
+        return "; ".join(self._summary_parts)
+    
+    def _fold_into_summary(self, msg: _Message):
+        """
+        Add the gist of a message leaving the window to the rolling summary
+        
+        User messages contribute their first sentence plus the detected
+        emotion; the oldest fragments are dropped once the summary exceeds
+        CONTEXT_SUMMARY_MAX_CHARS, so updates are O(1) and size is bounded.
+        """
+        if msg.role != "user":
+            return
+        
+        sentence = _SENTENCE_END.split(msg.content.strip(), maxsplit=1)[0]
+        if len(sentence) > _SUMMARY_SENTENCE_CHARS:
+            sentence = sentence[:_SUMMARY_SENTENCE_CHARS - 3].rstrip() + "..."
+        if not sentence:
+            return
+        
+        if isinstance(msg.emotion, _EmotionSnapshot):
+            emotion = _EMOTION_TABLE.label(msg.emotion.primary)
+        else:
+            emotion = msg.emotion.get("primary_emotion") if msg.emotion else None
+        notes = [emotion] if emotion and emotion != "neutral" else []
+        if msg.crisis and msg.crisis.get("crisis_detected"):
+            notes.append("crisis")
+        
+        fragment = f"user ({', '.join(notes)}): {sentence}" if notes else f"user: {sentence}"
+        self._summary_parts.append(fragment)
+        self._summary_chars += len(fragment) + 2
+        
+        while self._summary_chars > settings.CONTEXT_SUMMARY_MAX_CHARS and len(self._summary_parts) > 1:
+            self._summary_chars -= len(self._summary_parts.popleft()) + 2
+    
+    def _record_emotion(self, emotion: Optional[str], confidence: Optional[float], timestamp: float):
+        """Append to the emotion trajectory and update the rolling valence tallies"""
+        self.current_emotion = emotion
+        self._emotion_trajectory.append(emotion, confidence, timestamp)
+        
+        valence = 1 if emotion in _POSITIVE_EMOTIONS else -1 if emotion in _NEGATIVE_EMOTIONS else 0
+        if len(self._recent_valence) == self._recent_valence.maxlen:
+            dropped = self._recent_valence[0]
+            self._positive_recent -= dropped > 0
+            self._negative_recent -= dropped < 0
+        self._recent_valence.append(valence)
+        self._positive_recent += valence > 0
+        self._negative_recent += valence < 0
+    
+    def _record_anxiety(self, severity: Optional[str], confidence: Optional[float], timestamp: float):
+        """Append to the anxiety trajectory and update the last-severity delta"""
+        self.current_anxiety_level = severity
+        self._anxiety_trajectory.append(severity, confidence, timestamp)
+        
+        level = _SEVERITY_ORDER.get(severity, 0)
+        if self._last_severity is not None:
+            self._severity_delta = level - self._last_severity
+        self._last_severity = level
+    
+    def _record_crisis(self, severity: Optional[str], keywords: Optional[List[str]], timestamp: float):
+        """Record a detected crisis"""
+        self.crisis_detected = True
+        self.crisis_count += 1
+        self._crisis_events.append((
+            _SEVERITY_TABLE.code(severity),
+            tuple(keywords) if keywords is not None else None,
+            timestamp
+        ))
     
     def get_recent_messages(self, n: Optional[int] = None) -> List[Dict]:
         """
@@ -122,9 +503,10 @@ class ConversationContext:
         Returns:
             List of recent messages
         """
-        if n is None:
-            return list(self.messages)
-        return list(self.messages)[-n:]
+        messages = list(self.messages)
+        if n is not None:
+            messages = messages[-n:]
+        return [msg.to_dict() for msg in messages]
     
     def get_context_summary(self) -> str:
         """
@@ -142,8 +524,8 @@ class ConversationContext:
         recent_count = min(3, len(self.messages))
         summary_parts.append(f"Last {recent_count} messages:")
         for msg in list(self.messages)[-recent_count:]:
-            role = msg["role"].capitalize()
-            content_preview = msg["content"][:50] + "..." if len(msg["content"]) > 50 else msg["content"]
+            role = msg.role.capitalize()
+            content_preview = msg.content[:50] + "..." if len(msg.content) > 50 else msg.content
             summary_parts.append(f"  {role}: {content_preview}")
         
         # Emotional state
@@ -165,18 +547,18 @@ class ConversationContext:
         Get the trajectory of emotions throughout the conversation
         
         Returns:
-            List of emotions in chronological order
+            List of emotions in chronological order (cached; do not modify)
         """
-        return [e["emotion"] for e in self.emotion_history]
+        return self._emotion_trajectory.labels()
     
     def get_anxiety_trajectory(self) -> List[str]:
         """
         Get the trajectory of anxiety levels throughout the conversation
         
         Returns:
-            List of anxiety levels in chronological order
+            List of anxiety levels in chronological order (cached; do not modify)
         """
-        return [a["severity"] for a in self.anxiety_history]
+        return self._anxiety_trajectory.labels()
     
     def is_emotion_improving(self) -> Optional[bool]:
         """
@@ -185,21 +567,13 @@ class ConversationContext:
         Returns:
             True if improving, False if worsening, None if insufficient data
         """
-        if len(self.emotion_history) < 2:
+        if self._emotion_trajectory.total < 2:
             return None
         
-        # Simple heuristic: compare recent emotions
-        positive_emotions = {"joy", "gratitude", "love", "amusement", "excitement", "optimism"}
-        negative_emotions = {"sadness", "anger", "fear", "grief", "disappointment"}
-        
-        recent_emotions = [e["emotion"] for e in self.emotion_history[-3:]]
-        
-        positive_count = sum(1 for e in recent_emotions if e in positive_emotions)
-        negative_count = sum(1 for e in recent_emotions if e in negative_emotions)
-        
-        if positive_count > negative_count:
+        # Simple heuristic: compare positive/negative tallies over the last few emotions
+        if self._positive_recent > self._negative_recent:
             return True
-        elif negative_count > positive_count:
+        elif self._negative_recent > self._positive_recent:
             return False
         return None
     
@@ -210,41 +584,164 @@ class ConversationContext:
         Returns:
             True if improving, False if worsening, None if insufficient data
         """
-        if len(self.anxiety_history) < 2:
+        if self._severity_delta is None:
             return None
         
-        severity_order = {"none": 0, "low": 1, "mild": 2, "moderate": 3, "severe": 4}
-        
-        recent = self.anxiety_history[-2:]
-        prev_severity = severity_order.get(recent[0]["severity"], 0)
-        curr_severity = severity_order.get(recent[1]["severity"], 0)
-        
-        if curr_severity < prev_severity:
+        if self._severity_delta < 0:
             return True
-        elif curr_severity > prev_severity:
+        elif self._severity_delta > 0:
             return False
         return None
     
-    def get_conversation_stats(self) -> Dict:
+    def get_conversation_stats(self, include_trajectories: bool = True) -> Dict:
         """
         Get conversation statistics
         
+        Served from running aggregates; trajectories are only materialized
+        when requested (and cached until the next message).
+        
+        Args:
+            include_trajectories: Include the emotion/anxiety trajectory lists
+        
         Returns:
             Dictionary of conversation stats
         """
-        return {
+        stats = {
             "conversation_id": self.conversation_id,
             "user_id": self.user_id,
             "message_count": self.message_count,
-            "duration_minutes": (datetime.now() - self.created_at).total_seconds() / 60,
+            "duration_minutes": (time.time() - self._created_ts) / 60,
             "current_emotion": self.current_emotion,
             "current_anxiety": self.current_anxiety_level,
             "crisis_detected": self.crisis_detected,
-            "emotion_trajectory": self.get_emotional_trajectory(),
-            "anxiety_trajectory": self.get_anxiety_trajectory(),
+            "crisis_count": self.crisis_count,
+            "emotion_counts": self._emotion_trajectory.label_counts(),
+            "anxiety_counts": self._anxiety_trajectory.label_counts(),
             "emotion_improving": self.is_emotion_improving(),
             "anxiety_improving": self.is_anxiety_improving()
         }
+        if include_trajectories:
+            stats["emotion_trajectory"] = self.get_emotional_trajectory()
+            stats["anxiety_trajectory"] = self.get_anxiety_trajectory()
+        return stats
+    
+    def to_dict(self) -> Dict:
+        """
+        Serialize the context to a JSON-compatible dictionary
+        
+        Labels are written as strings (codes are process-local) and
+        timestamps as epoch seconds.
+        
+        Returns:
+            Serialized context
+        """
+        def trajectory(t: _Trajectory) -> Dict:
+            return {
+                "labels": t.labels(),
+                "confidences": [None if c != c else c for c in t.confidences],
+                "timestamps": list(t.timestamps),
+                "counts": [[label, count] for label, count in t.label_counts().items()],
+                "total": t.total
+            }
+        
+        return {
+            "conversation_id": self.conversation_id,
+            "user_id": self.user_id,
+            "window_size": self.window_size,
+            "messages": [
+                {
+                    "role": msg.role,
+                    "content": msg.content,
+                    "timestamp": msg.timestamp,
+                    "emotion": msg.emotion.to_dict() if isinstance(msg.emotion, _EmotionSnapshot) else msg.emotion,
+                    "anxiety": msg.anxiety,
+                    "crisis": msg.crisis
+                }
+                for msg in self.messages
+            ],
+            "emotion_trajectory": trajectory(self._emotion_trajectory),
+            "anxiety_trajectory": trajectory(self._anxiety_trajectory),
+            "crisis_events": [
+                [_SEVERITY_TABLE.label(code), list(keywords) if keywords is not None else None, timestamp]
+                for code, keywords, timestamp in self._crisis_events
+            ],
+            "current_emotion": self.current_emotion,
+            "current_anxiety_level": self.current_anxiety_level,
+            "crisis_detected": self.crisis_detected,
+            "crisis_count": self.crisis_count,
+            "created_at": self._created_ts,
+            "last_updated": self._updated_ts,
+            "message_count": self.message_count,
+            "topics": list(self.topics),
+            "summary": list(self._summary_parts),
+            "last_turn_id": self.last_turn_id
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ConversationContext":
+        """
+        Rebuild a context serialized with to_dict()
+        
+        Args:
+            data: Serialized context
+        
+        Returns:
+            ConversationContext instance
+        """
+        context = cls(data["conversation_id"], data["user_id"], data.get("window_size", 5))
+        
+        for msg in data.get("messages", []):
+            emotion = msg.get("emotion")
+            compact_emotion = (_EmotionSnapshot.from_result(emotion) or emotion) if emotion else emotion
+            context.messages.append(_Message(
+                msg["role"], msg["content"], msg["timestamp"],
+                compact_emotion, msg.get("anxiety"), msg.get("crisis")
+            ))
+        
+        # Replaying the trajectories rebuilds the rolling aggregates
+        for key, record, trajectory in (
+            ("emotion_trajectory", context._record_emotion, context._emotion_trajectory),
+            ("anxiety_trajectory", context._record_anxiety, context._anxiety_trajectory)
+        ):
+            stored = data.get(key) or {}
+            for label, confidence, timestamp in zip(
+                stored.get("labels", []), stored.get("confidences", []), stored.get("timestamps", [])
+            ):
+                record(label, confidence, timestamp)
+            # Lifetime counts may cover more entries than the ring buffer holds
+            if "counts" in stored:
+                trajectory.counts = {
+                    trajectory.table.code(label): count for label, count in stored["counts"]
+                }
+                trajectory.total = stored.get("total", trajectory.total)
+        
+        for severity, keywords, timestamp in data.get("crisis_events", []):
+            context._record_crisis(severity, keywords, timestamp)
+        context.crisis_count = data.get("crisis_count", context.crisis_count)
+        
+        context.current_emotion = data.get("current_emotion")
+        context.current_anxiety_level = data.get("current_anxiety_level")
+        context.crisis_detected = data.get("crisis_detected", False)
+        context._created_ts = data.get("created_at", context._created_ts)
+        context._updated_ts = data.get("last_updated", context._updated_ts)
+        context.message_count = data.get("message_count", 0)
+        context.topics = list(data.get("topics", []))
+        context.last_turn_id = data.get("last_turn_id")
+        for fragment in data.get("summary", []):
+            context._summary_parts.append(fragment)
+            context._summary_chars += len(fragment) + 2
+        return context
+    
+    def estimate_size(self) -> int:
+        """
+        Approximate the memory held by this context
+        
+        Returns:
+            Estimated size in bytes
+        """
+        size = _CONTEXT_BASE_BYTES + sum(msg.nbytes() for msg in self.messages)
+        size += self._emotion_trajectory.nbytes() + self._anxiety_trajectory.nbytes() + self._summary_chars
+        return size + len(self._crisis_events) * _CRISIS_EVENT_BYTES
     
     def should_generate_reflection(self) -> bool:
         """
@@ -258,11 +755,11 @@ class ConversationContext:
         # 2. Some emotional data collected
         # 3. Conversation has been going for at least 5 minutes
         
-        duration_minutes = (datetime.now() - self.created_at).total_seconds() / 60
+        duration_minutes = (time.time() - self._created_ts) / 60
         
         return (
             self.message_count >= 5 and
-            len(self.emotion_history) >= 2 and
+            self._emotion_trajectory.total >= 2 and
             duration_minutes >= 5
         )
 
@@ -270,12 +767,63 @@ class ConversationContext:
 class ContextManager:
     """
     Manages multiple conversation contexts
+    
+    The store is bounded: contexts are kept in least-recently-used order and
+    evicted when the entry limit or the approximate byte budget is exceeded,
+    or when they have been idle longer than the idle TTL.
+    
+    The LRU is a read-through cache in front of a context backend: each
+    lookup checks the stored version and reloads the context only if
+    another worker has saved a newer one. Callers persist changes with
+    save_context(); if another worker saved first, the stored context is
+    re-read, this copy's new messages are replayed onto it and the save is
+    retried. Backend I/O never runs under the manager's lock.
     """
     
-    def __init__(self):
-        """Initialize the context manager"""
-        self.contexts: Dict[str, ConversationContext] = {}
-        print("✅ Context manager initialized")
+    # Compare-and-swap attempts before a save gives up
+    _SAVE_ATTEMPTS = 5
+    
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        idle_ttl_seconds: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        backend: Optional[ContextBackend] = None
+    ):
+        """
+        Initialize the context manager
+        
+        Args:
+            max_entries: Maximum number of contexts (default: CONTEXT_MAX_ENTRIES setting)
+            idle_ttl_seconds: Evict contexts idle longer than this (default: CONTEXT_IDLE_TTL_SECONDS)
+            max_bytes: Approximate memory budget for all contexts (default: CONTEXT_MAX_BYTES)
+            backend: Context backend (default: process-local InMemoryContextBackend)
+        """
+        self.max_entries = max_entries if max_entries is not None else settings.CONTEXT_MAX_ENTRIES
+        self.idle_ttl_seconds = idle_ttl_seconds if idle_ttl_seconds is not None else settings.CONTEXT_IDLE_TTL_SECONDS
+        self.max_bytes = max_bytes if max_bytes is not None else settings.CONTEXT_MAX_BYTES
+        self.backend = backend if backend is not None else InMemoryContextBackend()
+        
+        # LRU order: least recently used first
+        self.contexts: "OrderedDict[str, ConversationContext]" = OrderedDict()
+        self._last_access: Dict[str, float] = {}
+        self._sizes: Dict[str, int] = {}
+        self._total_bytes = 0
+        self._lock = threading.RLock()
+        
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.backend_loads = 0
+        self.backend_errors = 0
+        self.backend_conflicts = 0
+        self.rehydrations = 0
+        self.rehydrated_messages = 0
+        self.rehydration_errors = 0
+        self.rehydration_latency = LatencyTracker()
+        self.evictions = {"capacity": 0, "idle": 0, "memory": 0}
+        
+        print(f"✅ Context manager initialized ({self.backend.name} backend)")
     
     def create_context(self, conversation_id: str, user_id: str) -> ConversationContext:
         """
@@ -288,9 +836,94 @@ class ContextManager:
         Returns:
             New ConversationContext instance
         """
-        context = ConversationContext(conversation_id, user_id)
-        self.contexts[conversation_id] = context
-        return context
+        return self._install(ConversationContext(conversation_id, user_id, settings.CONTEXT_WINDOW_SIZE))
+    
+    def rehydrate_context(self, conversation_id: str, user_id: str, db) -> ConversationContext:
+        """
+        Rebuild a context from the messages table
+        
+        Loads the last CONTEXT_REHYDRATE_MESSAGES messages with a single query
+        on the (conversation_id, timestamp) index, selecting only the columns
+        the context needs, and replays them into a new context. The total
+        message count and first message time come from window functions in
+        the same query.
+        
+        Args:
+            conversation_id: Conversation identifier
+            user_id: User identifier
+            db: SQLAlchemy session
+        
+        Returns:
+            ConversationContext instance (empty if the conversation has no messages)
+        """
+        from sqlalchemy import func
+        from database.models import Message
+        
+        start = time.perf_counter()
+        rows = (
+            db.query(
+                Message.id,
+                Message.role,
+                Message.content,
+                Message.timestamp,
+                Message.emotion,
+                Message.emotion_confidence,
+                Message.emotion_details,
+                Message.anxiety_detected,
+                Message.anxiety_severity,
+                Message.anxiety_confidence,
+                Message.crisis_detected,
+                Message.crisis_severity,
+                Message.crisis_keywords,
+                func.count().over().label("total_messages"),
+                func.min(Message.timestamp).over().label("first_timestamp")
+            )
+            .filter(Message.conversation_id == conversation_id)
+            .order_by(Message.timestamp.desc())
+            .limit(settings.CONTEXT_REHYDRATE_MESSAGES)
+            .all()
+        )
+        
+        context = ConversationContext(conversation_id, user_id, settings.CONTEXT_WINDOW_SIZE)
+        for row in reversed(rows):
+            emotion = row.emotion_details
+            if not emotion and row.emotion:
+                emotion = {"primary_emotion": row.emotion, "confidence": row.emotion_confidence}
+            anxiety = None
+            if row.anxiety_severity is not None:
+                anxiety = {
+                    "anxiety_detected": bool(row.anxiety_detected),
+                    "severity": row.anxiety_severity,
+                    "confidence": row.anxiety_confidence
+                }
+            crisis = None
+            if row.crisis_severity is not None or row.crisis_detected:
+                crisis = {
+                    "crisis_detected": bool(row.crisis_detected),
+                    "severity": row.crisis_severity,
+                    "keywords_found": row.crisis_keywords or []
+                }
+            context.add_message(
+                row.role,
+                row.content,
+                emotion=emotion,
+                anxiety=anxiety,
+                crisis=crisis,
+                timestamp=_utc_epoch(row.timestamp)
+            )
+        
+        if rows:
+            context.message_count = rows[0].total_messages
+            context._created_ts = _utc_epoch(rows[0].first_timestamp)
+            # Messages saved by an analysis job have IDs derived from its turn_id
+            if rows[0].role == "assistant" and rows[0].id.endswith("-assistant"):
+                context.last_turn_id = rows[0].id[:-len("-assistant")]
+        
+        with self._lock:
+            self.rehydrations += 1
+            self.rehydrated_messages += len(rows)
+        self.rehydration_latency.record((time.perf_counter() - start) * 1000.0)
+        return self._install(context)
     
     def get_context(self, conversation_id: str) -> Optional[ConversationContext]:
         """
@@ -302,24 +935,73 @@ class ContextManager:
         Returns:
             ConversationContext if exists, None otherwise
         """
-        return self.contexts.get(conversation_id)
+        with self._lock:
+            self._evict_idle()
+            cached = self.contexts.get(conversation_id)
+        
+        context = self._read_through(conversation_id, cached)
+        
+        with self._lock:
+            if context is not cached:
+                self._remove(conversation_id)
+                if context is not None:
+                    self.contexts[conversation_id] = context
+            if context is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if conversation_id not in self.contexts:
+                self.contexts[conversation_id] = context  # Evicted while the backend was read
+            self._touch(conversation_id, context)
+            self._evict()
+            return context
     
-    def get_or_create_context(self, conversation_id: str, user_id: str) -> ConversationContext:
+    def get_or_create_context(self, conversation_id: str, user_id: str, db=None) -> ConversationContext:
         """
         Get existing context or create new one
         
+        On a miss the context is rehydrated from the stored messages when a
+        database session is given, so evicted or restarted conversations keep
+        their history. The query runs without the manager's lock, so a slow
+        rehydration only delays its own conversation.
+        
         Args:
             conversation_id: Conversation identifier
             user_id: User identifier
+            db: Optional SQLAlchemy session used for rehydration
         
         Returns:
             ConversationContext instance
         """
         context = self.get_context(conversation_id)
         if context is None:
+            if db is not None:
+                try:
+                    return self.rehydrate_context(conversation_id, user_id, db)
+                except Exception as e:
+                    self.rehydration_errors += 1
+                    print(f"Context rehydration failed: {e}")
+                    # Leave the caller's session usable (Postgres aborts the transaction on error)
+                    db.rollback()
             context = self.create_context(conversation_id, user_id)
         return context
     
+    def save_context(self, context: ConversationContext):
+        """
+        Persist changes made to a context
+        
+        Refreshes the memory estimate and writes the context to the backend
+        so other workers see the update.
+        
+        Args:
+            context: Context returned by this manager
+        """
+        with self._lock:
+            if self.contexts.get(context.conversation_id) is context:
+                self._touch(context.conversation_id, context)
+                self._evict()
+        self._save_to_backend(context)
+    
     def delete_context(self, conversation_id: str):
         """
         Delete a conversation context
@@ -327,8 +1009,185 @@ class ContextManager:
         Args:
             conversation_id: Conversation identifier
         """
-        if conversation_id in self.contexts:
-            del self.contexts[conversation_id]
+        with self._lock:
+            self._remove(conversation_id)
+        self.backend.delete(conversation_id)
+    
+    def get_stats(self) -> Dict:
+        """
+        Get context store statistics
+        
+        Returns:
+            Dictionary with size, memory estimate, evictions and hit rate
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "contexts": len(self.contexts),
+                "max_entries": self.max_entries,
+                "approx_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "idle_ttl_seconds": self.idle_ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "evictions": dict(self.evictions),
+                "backend": self.backend.get_stats(),
+                "backend_loads": self.backend_loads,
+                "backend_errors": self.backend_errors,
+                "backend_conflicts": self.backend_conflicts,
+                "rehydrations": self.rehydrations,
+                "rehydrated_messages": self.rehydrated_messages,
+                "rehydration_errors": self.rehydration_errors,
+                "rehydration_latency": self.rehydration_latency.get_stats()
+            }
+    
+    def _install(self, context: ConversationContext) -> ConversationContext:
+        """Insert a new context as most recently used and write it to the backend"""
+        conversation_id = context.conversation_id
+        with self._lock:
+            existing = self.contexts.get(conversation_id)
+            if existing is not None:
+                # Another request built this context first; keep a single copy
+                self._touch(conversation_id, existing)
+                return existing
+            self.contexts[conversation_id] = context
+            self._touch(conversation_id, context)
+            self._evict()
+        self._save_to_backend(context)
+        if self.idle_ttl_seconds:
+            try:
+                self.backend.purge_idle(self.idle_ttl_seconds)
+            except Exception as e:
+                self.backend_errors += 1
+                print(f"Context backend purge failed: {e}")
+        return context
+    
+    def _touch(self, conversation_id: str, context: ConversationContext):
+        """Mark a context as most recently used and refresh its size estimate"""
+        self.contexts.move_to_end(conversation_id)
+        self._last_access[conversation_id] = time.monotonic()
+        size = context.estimate_size()
+        self._total_bytes += size - self._sizes.get(conversation_id, 0)
+        self._sizes[conversation_id] = size
+    
+    def _remove(self, conversation_id: str):
+        """Drop a context and its bookkeeping"""
+        if self.contexts.pop(conversation_id, None) is not None:
+            self._last_access.pop(conversation_id, None)
+            self._total_bytes -= self._sizes.pop(conversation_id, 0)
+    
+    def _read_through(
+        self,
+        conversation_id: str,
+        cached: Optional[ConversationContext]
+    ) -> Optional[ConversationContext]:
+        """Return the cached context if it is current, otherwise the backend's copy (no lock held)"""
+        try:
+            version = self.backend.get_version(conversation_id)
+            if version is None:
+                # Deleted (or never stored) - drop any stale local copy
+                return None
+            if cached is not None and cached._backend_version == version:
+                return cached
+            loaded = self.backend.load(conversation_id)
+        except Exception as e:
+            # Backend unavailable: fall back to the local copy
+            self.backend_errors += 1
+            print(f"Context backend read failed: {e}")
+            return cached
+        
+        if loaded is None:
+            return None
+        version, context = loaded
+        context._backend_version = version
+        context._backend_count = context.message_count
+        self.backend_loads += 1
+        return context
+    
+    def _save_to_backend(self, context: ConversationContext):
+        """Compare-and-swap a context into the backend, merging with newer saves (no lock held)"""
+        conversation_id = context.conversation_id
+        for _ in range(self._SAVE_ATTEMPTS):
+            try:
+                version = self.backend.save(context, expected_version=context._backend_version)
+                if version is not None:
+                    context._backend_version = version
+                    context._backend_count = context.message_count
+                    return
+                # Another worker saved first: rebase this copy onto the stored one
+                self.backend_conflicts += 1
+                loaded = self.backend.load(conversation_id)
+            except Exception as e:
+                self.backend_errors += 1
+                print(f"Context backend write failed: {e}")
+                return
+            
+            if loaded is None:
+                context._backend_version = None  # Deleted meanwhile: store this copy as new
+                continue
+            self._rebase(context, *loaded)
+            with self._lock:
+                if self.contexts.get(conversation_id) is context:
+                    self._touch(conversation_id, context)
+        
+        self.backend_errors += 1
+        print(f"Context backend write for {conversation_id} gave up after {self._SAVE_ATTEMPTS} conflicts")
+    
+    @staticmethod
+    def _rebase(context: ConversationContext, version: int, stored: ConversationContext):
+        """
+        Replace a context's state with the stored one plus the messages it added since its base version
+        
+        Only messages still in the sliding window can be replayed, so at
+        most window_size unsaved messages survive a conflict.
+        """
+        # Private copy: an in-memory backend hands out live objects
+        rebased = ConversationContext.from_dict(stored.to_dict())
+        base_count = rebased.message_count
+        added = context.message_count - context._backend_count
+        if added > 0:
+            for msg in list(context.messages)[-added:]:
+                rebased.add_message(
+                    msg.role,
+                    msg.content,
+                    emotion=msg.emotion.to_dict() if isinstance(msg.emotion, _EmotionSnapshot) else msg.emotion,
+                    anxiety=msg.anxiety,
+                    crisis=msg.crisis,
+                    timestamp=msg.timestamp
+                )
+            rebased.last_turn_id = context.last_turn_id
+        # Adopt the rebased state in place so callers' references stay valid
+        for name in ConversationContext.__slots__:
+            setattr(context, name, getattr(rebased, name))
+        context._backend_version = version
+        context._backend_count = base_count
+    
+    def _evict_idle(self):
+        """Evict contexts idle longer than the TTL (oldest first)"""
+        if not self.idle_ttl_seconds:
+            return
+        cutoff = time.monotonic() - self.idle_ttl_seconds
+        while self.contexts:
+            oldest_id = next(iter(self.contexts))
+            if self._last_access.get(oldest_id, 0) > cutoff:
+                break
+            self._evict_one(oldest_id, "idle")
+    
+    def _evict(self):
+        """Evict least recently used contexts until every limit is satisfied"""
+        self._evict_idle()
+        while len(self.contexts) > max(self.max_entries, 1):
+            self._evict_one(next(iter(self.contexts)), "capacity")
+        # Keep at least the most recently used context even if it alone exceeds the budget
+        while self.max_bytes and self._total_bytes > self.max_bytes and len(self.contexts) > 1:
+            self._evict_one(next(iter(self.contexts)), "memory")
+    
+    def _evict_one(self, conversation_id: str, reason: str):
+        """Evict one context (a process-local backend drops its copy too)"""
+        self._remove(conversation_id)
+        self.backend.release(conversation_id)
+        self.evictions[reason] += 1
 
 
 # Singleton instance
@@ -338,7 +1197,10 @@ def get_context_manager() -> ContextManager:
     """Get or create context manager singleton"""
     global _context_manager
     if _context_manager is None:
-        _context_manager = ContextManager()
+        _context_manager = ContextManager(
+            backend=create_context_backend(settings.CONTEXT_BACKEND, settings.CONTEXT_DB_PATH)
+        )
+        register_stats("context_manager", _context_manager.get_stats)
     return _context_manager
 
 
@@ -0,0 +1,278 @@
+"""
+Context Store Module
+Pluggable backends that hold conversation contexts, in-process or shared between worker processes
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .context import ConversationContext
+
+
+class ContextBackend(ABC):
+    """
+    Interface for conversation context storage
+    
+    Backends store contexts with a version number that increases on every
+    save. ContextManager keeps an in-process LRU in front of the backend
+    and only re-reads a context when its stored version differs from the
+    cached one. Saves are compare-and-swap: a save based on an outdated
+    version is refused, and the manager re-reads, merges and retries.
+    """
+    
+    name = "base"
+    
+    @abstractmethod
+    def get_version(self, conversation_id: str) -> Optional[int]:
+        """Get the stored version of a context, or None if it does not exist"""
+    
+    @abstractmethod
+    def load(self, conversation_id: str) -> Optional[Tuple[int, "ConversationContext"]]:
+        """Load a context as (version, context), or None if it does not exist"""
+    
+    @abstractmethod
+    def save(self, context: "ConversationContext", expected_version: Optional[int] = None) -> Optional[int]:
+        """
+        Store a context if the stored version is still the one the caller read
+        
+        Args:
+            context: Context to store
+            expected_version: Version the caller last read (None: the context must not exist yet)
+        
+        Returns:
+            New stored version, or None if another writer saved first
+        """
+    
+    @abstractmethod
+    def delete(self, conversation_id: str):
+        """Remove a context"""
+    
+    @abstractmethod
+    def purge_idle(self, idle_seconds: float) -> int:
+        """Remove contexts not updated within idle_seconds; returns the number removed"""
+    
+    def release(self, conversation_id: str):
+        """Called when the manager evicts a context from its cache (shared backends keep it)"""
+    
+    def get_stats(self) -> Dict:
+        """Get backend statistics"""
+        return {"backend": self.name}
+
+
+class InMemoryContextBackend(ContextBackend):
+    """
+    Process-local context backend
+    
+    Holds the context objects themselves (no serialization), so it only
+    serves the worker that created them. Contexts evicted from the
+    manager's cache are dropped here too and are rebuilt from the
+    messages table on the next request.
+    """
+    
+    name = "memory"
+    
+    def __init__(self):
+        """Initialize the in-memory backend"""
+        # conversation_id -> (version, context, last update in epoch seconds)
+        self._entries: "OrderedDict[str, Tuple[int, ConversationContext, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        
+        # Stats
+        self.saves = 0
+        self.conflicts = 0
+    
+    def get_version(self, conversation_id: str) -> Optional[int]:
+        entry = self._entries.get(conversation_id)
+        return entry[0] if entry else None
+    
+    def load(self, conversation_id: str) -> Optional[Tuple[int, "ConversationContext"]]:
+        entry = self._entries.get(conversation_id)
+        return (entry[0], entry[1]) if entry else None
+    
+    def save(self, context: "ConversationContext", expected_version: Optional[int] = None) -> Optional[int]:
+        conversation_id = context.conversation_id
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            current = entry[0] if entry else None
+            if current != expected_version:
+                self.conflicts += 1
+                return None
+            version = (current or 0) + 1
+            self._entries[conversation_id] = (version, context, time.time())
+            self._entries.move_to_end(conversation_id)
+        self.saves += 1
+        return version
+    
+    def delete(self, conversation_id: str):
+        with self._lock:
+            self._entries.pop(conversation_id, None)
+    
+    def purge_idle(self, idle_seconds: float) -> int:
+        cutoff = time.time() - idle_seconds
+        removed = 0
+        with self._lock:
+            # Entries are kept in save order, oldest first
+            while self._entries:
+                conversation_id, (_, _, updated_at) = next(iter(self._entries.items()))
+                if updated_at >= cutoff:
+                    break
+                del self._entries[conversation_id]
+                removed += 1
+        return removed
+    
+    def release(self, conversation_id: str):
+        self.delete(conversation_id)
+    
+    def get_stats(self) -> Dict:
+        return {
+            "backend": self.name,
+            "contexts": len(self._entries),
+            "saves": self.saves,
+            "conflicts": self.conflicts
+        }
+
+
+class SQLiteContextBackend(ContextBackend):
+    """
+    Context backend on a local SQLite file in WAL mode
+    
+    Every worker on the node opens the same file, so any worker can serve
+    any conversation without sticky sessions. Contexts are stored as JSON
+    (ConversationContext.to_dict()); saves are conditional UPDATEs on the
+    version column, so concurrent writers never overwrite each other.
+    """
+    
+    name = "sqlite"
+    
+    def __init__(self, db_path: str):
+        """
+        Initialize the SQLite backend
+        
+        Args:
+            db_path: Path of the shared database file
+        """
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self._db = sqlite3.connect(db_path, timeout=5.0, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS conversation_contexts ("
+            "conversation_id TEXT PRIMARY KEY, version INTEGER NOT NULL, "
+            "data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS ix_conversation_contexts_updated_at "
+            "ON conversation_contexts (updated_at)"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+        
+        # Stats
+        self.loads = 0
+        self.saves = 0
+        self.conflicts = 0
+        self.errors = 0
+    
+    def get_version(self, conversation_id: str) -> Optional[int]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT version FROM conversation_contexts WHERE conversation_id = ?",
+                (conversation_id,)
+            ).fetchone()
+        return row[0] if row else None
+    
+    def load(self, conversation_id: str) -> Optional[Tuple[int, "ConversationContext"]]:
+        from .context import ConversationContext
+        
+        with self._lock:
+            row = self._db.execute(
+                "SELECT version, data FROM conversation_contexts WHERE conversation_id = ?",
+                (conversation_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        self.loads += 1
+        return row[0], ConversationContext.from_dict(json.loads(row[1]))
+    
+    def save(self, context: "ConversationContext", expected_version: Optional[int] = None) -> Optional[int]:
+        value = json.dumps(context.to_dict())
+        with self._lock:
+            try:
+                if expected_version is None:
+                    cursor = self._db.execute(
+                        "INSERT OR IGNORE INTO conversation_contexts "
+                        "(conversation_id, version, data, updated_at) VALUES (?, 1, ?, ?)",
+                        (context.conversation_id, value, time.time())
+                    )
+                else:
+                    cursor = self._db.execute(
+                        "UPDATE conversation_contexts SET version = version + 1, data = ?, updated_at = ? "
+                        "WHERE conversation_id = ? AND version = ?",
+                        (value, time.time(), context.conversation_id, expected_version)
+                    )
+                self._db.commit()
+            except sqlite3.Error:
+                self._db.rollback()
+                self.errors += 1
+                raise
+        if cursor.rowcount == 0:
+            self.conflicts += 1
+            return None
+        self.saves += 1
+        return (expected_version or 0) + 1
+    
+    def delete(self, conversation_id: str):
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM conversation_contexts WHERE conversation_id = ?",
+                (conversation_id,)
+            )
+            self._db.commit()
+    
+    def purge_idle(self, idle_seconds: float) -> int:
+        with self._lock:
+            cursor = self._db.execute(
+                "DELETE FROM conversation_contexts WHERE updated_at < ?",
+                (time.time() - idle_seconds,)
+            )
+            self._db.commit()
+        return cursor.rowcount
+    
+    def get_stats(self) -> Dict:
+        return {
+            "backend": self.name,
+            "db_path": self.db_path,
+            "loads": self.loads,
+            "saves": self.saves,
+            "conflicts": self.conflicts,
+            "errors": self.errors
+        }
+
+
+def create_context_backend(kind: str, db_path: str = "") -> ContextBackend:
+    """
+    Create a context backend by name
+    
+    Args:
+        kind: "memory" (process-local) or "sqlite" (shared by all workers on the node)
+        db_path: Database file for the sqlite backend
+    
+    Returns:
+        Backend instance
+    """
+    if kind == "memory":
+        return InMemoryContextBackend()
+    if kind == "sqlite":
+        return SQLiteContextBackend(db_path)
+    raise ValueError(f"Unknown context backend: {kind}")
@@ -5,8 +5,108 @@ Multi-tier severity scoring with immediate intervention triggers
 """
 
 import re
-from typing import Dict, List, Tuple
-from config import CRISIS_RESOURCES, CRISIS_KEYWORDS
+import time
+from typing import Dict, List, Optional, Tuple
+from config import settings, CRISIS_RESOURCES, CRISIS_KEYWORDS
+from metrics import LatencyTracker, register_stats
+
+# Pattern of the form \b(phrase one|phrase two)\b with literal phrases
+_LITERAL_ALTERNATION = re.compile(r"^\\b\(([^()\[\]\\.*+?{}^$]+)\)\\b$")
+
+# Runs of regex word characters (same definition as \w / \b)
+_WORD_RUN = re.compile(r"\w+")
+
+class CrisisPatternScanner:
+    """
+    Single-pass scanner over all crisis pattern tiers
+    
+    Literal word-bounded phrases from every pattern are indexed once by
+    their leading word. Scanning walks the words of the text a single time
+    and only compares the phrases that start with each word, so the first
+    (leftmost) match of every pattern is found in one pass. Patterns that
+    use other regex syntax are precompiled and searched on their own.
+    Results are identical to calling re.search with each pattern.
+    """
+    
+    def __init__(self, tiers: Dict[str, List[str]]):
+        """
+        Compile the scanner
+        
+        Args:
+            tiers: Ordered mapping of tier name to regex patterns
+        """
+        self.tiers = list(tiers.keys())
+        
+        # (tier, pattern) in scan order
+        self._patterns: List[Tuple[str, str]] = [
+            (tier, pattern) for tier, patterns in tiers.items() for pattern in patterns
+        ]
+        
+        # Leading word -> [(pattern index, phrase)] in pattern/alternative order
+        self._phrase_index: Dict[str, List[Tuple[int, str]]] = {}
+        self._standalone: List[Tuple[int, re.Pattern]] = []
+        
+        for index, (_, pattern) in enumerate(self._patterns):
+            phrases = self._literal_phrases(pattern)
+            if phrases is None:
+                self._standalone.append((index, re.compile(pattern)))
+                continue
+            for phrase in phrases:
+                self._phrase_index.setdefault(_WORD_RUN.match(phrase).group(), []).append((index, phrase))
+    
+    def scan(self, text: str) -> Dict[str, List[str]]:
+        """
+        Scan text for every pattern tier in one pass
+        
+        Args:
+            text: Text to scan (already lowercased by the caller)
+        
+        Returns:
+            Dictionary of tier -> matched keywords, one per matching pattern in pattern order
+        """
+        matches: Dict[int, str] = {}
+        text_length = len(text)
+        
+        for word in _WORD_RUN.finditer(text):
+            candidates = self._phrase_index.get(word.group())
+            if not candidates:
+                continue
+            start = word.start()
+            for index, phrase in candidates:
+                if index in matches or not text.startswith(phrase, start):
+                    continue
+                end = start + len(phrase)
+                # Trailing word boundary (phrases always end with a word character)
+                if end == text_length or not (text[end].isalnum() or text[end] == "_"):
+                    matches[index] = phrase
+        
+        for index, regex in self._standalone:
+            match = regex.search(text)
+            if match:
+                matches[index] = match.group()
+        
+        hits: Dict[str, List[str]] = {tier: [] for tier in self.tiers}
+        for index in sorted(matches):
+            hits[self._patterns[index][0]].append(matches[index])
+        return hits
+    
+    @staticmethod
+    def _literal_phrases(pattern: str) -> Optional[List[str]]:
+        """
+        Return the literal phrases of a word-bounded alternation pattern
+        
+        Only phrases that start and end with a word character qualify, which
+        makes the leading-word index exact; anything else returns None.
+        """
+        match = _LITERAL_ALTERNATION.match(pattern)
+        if not match:
+            return None
+        phrases = match.group(1).split("|")
+        for phrase in phrases:
+            if not phrase or not _WORD_RUN.match(phrase) or not (phrase[-1].isalnum() or phrase[-1] == "_"):
+                return None
+        return phrases
+
 
 class CrisisDetector:
     """
@@ -65,14 +165,26 @@ class CrisisDetector:
             r"\b(reasons to live|things to live for)\b"
         ]
         
+        # Compile every tier into a single scanner
+        self.scanner = CrisisPatternScanner({
+            "high": self.high_severity_keywords,
+            "medium": self.medium_severity_keywords,
+            "low": self.low_severity_keywords,
+            "protective": self.protective_factors
+        })
+        
+        # Prescreen timing for the chat fast path
+        self.prescreen_latency = LatencyTracker(budget_ms=settings.CRISIS_PRESCREEN_BUDGET_MS)
+        
         print("✅ Crisis detection system initialized")
     
-    def detect_crisis(self, text: str) -> Dict:
+    def detect_crisis(self, text: str, text_lower: Optional[str] = None) -> Dict:
         """
         Detect crisis indicators in text
         
         Args:
             text: Input text to analyze
+            text_lower: Lowercased text, if the caller already has it
         
         Returns:
             Dictionary containing:
@@ -83,44 +195,59 @@ class CrisisDetector:
             - immediate_intervention: Boolean (requires immediate action)
             - resources: Crisis resources
         """
-        text_lower = text.lower()
-        
-        # Initialize scores
-        high_score = 0
-        medium_score = 0
-        low_score = 0
-        protective_score = 0
-        
-        keywords_found = []
-        
-        # Check high-severity keywords
-        for pattern in self.high_severity_keywords:
-            if re.search(pattern, text_lower):
-                high_score += 1
-                match = re.search(pattern, text_lower)
-                if match:
-                    keywords_found.append(match.group())
-        
-        # Check medium-severity keywords
-        for pattern in self.medium_severity_keywords:
-            if re.search(pattern, text_lower):
-                medium_score += 1
-                match = re.search(pattern, text_lower)
-                if match:
-                    keywords_found.append(match.group())
-        
-        # Check low-severity keywords
-        for pattern in self.low_severity_keywords:
-            if re.search(pattern, text_lower):
-                low_score += 1
-                match = re.search(pattern, text_lower)
-                if match:
-                    keywords_found.append(match.group())
-        
-        # Check protective factors
-        for pattern in self.protective_factors:
-            if re.search(pattern, text_lower):
-                protective_score += 1
+        # Not cached: the scan is cheaper than a cache lookup
+        return self._analyze(text_lower if text_lower is not None else text.lower())
+    
+    def prescreen(self, text: str) -> Dict:
+        """
+        Latency-budgeted crisis screen for the synchronous chat path
+        
+        Runs the compiled scanner inline, bypassing the result cache so no
+        I/O can happen. The whole message is scanned (a phrase anywhere in
+        it must be found); the scan is a single linear pass, and every call
+        is timed against CRISIS_PRESCREEN_BUDGET_MS.
+        
+        Args:
+            text: User message
+        
+        Returns:
+            Crisis detection result (same fields as detect_crisis) plus
+            prescreen timing: elapsed_ms, within_budget
+        """
+        start = time.perf_counter()
+        
+        result = self._analyze(text.lower())
+        
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        within_budget = self.prescreen_latency.record(elapsed_ms)
+        if not within_budget:
+            print(f"Crisis prescreen over budget: {elapsed_ms:.3f} ms")
+        
+        result["prescreen"] = {
+            "elapsed_ms": elapsed_ms,
+            "within_budget": within_budget
+        }
+        return result
+    
+    def _analyze(self, text_lower: str) -> Dict:
+        """
+        Score crisis indicators in lowercase text
+        
+        Args:
+            text_lower: Lowercase text
+        
+        Returns:
+            Crisis detection result
+        """
+        # Scan all tiers in one pass
+        hits = self.scanner.scan(text_lower)
+        
+        high_score = len(hits["high"])
+        medium_score = len(hits["medium"])
+        low_score = len(hits["low"])
+        protective_score = len(hits["protective"])
+        
+        keywords_found = hits["high"] + hits["medium"] + hits["low"]
         
         # Calculate severity
         severity, confidence = self._calculate_severity(
@@ -245,6 +372,7 @@ def get_crisis_detector() -> CrisisDetector:
     global _crisis_detector
     if _crisis_detector is None:
         _crisis_detector = CrisisDetector()
+        register_stats("crisis_prescreen", _crisis_detector.prescreen_latency.get_stats)
     return _crisis_detector
 
 
@@ -0,0 +1,220 @@
+"""
+Inference Executor Module
+Dedicated thread pool for model forward passes with a bounded submission queue
+"""
+
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List
+
+from config import settings
+from metrics import LatencyTracker, register_stats
+
+
+class InferenceOverloaded(RuntimeError):
+    """Raised when the inference queue is full and new work is rejected"""
+
+
+class InferenceExecutor:
+    """
+    Fixed-size worker pool for model inference
+    
+    PyTorch releases the GIL inside forward passes, so a thread pool gives
+    real parallelism without loading the models again in every process.
+    Submissions go through a bounded queue: when it is full, submit()
+    raises InferenceOverloaded instead of letting work pile up. Queue
+    depth and queue wait time are exposed so the API can shed or defer
+    work before it gets that far.
+    """
+    
+    def __init__(
+        self,
+        max_workers: int = 2,
+        max_queue: int = 64,
+        shed_threshold: float = 0.8,
+        name: str = "inference"
+    ):
+        """
+        Initialize the executor
+        
+        Args:
+            max_workers: Number of worker threads running model calls
+            max_queue: Maximum number of queued (not yet running) tasks
+            shed_threshold: Queue fill ratio at which overloaded reports True
+            name: Name used for threads and logs
+        """
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(1, max_queue)
+        self.shed_threshold = shed_threshold
+        self.name = name
+        
+        self._queue: queue.Queue = queue.Queue(maxsize=self.max_queue)
+        self._workers: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        # Counters are updated from the submitting threads and every worker
+        self._stats_lock = threading.Lock()
+        
+        # Stats
+        self.wait_latency = LatencyTracker()
+        self.run_latency = LatencyTracker()
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.shed = 0
+        self.errors = 0
+        self.running = 0
+        self.max_depth = 0
+    
+    def submit(self, fn: Callable, *args: Any) -> Future:
+        """
+        Queue a call for a worker thread
+        
+        Args:
+            fn: Function to run
+            *args: Positional arguments for fn
+        
+        Returns:
+            Future resolved with the function's result
+        
+        Raises:
+            InferenceOverloaded: If the submission queue is full
+        """
+        self._ensure_workers()
+        future: Future = Future()
+        try:
+            self._queue.put_nowait((fn, args, future, time.perf_counter()))
+        except queue.Full:
+            with self._stats_lock:
+                self.rejected += 1
+            raise InferenceOverloaded(f"{self.name}: queue full ({self.max_queue} tasks)")
+        with self._stats_lock:
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+        return future
+    
+    async def run(self, fn: Callable, *args: Any) -> Any:
+        """
+        Run a call on the pool and await its result without blocking the event loop
+        
+        Args:
+            fn: Function to run
+            *args: Positional arguments for fn
+        
+        Returns:
+            The function's result
+        """
+        return await asyncio.wrap_future(self.submit(fn, *args))
+    
+    @property
+    def queue_depth(self) -> int:
+        """Number of tasks waiting for a worker"""
+        return self._queue.qsize()
+    
+    @property
+    def overloaded(self) -> bool:
+        """Whether the queue is filled past the shed threshold"""
+        return self._queue.qsize() >= self.shed_threshold * self.max_queue
+    
+    def record_shed(self):
+        """Count a unit of work the caller deferred because the executor was overloaded"""
+        with self._stats_lock:
+            self.shed += 1
+    
+    def shutdown(self):
+        """Stop the worker threads after queued tasks are processed"""
+        with self._lock:
+            for _ in self._workers:
+                self._queue.put(None)
+            for worker in self._workers:
+                worker.join()
+            self._workers = []
+    
+    def get_stats(self) -> Dict:
+        """
+        Get executor statistics
+        
+        Returns:
+            Dictionary with pool size, queue depth, backpressure state and latencies
+        """
+        with self._stats_lock:
+            counters = {
+                "max_depth": self.max_depth,
+                "running": self.running,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "shed": self.shed,
+                "errors": self.errors
+            }
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "queue_depth": self._queue.qsize(),
+            "overloaded": self.overloaded,
+            **counters,
+            "queue_wait": self.wait_latency.get_stats(),
+            "run_time": self.run_latency.get_stats()
+        }
+    
+    def _ensure_workers(self):
+        """Start the worker threads on first use"""
+        if self._workers:
+            return
+        with self._lock:
+            if not self._workers:
+                for index in range(self.max_workers):
+                    worker = threading.Thread(
+                        target=self._run,
+                        name=f"{self.name}-worker-{index}",
+                        daemon=True
+                    )
+                    worker.start()
+                    self._workers.append(worker)
+    
+    def _run(self):
+        """Worker loop: take a task, run it, resolve its future"""
+        while True:
+            entry = self._queue.get()
+            if entry is None:
+                break
+            fn, args, future, enqueued_at = entry
+            if not future.set_running_or_notify_cancel():
+                continue
+            
+            started = time.perf_counter()
+            self.wait_latency.record((started - enqueued_at) * 1000.0)
+            with self._stats_lock:
+                self.running += 1
+            failed = False
+            try:
+                result = fn(*args)
+            except Exception as e:
+                failed = True
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            finally:
+                with self._stats_lock:
+                    self.running -= 1
+                    self.completed += 1
+                    self.errors += failed
+                self.run_latency.record((time.perf_counter() - started) * 1000.0)
+
+
+# Singleton instance
+_inference_executor = None
+
+def get_inference_executor() -> InferenceExecutor:
+    """Get or create the inference executor singleton"""
+    global _inference_executor
+    if _inference_executor is None:
+        _inference_executor = InferenceExecutor(
+            max_workers=settings.INFERENCE_WORKERS,
+            max_queue=settings.INFERENCE_MAX_QUEUE,
+            shed_threshold=settings.INFERENCE_SHED_THRESHOLD
+        )
+        register_stats("inference_executor", _inference_executor.get_stats)
+    return _inference_executor
@@ -5,8 +5,27 @@ OPTIMIZED FOR SPEED - NO MARKDOWN FORMATTING
 """
 
 import os
-from typing import Dict, List, Optional
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Iterator, List, Optional
 import google.generativeai as genai
+from google.api_core import exceptions as api_exceptions
+import requests
+
+from config import settings
+from metrics import LatencyTracker, register_stats
+from resilience import CircuitBreaker
+from .prompt_builder import PromptBuilder
+
+# Errors raised when a call hits its deadline (DeadlineExceeded is a GatewayTimeout;
+# socket and concurrent.futures timeouts are TimeoutError)
+_TIMEOUT_ERRORS = (
+    api_exceptions.GatewayTimeout,
+    requests.exceptions.Timeout,
+    TimeoutError
+)
 
 class GeminiChat:
     """Gemini-powered chat for mental wellness support"""
@@ -17,8 +36,17 @@ class GeminiChat:
         
         if api_key:
             try:
-                # Configure the standard library
-                genai.configure(api_key=api_key)
+                # Configure the standard library (optionally against a custom REST endpoint,
+                # e.g. a local stand-in server for load testing)
+                if settings.GEMINI_API_ENDPOINT:
+                    genai.configure(
+                        api_key=api_key,
+                        transport="rest",
+                        client_options={"api_endpoint": settings.GEMINI_API_ENDPOINT}
+                    )
+                    print(f"   Using Gemini endpoint: {settings.GEMINI_API_ENDPOINT}")
+                else:
+                    genai.configure(api_key=api_key)
                 # Use the fast and efficient Gemini 2.5 Flash model
                 self.model = genai.GenerativeModel('gemini-2.5-flash')
                 print("✓ Gemini client initialized successfully (Standard Lib)")
@@ -30,6 +58,31 @@ class GeminiChat:
             self.model = None
             print("GEMINI_API_KEY not found - Whiz will use fallback responses")
         
+        # Blocking SDK calls run on a bounded thread pool so async endpoints never
+        # block the event loop; the pool size caps concurrent in-flight requests
+        self.max_concurrency = max(1, settings.GEMINI_MAX_CONCURRENCY)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency,
+            thread_name_prefix="gemini"
+        )
+        self.latency = LatencyTracker()
+        self.prompt_builder = PromptBuilder()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        
+        # Deadline, circuit breaker and optional hedged fallback
+        self.timeout_seconds = settings.GEMINI_TIMEOUT_SECONDS
+        self.hedge_seconds = settings.GEMINI_HEDGE_SECONDS
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.GEMINI_BREAKER_FAILURES,
+            reset_timeout_seconds=settings.GEMINI_BREAKER_RESET_SECONDS,
+            name="gemini"
+        )
+        self.failures = 0
+        self.timeouts = 0
+        self.short_circuited = 0
+        self.hedged_fallbacks = 0
+        
         # System prompt for Whiz personality
         self.system_prompt = """You are Whiz, a warm and empathetic AI companion specializing in mental wellness and emotional support.
 
@@ -63,7 +116,8 @@ If you detect severe distress or suicidal ideation, respond with immediate conce
         emotion: Dict,
         anxiety: Dict,
         crisis: Dict,
-        conversation_history: List[Dict] = None
+        conversation_history: List[Dict] = None,
+        conversation_summary: Optional[str] = None
     ) -> str:
         """
         Generate empathetic response using Gemini (OPTIMIZED)
@@ -74,6 +128,7 @@ If you detect severe distress or suicidal ideation, respond with immediate conce
             anxiety: Anxiety classification results
             crisis: Crisis detection results
             conversation_history: Previous messages for context
+            conversation_summary: Rolling summary of older turns
             
         Returns:
             AI-generated response
@@ -86,46 +141,285 @@ If you detect severe distress or suicidal ideation, respond with immediate conce
             if not self.model:
                 return self._fallback_response(emotion, anxiety, crisis)
             
+            # Circuit open: serve the local fallback without touching the network
+            if not self.breaker.allow():
+                self.short_circuited += 1
+                return self._fallback_response(emotion, anxiety, crisis)
+            
             try:
                 # Construct the prompt
-                full_prompt = f"""{self.system_prompt}
-
-Context: {context}
-
-History: {self._format_history(conversation_history)}
-
-User: {user_message}
-
-Whiz (respond in plain text, no asterisks or markdown):"""
-
-                # Call Gemini API with FAST settings
+                full_prompt = self._build_prompt(user_message, context, conversation_history, conversation_summary)
+                
+                # Call Gemini API with FAST settings and a hard deadline
+                start = time.perf_counter()
                 response = self.model.generate_content(
                     full_prompt,
-                    generation_config={
-                        'temperature': 0.8,
-                        'max_output_tokens': 150,  # Shorter = faster
-                        'top_p': 0.95,
-                        'top_k': 40
-                    }
+                    generation_config=self.generation_config,
+                    request_options=self.request_options
                 )
-                
-                # Extract text safely and remove any markdown
-                if response and response.text:
-                    text = response.text.strip()
-                    # Remove common markdown formatting
-                    text = text.replace('**', '').replace('*', '')
-                    return text
-                else:
-                    return self._fallback_response(emotion, anxiety, crisis)
-                
+                self.latency.record((time.perf_counter() - start) * 1000.0)
+            
             except Exception as api_error:
-                print(f"Gemini error: {str(api_error)}")
+                self._record_api_failure(api_error)
                 return self._fallback_response(emotion, anxiety, crisis)
-                
+            
+            self.breaker.record_success()
+            
+            # Extract text safely and remove any markdown
+            try:
+                text = response.text if response else ""
+            except ValueError:
+                # No text parts (e.g. blocked response)
+                text = ""
+            if text:
+                return self._clean_text(text)
+            return self._fallback_response(emotion, anxiety, crisis)
+        
         except Exception as e:
             print(f"Error generating response: {str(e)}")
             return self._fallback_response(emotion, anxiety, crisis)
     
+    async def generate_response_async(
+        self,
+        user_message: str,
+        emotion: Dict,
+        anxiety: Dict,
+        crisis: Dict,
+        conversation_history: List[Dict] = None,
+        conversation_summary: Optional[str] = None
+    ) -> str:
+        """
+        Generate a response without blocking the event loop
+        
+        Runs generate_response on the Gemini thread pool, so up to
+        GEMINI_MAX_CONCURRENCY requests are in flight at once per worker.
+        In hedged mode (GEMINI_HEDGE_SECONDS > 0) the local fallback is
+        returned if Gemini has not answered by then; the call keeps running
+        in the background (bounded by GEMINI_TIMEOUT_SECONDS) so its outcome
+        still feeds the circuit breaker.
+        
+        Args:
+            user_message: User's message
+            emotion: Emotion detection results
+            anxiety: Anxiety classification results
+            crisis: Crisis detection results
+            conversation_history: Previous messages for context
+            conversation_summary: Rolling summary of older turns
+        
+        Returns:
+            AI-generated response
+        """
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        future = loop.run_in_executor(
+            self._executor,
+            functools.partial(
+                self.generate_response,
+                user_message, emotion, anxiety, crisis, conversation_history, conversation_summary
+            )
+        )
+        future.add_done_callback(self._call_finished)
+        
+        if self.hedge_seconds > 0:
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), timeout=self.hedge_seconds)
+            except asyncio.TimeoutError:
+                self.hedged_fallbacks += 1
+                return self._fallback_response(emotion, anxiety, crisis)
+        return await future
+    
+    def stream_response(
+        self,
+        user_message: str,
+        emotion: Dict,
+        anxiety: Dict,
+        crisis: Dict,
+        conversation_history: List[Dict] = None,
+        conversation_summary: Optional[str] = None
+    ) -> Iterator[str]:
+        """
+        Generate a response as a stream of text chunks
+        
+        Applies the same cleanup as generate_response: asterisks are removed
+        from every chunk, leading whitespace is dropped and trailing
+        whitespace is held back until more text follows, so the joined
+        chunks equal the non-streaming result. Falls back to the canned
+        response if the API fails before producing any text.
+        
+        Args:
+            user_message: User's message
+            emotion: Emotion detection results
+            anxiety: Anxiety classification results
+            crisis: Crisis detection results
+            conversation_history: Previous messages for context
+            conversation_summary: Rolling summary of older turns
+        
+        Yields:
+            Response text chunks
+        """
+        context = self._build_context(user_message, emotion, anxiety, crisis)
+        if not self.model:
+            yield self._fallback_response(emotion, anxiety, crisis)
+            return
+        if not self.breaker.allow():
+            self.short_circuited += 1
+            yield self._fallback_response(emotion, anxiety, crisis)
+            return
+        
+        produced = False
+        finished = False
+        pending_whitespace = ""
+        start = time.perf_counter()
+        try:
+            response = self.model.generate_content(
+                self._build_prompt(user_message, context, conversation_history, conversation_summary),
+                generation_config=self.generation_config,
+                request_options=self.request_options,
+                stream=True
+            )
+            for chunk in response:
+                try:
+                    text = chunk.text or ""
+                except ValueError:
+                    # Chunk without text parts (e.g. final safety/finish metadata)
+                    text = ""
+                text = text.replace('**', '').replace('*', '')
+                if not produced:
+                    text = text.lstrip()
+                body = text.rstrip()
+                if body:
+                    yield pending_whitespace + body
+                    produced = True
+                    pending_whitespace = text[len(body):]
+                elif produced:
+                    pending_whitespace += text
+            self.latency.record((time.perf_counter() - start) * 1000.0)
+            finished = True
+            self.breaker.record_success()
+        except Exception as api_error:
+            finished = True
+            self._record_api_failure(api_error)
+        finally:
+            if not finished:
+                # Closed by the consumer (client disconnected): free a half-open trial slot
+                self.breaker.release()
+        
+        if not produced:
+            yield self._fallback_response(emotion, anxiety, crisis)
+    
+    async def stream_response_async(
+        self,
+        user_message: str,
+        emotion: Dict,
+        anxiety: Dict,
+        crisis: Dict,
+        conversation_history: List[Dict] = None,
+        conversation_summary: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Async version of stream_response
+        
+        Each blocking read from the SDK stream runs on the Gemini thread
+        pool, so streaming never blocks the event loop.
+        
+        Yields:
+            Response text chunks
+        """
+        loop = asyncio.get_running_loop()
+        chunks = self.stream_response(
+            user_message, emotion, anxiety, crisis, conversation_history, conversation_summary
+        )
+        done = object()
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            while True:
+                chunk = await loop.run_in_executor(self._executor, next, chunks, done)
+                if chunk is done:
+                    break
+                yield chunk
+        finally:
+            self.in_flight -= 1
+            try:
+                chunks.close()
+            except ValueError:
+                # Still running on the pool (request cancelled mid-read); it finishes on its own
+                pass
+    
+    def get_stats(self) -> Dict:
+        """
+        Get Gemini call statistics
+        
+        Returns:
+            Dictionary with concurrency and API latency stats
+        """
+        return {
+            "model_available": self.model is not None,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "timeout_seconds": self.timeout_seconds,
+            "hedge_seconds": self.hedge_seconds,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "short_circuited": self.short_circuited,
+            "hedged_fallbacks": self.hedged_fallbacks,
+            "breaker": self.breaker.get_stats(),
+            "prompt": self.prompt_builder.get_stats(),
+            "latency": self.latency.get_stats()
+        }
+    
+    @property
+    def request_options(self) -> Dict:
+        """Per-call SDK options (hard deadline)"""
+        return {"timeout": self.timeout_seconds}
+    
+    def _call_finished(self, future):
+        """Done callback for pooled calls (they may outlive a hedged request)"""
+        self.in_flight -= 1
+    
+    def _record_api_failure(self, error: Exception):
+        """Count a failed API call and feed it to the circuit breaker"""
+        self.failures += 1
+        if isinstance(error, _TIMEOUT_ERRORS):
+            self.timeouts += 1
+            print(f"Gemini timeout after {self.timeout_seconds}s: {str(error)}")
+        else:
+            print(f"Gemini error: {str(error)}")
+        self.breaker.record_failure()
+    
+    @property
+    def generation_config(self) -> Dict:
+        """Generation settings tuned for short, fast replies"""
+        return {
+            'temperature': 0.8,
+            'max_output_tokens': 150,  # Shorter = faster
+            'top_p': 0.95,
+            'top_k': 40
+        }
+    
+    def _build_prompt(
+        self,
+        user_message: str,
+        context: str,
+        conversation_history: Optional[List[Dict]],
+        conversation_summary: Optional[str] = None
+    ) -> str:
+        """Assemble the full prompt sent to Gemini within the input token budget"""
+        return self.prompt_builder.build(
+            self.system_prompt,
+            context,
+            user_message,
+            history=conversation_history,
+            summary=conversation_summary
+        )
+
+    def _clean_text(self, text: str) -> str:
+        """Strip whitespace and common markdown formatting from a response"""
+        text = text.strip()
+        return text.replace('**', '').replace('*', '')
+    
     def _build_context(self, message: str, emotion: Dict, anxiety: Dict, crisis: Dict) -> str:
         """Build context string from analysis results"""
         context_parts = []
@@ -137,25 +431,11 @@ Whiz (respond in plain text, no asterisks or markdown):"""
             context_parts.append(f"Anxiety: {anxiety.get('severity', 'detected')}")
         
         if crisis and crisis.get("crisis_detected"):
-            context_parts.append("⚠️ CRISIS DETECTED")
+            severity = crisis.get("severity")
+            context_parts.append(f"⚠️ CRISIS DETECTED (severity: {severity})" if severity else "⚠️ CRISIS DETECTED")
         
         return " | ".join(context_parts) if context_parts else "Neutral conversation"
     
-    def _format_history(self, history: List[Dict]) -> str:
-        """Format conversation history (last 3 messages only for speed)"""
-        if not history:
-            return "First message"
-        
-        # Only use last 3 messages for speed
-        recent = history[-3:] if len(history) > 3 else history
-        formatted = []
-        for msg in recent:
-            role = msg.get("role", "user")
-            content = msg.get("content", "")[:100]  # Truncate for speed
-            formatted.append(f"{role}: {content}")
-        
-        return " | ".join(formatted)
-    
     def _fallback_response(self, emotion: Dict, anxiety: Dict, crisis: Dict) -> str:
         """Generate fallback response when API fails"""
         
@@ -191,4 +471,5 @@ def get_gemini_chat() -> GeminiChat:
     global _gemini_chat
     if _gemini_chat is None:
         _gemini_chat = GeminiChat()
+        register_stats("gemini", _gemini_chat.get_stats)
     return _gemini_chat
@@ -0,0 +1,188 @@
+"""
+Analysis Orchestrator Module
+Runs the per-message detectors concurrently with per-stage timeouts and latency
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Dict, Optional
+
+from config import settings
+from metrics import LatencyTracker, register_stats
+
+from .executor import InferenceOverloaded, get_inference_executor
+from .pipeline import PreparedText
+
+
+class AnalysisOrchestrator:
+    """
+    Concurrent scheduler for the emotion, anxiety and crisis detectors
+    
+    Crisis detection has no dependencies and runs on a worker thread
+    alongside the model chain. Anxiety needs the emotion scores for its
+    cascade gate, so emotion and anxiety stay in sequence. End-to-end
+    latency is therefore max(crisis, emotion + anxiety) instead of the sum
+    of all three.
+    
+    Every stage has its own timeout. A model stage that times out or fails
+    yields None (anxiety then runs without emotion scores); a crisis stage that does not finish falls back to the
+    inline prescreen, so a crisis result is always returned. When the
+    inference executor is overloaded the analysis is not degraded but
+    deferred: InferenceOverloaded is raised so the caller (the analysis
+    job) can run it again later with every model.
+    """
+    
+    STAGES = ("emotion", "anxiety", "crisis")
+    
+    def __init__(
+        self,
+        emotion_timeout_seconds: Optional[float] = None,
+        anxiety_timeout_seconds: Optional[float] = None,
+        crisis_timeout_seconds: Optional[float] = None
+    ):
+        """
+        Initialize the orchestrator
+        
+        Args:
+            emotion_timeout_seconds: Emotion stage timeout (default: ANALYSIS_EMOTION_TIMEOUT_SECONDS)
+            anxiety_timeout_seconds: Anxiety stage timeout (default: ANALYSIS_ANXIETY_TIMEOUT_SECONDS)
+            crisis_timeout_seconds: Crisis stage timeout (default: ANALYSIS_CRISIS_TIMEOUT_SECONDS)
+        """
+        self.timeouts = {
+            "emotion": emotion_timeout_seconds or settings.ANALYSIS_EMOTION_TIMEOUT_SECONDS,
+            "anxiety": anxiety_timeout_seconds or settings.ANALYSIS_ANXIETY_TIMEOUT_SECONDS,
+            "crisis": crisis_timeout_seconds or settings.ANALYSIS_CRISIS_TIMEOUT_SECONDS
+        }
+        
+        # Stats
+        self.latency = {stage: LatencyTracker() for stage in self.STAGES}
+        self.total_latency = LatencyTracker()
+        self.stage_timeouts = {stage: 0 for stage in self.STAGES}
+        self.stage_errors = {stage: 0 for stage in self.STAGES}
+        self.deferred = 0
+        self.analyses = 0
+    
+    async def analyze(self, prepared: PreparedText) -> Dict:
+        """
+        Run all detectors for one user message
+        
+        Args:
+            prepared: Normalized user message (see AnalysisPipeline.prepare)
+        
+        Returns:
+            Dictionary with emotion and anxiety results (None if skipped),
+            the crisis result, and per-stage timings_ms
+        
+        Raises:
+            InferenceOverloaded: If the model stages cannot be queued right now
+        """
+        from .batching import get_emotion_batcher, get_anxiety_batcher
+        from .crisis import get_crisis_detector
+        
+        start = time.perf_counter()
+        timings: Dict[str, float] = {}
+        crisis_detector = get_crisis_detector()
+        
+        executor = get_inference_executor()
+        if executor.overloaded:
+            # Defer under backpressure so the inference queue cannot grow without bound
+            reason = f"{executor.name}: queue depth {executor.queue_depth}"
+            self._defer(executor, reason)
+            raise InferenceOverloaded(reason)
+        
+        crisis_task = asyncio.ensure_future(
+            self._stage(
+                "crisis",
+                asyncio.to_thread(crisis_detector.detect_crisis, prepared.text, prepared.lower),
+                timings
+            )
+        )
+        
+        try:
+            emotion_result = await self._stage(
+                "emotion", get_emotion_batcher().submit_async(prepared), timings
+            )
+            # Without emotion scores the cascade falls back to its text-only signals
+            emotion_scores = emotion_result["all_scores"] if emotion_result is not None else None
+            anxiety_result = await self._stage(
+                "anxiety", get_anxiety_batcher().submit_async((prepared, emotion_scores)), timings
+            )
+        except InferenceOverloaded as e:
+            # A model stage was rejected by the full queue
+            crisis_task.cancel()
+            self._defer(executor, str(e))
+            raise
+        
+        crisis_result = await crisis_task
+        if crisis_result is None:
+            crisis_result = crisis_detector.prescreen(prepared.text)
+        
+        timings["total"] = (time.perf_counter() - start) * 1000.0
+        self.total_latency.record(timings["total"])
+        self.analyses += 1
+        
+        return {
+            "emotion": emotion_result,
+            "anxiety": anxiety_result,
+            "crisis": crisis_result,
+            "timings_ms": timings
+        }
+    
+    def get_stats(self) -> Dict:
+        """
+        Get orchestrator statistics
+        
+        Returns:
+            Dictionary with per-stage latency, timeout and error counts
+        """
+        return {
+            "analyses": self.analyses,
+            "deferred": self.deferred,
+            "total": self.total_latency.get_stats(),
+            "stages": {
+                stage: {
+                    "timeout_seconds": self.timeouts[stage],
+                    "timeouts": self.stage_timeouts[stage],
+                    "errors": self.stage_errors[stage],
+                    "latency": self.latency[stage].get_stats()
+                }
+                for stage in self.STAGES
+            }
+        }
+    
+    def _defer(self, executor, reason: str):
+        """Count an analysis deferred under backpressure"""
+        executor.record_shed()
+        self.deferred += 1
+        print(f"Inference overloaded, deferring analysis: {reason}")
+    
+    async def _stage(self, stage: str, work: Awaitable, timings: Dict[str, float]) -> Optional[Any]:
+        """Await one stage under its timeout, recording its latency; returns None on failure (overload is raised)"""
+        start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(work, timeout=self.timeouts[stage])
+        except asyncio.TimeoutError:
+            self.stage_timeouts[stage] += 1
+            print(f"Analysis stage {stage} timed out after {self.timeouts[stage]}s")
+        except InferenceOverloaded:
+            raise
+        except Exception as e:
+            self.stage_errors[stage] += 1
+            print(f"Analysis stage {stage} failed: {e}")
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000.0
+            timings[stage] = elapsed_ms
+            self.latency[stage].record(elapsed_ms)
+        return None
+
+
+# Singleton instance
+_analysis_orchestrator = None
+
+def get_analysis_orchestrator() -> AnalysisOrchestrator:
+    """Get or create the analysis orchestrator singleton"""
+    global _analysis_orchestrator
+    if _analysis_orchestrator is None:
+        _analysis_orchestrator = AnalysisOrchestrator()
+        register_stats("analysis", _analysis_orchestrator.get_stats)
+    return _analysis_orchestrator
@@ -0,0 +1,237 @@
+"""
+Analysis Pipeline Module
+Single entry point for per-message analysis with shared preprocessing and tokenization
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import settings
+from metrics import register_stats
+
+
+@dataclass
+class PreparedText:
+    """
+    A user message normalized once and shared by every detector
+    
+    encoding holds the tokenizers.Encoding (without special tokens) once
+    the shared tokenizer has run; None until then or when the detectors'
+    vocabularies differ.
+    """
+    
+    text: str
+    lower: str
+    encoding: Optional[object] = None
+
+
+@dataclass
+class AnalysisResult:
+    """
+    Combined result of the emotion, anxiety and crisis detectors
+    
+    emotion and anxiety are None when their stage was skipped (timeout or
+    failure); crisis is always present.
+    """
+    
+    crisis: Dict
+    emotion: Optional[Dict] = None
+    anxiety: Optional[Dict] = None
+    timings_ms: Dict[str, float] = field(default_factory=dict)
+    
+    @property
+    def primary_emotion(self) -> Optional[str]:
+        return self.emotion["primary_emotion"] if self.emotion else None
+    
+    @property
+    def emotion_confidence(self) -> Optional[float]:
+        return self.emotion["confidence"] if self.emotion else None
+    
+    @property
+    def anxiety_detected(self) -> bool:
+        return bool(self.anxiety and self.anxiety["anxiety_detected"])
+    
+    @property
+    def anxiety_severity(self) -> Optional[str]:
+        return self.anxiety["severity"] if self.anxiety else None
+    
+    @property
+    def anxiety_confidence(self) -> Optional[float]:
+        return self.anxiety["confidence"] if self.anxiety else None
+    
+    @property
+    def crisis_detected(self) -> bool:
+        return bool(self.crisis["crisis_detected"])
+    
+    @property
+    def crisis_severity(self) -> str:
+        return self.crisis["severity"]
+    
+    @property
+    def crisis_keywords(self) -> List[str]:
+        return self.crisis.get("keywords_found", [])
+
+
+class AnalysisPipeline:
+    """
+    Runs every detector on a message from one shared preprocessing pass
+    
+    The message is lowercased once for the marker and crisis scanners.
+    RoBERTa (emotion) and BART (anxiety) use the same byte-level BPE
+    vocabulary, so when the loaded tokenizers agree the text is tokenized
+    once and each model only adds its own special tokens. Detector
+    scheduling (concurrency, timeouts, deferral under backpressure) is
+    delegated to the analysis orchestrator.
+    """
+    
+    # Probe text used to confirm the two tokenizers split text identically
+    _PROBE_TEXT = "I can't stop worrying, my heart's racing... 😟 Tomorrow's interview!"
+    
+    def __init__(self, share_tokenization: Optional[bool] = None):
+        """
+        Initialize the pipeline
+        
+        Args:
+            share_tokenization: Tokenize once for both models when their
+                vocabularies match (default: ANALYSIS_SHARED_TOKENIZATION setting)
+        """
+        from .sentiment import get_emotion_detector
+        from .anxiety import get_anxiety_classifier
+        from .crisis import get_crisis_detector
+        
+        self.emotion_detector = get_emotion_detector()
+        self.anxiety_classifier = get_anxiety_classifier()
+        self.crisis_detector = get_crisis_detector()
+        
+        if share_tokenization is None:
+            share_tokenization = settings.ANALYSIS_SHARED_TOKENIZATION
+        self.shared_tokenizer = self._find_shared_tokenizer() if share_tokenization else None
+        print(f"Analysis pipeline: shared tokenization {'on' if self.shared_tokenizer else 'off'}")
+        
+        # Stats
+        self.shared_encodings = 0
+    
+    def prepare(self, text: str) -> PreparedText:
+        """
+        Normalize a message once for all detectors
+        
+        Args:
+            text: User message
+        
+        Returns:
+            Prepared text (tokenization happens later, on the inference executor)
+        """
+        return PreparedText(text=text, lower=text.lower())
+    
+    async def analyze(self, text: str) -> AnalysisResult:
+        """
+        Run all detectors for one user message
+        
+        Args:
+            text: User message
+        
+        Returns:
+            Combined analysis result
+        """
+        from .orchestrator import get_analysis_orchestrator
+        
+        analysis = await get_analysis_orchestrator().analyze(self.prepare(text))
+        return AnalysisResult(
+            crisis=analysis["crisis"],
+            emotion=analysis["emotion"],
+            anxiety=analysis["anxiety"],
+            timings_ms=analysis["timings_ms"]
+        )
+    
+    def detect_emotions_batch(self, items: List[PreparedText]) -> List[Dict]:
+        """
+        Emotion batch function for the micro-batcher
+        
+        Args:
+            items: Prepared texts
+        
+        Returns:
+            Emotion results (same order as items)
+        """
+        return self.emotion_detector.detect_emotions_batch(
+            [item.text for item in items],
+            top_k=3,
+            encode=self._encoder(items)
+        )
+    
+    def detect_anxiety_batch(self, items: List[Tuple[PreparedText, Optional[Dict]]]) -> List[Dict]:
+        """
+        Anxiety batch function for the micro-batcher
+        
+        Args:
+            items: (prepared text, emotion scores) pairs; the scores drive the cascade gate
+        
+        Returns:
+            Anxiety results (same order as items)
+        """
+        prepared = [item for item, _ in items]
+        return self.anxiety_classifier.detect_anxiety_batch(
+            [item.text for item in prepared],
+            [scores for _, scores in items],
+            texts_lower=[item.lower for item in prepared],
+            encode=self._encoder(prepared),
+            emotion_version=self.emotion_detector.version
+        )
+    
+    def get_stats(self) -> Dict:
+        """
+        Get pipeline statistics
+        
+        Returns:
+            Dictionary with the shared tokenization state
+        """
+        return {
+            "shared_tokenization": self.shared_tokenizer is not None,
+            "shared_encodings": self.shared_encodings
+        }
+    
+    def _encoder(self, items: List[PreparedText]) -> Optional[Callable[[List[int]], List]]:
+        """Encoding lookup by item index for the detectors, so cached items are never tokenized; None when sharing is off"""
+        if self.shared_tokenizer is None:
+            return None
+        return lambda indices: self._encode([items[i] for i in indices])
+    
+    def _encode(self, items: List[PreparedText]) -> List:
+        """Tokenize items that have no shared encoding yet"""
+        pending = [item for item in items if item.encoding is None]
+        if pending:
+            encodings = self.shared_tokenizer.encode_batch(
+                [item.text for item in pending],
+                add_special_tokens=False
+            )
+            for item, encoding in zip(pending, encodings):
+                item.encoding = encoding
+            self.shared_encodings += len(pending)
+        return [item.encoding for item in items]
+    
+    def _find_shared_tokenizer(self):
+        """Return the shared backend tokenizer if both models tokenize text identically"""
+        if self.anxiety_classifier.scoring_mode == "pipeline":
+            return None
+        # Detached copies: padding/truncation left on by Hugging Face calls cannot leak in
+        emotion_tokenizer = self.emotion_detector.backend_tokenizer
+        anxiety_tokenizer = self.anxiety_classifier.backend_tokenizer
+        if emotion_tokenizer is None or anxiety_tokenizer is None:
+            return None
+        if emotion_tokenizer.get_vocab() != anxiety_tokenizer.get_vocab():
+            return None
+        probe_emotion = emotion_tokenizer.encode(self._PROBE_TEXT, add_special_tokens=False).ids
+        probe_anxiety = anxiety_tokenizer.encode(self._PROBE_TEXT, add_special_tokens=False).ids
+        return emotion_tokenizer if probe_emotion == probe_anxiety else None
+
+
+# Singleton instance
+_analysis_pipeline = None
+
+def get_analysis_pipeline() -> AnalysisPipeline:
+    """Get or create the analysis pipeline singleton"""
+    global _analysis_pipeline
+    if _analysis_pipeline is None:
+        _analysis_pipeline = AnalysisPipeline()
+        register_stats("analysis_pipeline", _analysis_pipeline.get_stats)
+    return _analysis_pipeline
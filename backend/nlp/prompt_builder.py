@@ -0,0 +1,145 @@
+"""
+Prompt Builder Module
+Token-budgeted prompt assembly for Gemini chat
+"""
+
+import math
+from typing import Dict, List, Optional
+
+from config import settings
+
+
+def estimate_tokens(text: str, chars_per_token: float = 4.0) -> int:
+    """
+    Estimate the token count of a text
+    
+    Uses a characters-per-token ratio instead of the Gemini count_tokens API,
+    which would add a network round trip to every prompt.
+    
+    Args:
+        text: Input text
+        chars_per_token: Average characters per token
+    
+    Returns:
+        Estimated number of tokens
+    """
+    return math.ceil(len(text) / chars_per_token) if text else 0
+
+
+class PromptBuilder:
+    """
+    Builds chat prompts within a fixed input token budget
+    
+    The system prompt, analysis context and user message are always
+    included. The conversation's rolling summary comes next, then recent
+    turns are added newest first until the budget is used up, so prompt
+    size stays bounded however long the conversation runs while short
+    conversations keep their turns in full.
+    """
+    
+    def __init__(
+        self,
+        input_token_budget: Optional[int] = None,
+        max_turn_tokens: Optional[int] = None,
+        chars_per_token: float = 4.0
+    ):
+        """
+        Initialize the prompt builder
+        
+        Args:
+            input_token_budget: Maximum prompt size in tokens (default: GEMINI_INPUT_TOKEN_BUDGET)
+            max_turn_tokens: Cap for a single history turn (default: GEMINI_MAX_TURN_TOKENS)
+            chars_per_token: Characters per token used for estimates
+        """
+        self.input_token_budget = input_token_budget or settings.GEMINI_INPUT_TOKEN_BUDGET
+        self.max_turn_tokens = max_turn_tokens or settings.GEMINI_MAX_TURN_TOKENS
+        self.chars_per_token = chars_per_token
+        
+        # Stats
+        self.prompts = 0
+        self.total_tokens = 0
+        self.max_tokens = 0
+        self.turns_included = 0
+        self.turns_dropped = 0
+    
+    def build(
+        self,
+        system_prompt: str,
+        context: str,
+        user_message: str,
+        history: Optional[List[Dict]] = None,
+        summary: Optional[str] = None
+    ) -> str:
+        """
+        Assemble the full prompt
+        
+        Args:
+            system_prompt: Assistant instructions
+            context: Analysis context line
+            user_message: Current user message
+            history: Recent messages (oldest first) with role and content
+            summary: Rolling summary of older turns
+        
+        Returns:
+            Prompt text
+        """
+        head = f"{system_prompt}\n\nContext: {context}\n\n"
+        tail = f"\n\nUser: {user_message}\n\nWhiz (respond in plain text, no asterisks or markdown):"
+        remaining = self.input_token_budget - self._tokens(head) - self._tokens(tail)
+        
+        summary_line = ""
+        if summary and remaining > 0:
+            summary_line = self._truncate(f"Earlier in this conversation: {summary}", remaining) + "\n\n"
+            remaining -= self._tokens(summary_line)
+        
+        # Newest turns first until the budget runs out
+        history = history or []
+        turns: List[str] = []
+        for msg in reversed(history):
+            role = msg.get("role", "user")
+            content = msg.get("content", "")
+            limit = min(self.max_turn_tokens, remaining)
+            if limit <= 0:
+                break
+            turn = self._truncate(f"{role}: {content}", limit)
+            turns.append(turn)
+            remaining -= self._tokens(turn) + 1  # separator
+        turns.reverse()
+        
+        self.turns_included += len(turns)
+        self.turns_dropped += len(history) - len(turns)
+        
+        history_text = " | ".join(turns) if turns else ("(see summary)" if summary_line else "First message")
+        prompt = f"{head}{summary_line}History: {history_text}{tail}"
+        
+        tokens = self._tokens(prompt)
+        self.prompts += 1
+        self.total_tokens += tokens
+        self.max_tokens = max(self.max_tokens, tokens)
+        return prompt
+    
+    def get_stats(self) -> Dict:
+        """
+        Get prompt size statistics
+        
+        Returns:
+            Dictionary with budget and estimated token counts
+        """
+        return {
+            "input_token_budget": self.input_token_budget,
+            "prompts": self.prompts,
+            "mean_tokens": (self.total_tokens / self.prompts) if self.prompts else 0.0,
+            "max_tokens": self.max_tokens,
+            "turns_included": self.turns_included,
+            "turns_dropped": self.turns_dropped
+        }
+    
+    def _tokens(self, text: str) -> int:
+        return estimate_tokens(text, self.chars_per_token)
+    
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text to roughly max_tokens, marking the cut with an ellipsis"""
+        max_chars = int(max_tokens * self.chars_per_token)
+        if len(text) <= max_chars:
+            return text
+        return text[:max(0, max_chars - 3)].rstrip() + "..."
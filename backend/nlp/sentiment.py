@@ -4,9 +4,47 @@ Fine-tuned on GoEmotions dataset for 28 emotion labels
 """
 
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from tokenizers import Tokenizer
 import torch
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
+from pathlib import Path
+import copy
+import inspect
+import os
+import uuid
 import numpy as np
+from config import settings
+from .cache import get_result_cache
+
+# Optional ONNX Runtime backend
+try:
+    import onnxruntime as ort
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+except ImportError:
+    ort = None
+
+
+def detached_backend_tokenizer(tokenizer) -> Optional[Tokenizer]:
+    """
+    Private copy of a fast tokenizer's backend with padding and truncation off
+    
+    Hugging Face tokenizer calls store their padding and truncation settings
+    on the shared backend tokenizer and leave them there, which would leak
+    into later encode and post_process calls made on it directly.
+    
+    Args:
+        tokenizer: Hugging Face tokenizer
+    
+    Returns:
+        Backend tokenizer copy, or None for slow (Python) tokenizers
+    """
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    if backend is None:
+        return None
+    backend = Tokenizer.from_str(backend.to_str())
+    backend.no_padding()
+    backend.no_truncation()
+    return backend
 
 class EmotionDetector:
     """
@@ -19,23 +57,48 @@ class EmotionDetector:
       pride, realization, relief, remorse, sadness, surprise, neutral
     """
     
-    def __init__(self, model_name: str = "SamLowe/roberta-base-go_emotions"):
+    def __init__(
+        self,
+        model_name: str = "SamLowe/roberta-base-go_emotions",
+        backend: Optional[str] = None
+    ):
         """
         Initialize the emotion detector
         
         Args:
             model_name: Hugging Face model name (default: pre-trained GoEmotions model)
+            backend: Inference backend, "torch" or "onnx" (default: EMOTION_BACKEND setting)
         """
         print(f"Loading emotion detection model: {model_name}")
         
-        # Load tokenizer and model
+        self.backend = backend or settings.EMOTION_BACKEND
+        if self.backend not in ("torch", "onnx"):
+            raise ValueError(f"Unknown emotion backend: {self.backend}")
+        if self.backend == "onnx" and ort is None:
+            print("onnxruntime not installed - falling back to PyTorch backend")
+            self.backend = "torch"
+        
+        # Result cache (version changes whenever the model or backend does)
+        self.version = f"{model_name}:{self.backend}"
+        self.cache = get_result_cache()
+        
+        # Load tokenizer
         self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self.model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        self.backend_tokenizer = detached_backend_tokenizer(self.tokenizer)
+        self.model = None
+        self.onnx_session = None
         
-        # Set device (GPU if available, else CPU)
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.model.to(self.device)
-        self.model.eval()
+        if self.backend == "onnx":
+            # Int8 ONNX model, exported and quantized once then cached on disk
+            self.device = torch.device("cpu")
+            self.onnx_session = self._load_onnx_session(model_name)
+        else:
+            self.model = AutoModelForSequenceClassification.from_pretrained(model_name)
+            
+            # Set device (GPU if available, else CPU)
+            self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+            self.model.to(self.device)
+            self.model.eval()
         
         # GoEmotions emotion labels
         self.emotion_labels = [
@@ -47,7 +110,7 @@ class EmotionDetector:
             "sadness", "surprise", "neutral"
         ]
         
-        print(f"✅ Emotion detector loaded on {self.device}")
+        print(f"✅ Emotion detector loaded on {self.device} ({self.backend} backend)")
     
     def detect_emotion(self, text: str, top_k: int = 3) -> Dict:
         """
@@ -64,23 +127,232 @@ class EmotionDetector:
             - top_emotions: List of top-k emotions with scores
             - all_scores: All 28 emotion scores
         """
+        params = f"top_k={top_k}"
+        if self.cache is not None:
+            cached = self.cache.get("emotion", self.version, text, params)
+            if cached is not None:
+                return cached
+        
         # Tokenize input
         inputs = self.tokenizer(
             text,
-            return_tensors="pt",
+            return_tensors=self._tensor_type,
             truncation=True,
             max_length=512,
             padding=True
-        ).to(self.device)
+        )
         
         # Get predictions
+        probabilities = self._predict_probabilities(inputs)[0]
+        
+        result = self._build_result(probabilities, top_k)
+        if self.cache is not None:
+            self.cache.set("emotion", self.version, text, result, params)
+        return result
+    
+    def detect_emotions_batch(
+        self,
+        texts: List[str],
+        top_k: int = 3,
+        batch_size: int = 32,
+        encode: Optional[Callable[[List[int]], List]] = None
+    ) -> List[Dict]:
+        """
+        Detect emotions for multiple texts using batched forward passes
+        
+        Cached results are reused; the remaining texts are tokenized together,
+        sorted by token length and split into buckets of up to batch_size so
+        each bucket is only padded to its own longest sequence.
+        
+        Args:
+            texts: List of input texts
+            top_k: Number of top emotions per text
+            batch_size: Maximum number of texts per forward pass
+            encode: Optional function returning tokenizers.Encoding (without special
+                tokens) for the given text indices, from a tokenizer sharing this
+                model's vocabulary; only called for texts not found in the cache
+        
+        Returns:
+            List of emotion detection results (same order as texts)
+        """
+        if not texts:
+            return []
+        
+        params = f"top_k={top_k}"
+        results: List[Optional[Dict]] = [None] * len(texts)
+        if self.cache is not None:
+            for i, text in enumerate(texts):
+                results[i] = self.cache.get("emotion", self.version, text, params)
+        missing = [i for i, result in enumerate(results) if result is None]
+        if not missing:
+            return results
+        
+        if encode is not None:
+            # Reuse the shared tokenization, adding this model's special tokens
+            all_features = [self._features_from_encoding(encoding) for encoding in encode(missing)]
+        else:
+            # Tokenize everything once without padding
+            tokenized = self.tokenizer(
+                [texts[i] for i in missing],
+                truncation=True,
+                max_length=512
+            )
+            all_features = [
+                {key: tokenized[key][i] for key in tokenized.keys()}
+                for i in range(len(missing))
+            ]
+        
+        # Sort by length so each bucket needs minimal padding
+        order = sorted(range(len(missing)), key=lambda i: len(all_features[i]["input_ids"]))
+        
+        for start in range(0, len(order), batch_size):
+            bucket = order[start:start + batch_size]
+            features = [all_features[i] for i in bucket]
+            inputs = self.tokenizer.pad(
+                features,
+                padding=True,
+                return_tensors=self._tensor_type
+            )
+            
+            probabilities = self._predict_probabilities(inputs)
+            
+            for row, idx in enumerate(bucket):
+                result = self._build_result(probabilities[row], top_k)
+                results[missing[idx]] = result
+                if self.cache is not None:
+                    self.cache.set("emotion", self.version, texts[missing[idx]], result, params)
+        
+        return results
+    
+    def _features_from_encoding(self, encoding, max_length: int = 512) -> Dict:
+        """Model inputs for a pre-tokenized text: truncate, then add special tokens"""
+        backend = self.backend_tokenizer
+        limit = max_length - backend.num_special_tokens_to_add(False)
+        if len(encoding.ids) > limit:
+            encoding = copy.deepcopy(encoding)
+            encoding.truncate(limit)
+        final = backend.post_process(encoding)
+        return {"input_ids": final.ids, "attention_mask": final.attention_mask}
+    
+    @property
+    def _tensor_type(self) -> str:
+        """Tensor type the tokenizer should return for the active backend"""
+        return "np" if self.onnx_session is not None else "pt"
+    
+    def _predict_probabilities(self, inputs) -> np.ndarray:
+        """
+        Run the model on tokenized inputs
+        
+        Args:
+            inputs: Tokenizer output (numpy arrays for ONNX, tensors for PyTorch)
+        
+        Returns:
+            Sigmoid probabilities with shape (batch, num_labels)
+        """
+        if self.onnx_session is not None:
+            logits = self.onnx_session.run(
+                ["logits"],
+                {
+                    "input_ids": inputs["input_ids"].astype(np.int64),
+                    "attention_mask": inputs["attention_mask"].astype(np.int64)
+                }
+            )[0]
+            # Apply sigmoid for multi-label classification
+            return 1.0 / (1.0 + np.exp(-logits))
+        
+        inputs = inputs.to(self.device)
         with torch.no_grad():
-            outputs = self.model(**inputs)
-            logits = outputs.logits
+            logits = self.model(**inputs).logits
             
             # Apply sigmoid for multi-label classification
-            probabilities = torch.sigmoid(logits).cpu().numpy()[0]
+            return torch.sigmoid(logits).cpu().numpy()
+    
+    def _load_onnx_session(self, model_name: str):
+        """
+        Load the int8 ONNX model, exporting and quantizing it on first use
+        
+        Artifacts are cached under EMOTION_MODEL_PATH in a folder per model name,
+        so a different model never reuses a stale export. Each process exports
+        to its own temporary files and publishes the result with an atomic
+        rename, so workers starting together never load a partial model.
+        
+        Args:
+            model_name: Hugging Face model name
+        
+        Returns:
+            ONNX Runtime inference session
+        """
+        cache_dir = Path(settings.EMOTION_MODEL_PATH) / model_name.replace("/", "--")
+        int8_path = cache_dir / "model.int8.onnx"
+        
+        if not int8_path.exists():
+            print(f"Exporting emotion model to ONNX: {cache_dir}")
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            suffix = f".{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+            fp32_path = cache_dir / f"model.onnx{suffix}"
+            tmp_int8_path = cache_dir / f"model.int8.onnx{suffix}"
+            try:
+                self._export_onnx(model_name, fp32_path, tmp_int8_path)
+                os.replace(tmp_int8_path, int8_path)
+            finally:
+                fp32_path.unlink(missing_ok=True)
+                tmp_int8_path.unlink(missing_ok=True)
+        
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        return ort.InferenceSession(
+            str(int8_path),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+    
+    def _export_onnx(self, model_name: str, fp32_path: Path, int8_path: Path):
+        """
+        Export the model to fp32 ONNX and quantize its weights to int8
+        
+        Args:
+            model_name: Hugging Face model name
+            fp32_path: Output path of the intermediate fp32 export
+            int8_path: Output path of the quantized model
+        """
+        model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        model.eval()
+        dummy = self.tokenizer("Exporting emotion model", return_tensors="pt")
+        
+        export_kwargs = {}
+        if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+            export_kwargs["dynamo"] = False
+        
+        torch.onnx.export(
+            model,
+            (dummy["input_ids"], dummy["attention_mask"]),
+            str(fp32_path),
+            input_names=["input_ids", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "logits": {0: "batch"}
+            },
+            opset_version=17,
+            **export_kwargs
+        )
+        del model
+        
+        # Dynamic int8 quantization of the weights
+        quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+    
+    def _build_result(self, probabilities: np.ndarray, top_k: int) -> Dict:
+        """
+        Build the emotion result dictionary from label probabilities
+        
+        Args:
+            probabilities: Sigmoid scores for all emotion labels
+            top_k: Number of top emotions to return
         
+        Returns:
+            Emotion detection result
+        """
         # Get top-k emotions
         top_indices = np.argsort(probabilities)[-top_k:][::-1]
         top_emotions = [
@@ -109,19 +381,6 @@ class EmotionDetector:
             "all_scores": all_scores
         }
     
-    def detect_emotions_batch(self, texts: List[str], top_k: int = 3) -> List[Dict]:
-        """
-        Detect emotions for multiple texts
-        
-        Args:
-            texts: List of input texts
-            top_k: Number of top emotions per text
-        
-        Returns:
-            List of emotion detection results
-        """
-        return [self.detect_emotion(text, top_k) for text in texts]
-    
     def get_emotion_category(self, emotion: str) -> str:
         """
         Categorize emotion into broader categories
@@ -0,0 +1,167 @@
+"""
+Per-Key Ordering Module
+Serializes work per key (e.g. conversation) in arrival order while different keys run in parallel
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Set
+
+from config import settings
+from metrics import register_stats
+
+
+class _KeyState:
+    """Ticket counters for one key"""
+    
+    __slots__ = ("next_ticket", "serving", "abandoned", "condition")
+    
+    def __init__(self):
+        self.next_ticket = 0
+        self.serving = 0
+        self.abandoned: Set[int] = set()
+        self.condition = asyncio.Condition()
+
+
+class KeyedSequencer:
+    """
+    Ticket-based keyed lock for asyncio code
+    
+    A caller reserves a ticket when the work arrives (synchronously, so the
+    order matches request order) and later enters turn(key, ticket), which
+    waits until every earlier ticket for the same key has finished. Keys
+    are independent, and per-key state is dropped once no tickets are
+    outstanding. Tickets that will never run must be abandoned so later
+    ones are not held up; a wait timeout guards against leaks.
+    """
+    
+    def __init__(self, wait_timeout_seconds: float = 30.0):
+        """
+        Initialize the sequencer
+        
+        Args:
+            wait_timeout_seconds: Maximum time to wait for a turn before running out of order
+        """
+        self.wait_timeout_seconds = wait_timeout_seconds
+        self._states: Dict[str, _KeyState] = {}
+        
+        # Stats
+        self.completed = 0
+        self.abandoned = 0
+        self.timeouts = 0
+        self.max_depth = 0
+    
+    def reserve(self, key: str) -> int:
+        """
+        Reserve the next ticket for a key
+        
+        Args:
+            key: Serialization key (e.g. conversation ID)
+        
+        Returns:
+            Ticket number to pass to turn() or abandon()
+        """
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _KeyState()
+        ticket = state.next_ticket
+        state.next_ticket += 1
+        self.max_depth = max(self.max_depth, state.next_ticket - state.serving)
+        return ticket
+    
+    async def abandon(self, key: str, ticket: int):
+        """
+        Give up a reserved ticket without running it
+        
+        Args:
+            key: Serialization key
+            ticket: Ticket returned by reserve()
+        """
+        self.abandoned += 1
+        await self._finish(key, ticket)
+    
+    @asynccontextmanager
+    async def turn(self, key: str, ticket: Optional[int] = None):
+        """
+        Run a block once every earlier ticket for the key has finished
+        
+        Args:
+            key: Serialization key
+            ticket: Ticket from reserve() (default: reserve one now)
+        """
+        if ticket is None:
+            ticket = self.reserve(key)
+        state = self._states[key]
+        
+        async with state.condition:
+            try:
+                await asyncio.wait_for(
+                    state.condition.wait_for(lambda: state.serving == ticket),
+                    timeout=self.wait_timeout_seconds
+                )
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                print(f"Ordering: ticket {ticket} for {key} timed out waiting for its turn")
+        
+        try:
+            yield
+        finally:
+            self.completed += 1
+            await self._finish(key, ticket)
+    
+    def queue_depth(self, key: str) -> int:
+        """Number of outstanding tickets (running or waiting) for a key"""
+        state = self._states.get(key)
+        return state.next_ticket - state.serving if state is not None else 0
+    
+    def get_stats(self, top_n: int = 20) -> Dict:
+        """
+        Get sequencer statistics
+        
+        Args:
+            top_n: Number of deepest keys to report individually
+        
+        Returns:
+            Dictionary with active keys, queue depths and counters
+        """
+        depths = {key: state.next_ticket - state.serving for key, state in list(self._states.items())}
+        deepest = sorted(depths.items(), key=lambda item: item[1], reverse=True)[:top_n]
+        return {
+            "active_keys": len(depths),
+            "outstanding": sum(depths.values()),
+            "queue_depths": dict(deepest),
+            "max_depth": self.max_depth,
+            "completed": self.completed,
+            "abandoned": self.abandoned,
+            "timeouts": self.timeouts
+        }
+    
+    async def _finish(self, key: str, ticket: int):
+        """Advance past a finished or abandoned ticket and wake the next waiter"""
+        state = self._states.get(key)
+        if state is None:
+            return
+        async with state.condition:
+            if state.serving == ticket:
+                state.serving += 1
+                while state.serving in state.abandoned:
+                    state.abandoned.discard(state.serving)
+                    state.serving += 1
+            elif ticket > state.serving:
+                # Finished out of order (after a timeout): skip it when its turn comes
+                state.abandoned.add(ticket)
+            state.condition.notify_all()
+            if state.serving >= state.next_ticket:
+                del self._states[key]
+
+
+# Singleton instance
+_conversation_sequencer = None
+
+def get_conversation_sequencer() -> KeyedSequencer:
+    """Get or create the per-conversation sequencer singleton"""
+    global _conversation_sequencer
+    if _conversation_sequencer is None:
+        _conversation_sequencer = KeyedSequencer(settings.CONVERSATION_ORDER_TIMEOUT_SECONDS)
+        register_stats("conversation_ordering", _conversation_sequencer.get_stats)
+    return _conversation_sequencer
@@ -0,0 +1,118 @@
+"""
+Resilience Module
+Circuit breaker for calls to external services
+"""
+
+import threading
+import time
+from typing import Dict
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+    
+    closed:    calls pass through; failure_threshold consecutive failures open it
+    open:      calls are rejected until reset_timeout_seconds have passed
+    half_open: a single trial call is allowed; success closes, failure re-opens
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout_seconds: float = 30.0, name: str = "breaker"):
+        """
+        Initialize the breaker
+        
+        Args:
+            failure_threshold: Consecutive failures that open the breaker
+            reset_timeout_seconds: Time the breaker stays open before a trial call
+            name: Name used in logs
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout_seconds = reset_timeout_seconds
+        self.name = name
+        
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        
+        # Stats
+        self.consecutive_failures = 0
+        self.times_opened = 0
+        self.rejected = 0
+    
+    @property
+    def state(self) -> str:
+        """Current state (an open breaker reports half_open once the reset timeout has passed)"""
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout_seconds:
+                return self.HALF_OPEN
+            return self._state
+    
+    def allow(self) -> bool:
+        """
+        Check whether a call may proceed
+        
+        Returns:
+            True if the call should be attempted, False to short-circuit
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout_seconds:
+                    self.rejected += 1
+                    return False
+                self._state = self.HALF_OPEN
+            # Half-open: only one trial call at a time
+            if self._trial_in_flight:
+                self.rejected += 1
+                return False
+            self._trial_in_flight = True
+            return True
+    
+    def record_success(self):
+        """Record a successful call"""
+        with self._lock:
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+            if self._state != self.CLOSED:
+                print(f"{self.name}: circuit closed")
+            self._state = self.CLOSED
+    
+    def record_failure(self):
+        """Record a failed call"""
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or (
+                self._state == self.CLOSED and self.consecutive_failures >= self.failure_threshold
+            ):
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self.times_opened += 1
+                print(f"{self.name}: circuit opened after {self.consecutive_failures} consecutive failures")
+    
+    def release(self):
+        """Give up a call whose outcome is unknown (e.g. a stream closed by the client) without judging it"""
+        with self._lock:
+            self._trial_in_flight = False
+    
+    def get_stats(self) -> Dict:
+        """
+        Get breaker statistics
+        
+        Returns:
+            Dictionary with state and counters
+        """
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "reset_timeout_seconds": self.reset_timeout_seconds,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected
+        }
@@ -0,0 +1,12 @@
+"""
+Test configuration
+Makes the backend importable and points the database package at a scratch SQLite database
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# database.connection requires DATABASE_URL at import time
+os.environ.setdefault("DATABASE_URL", "sqlite://")
@@ -0,0 +1,117 @@
+"""
+Tests for conversation contexts and the analysis job's context updates
+"""
+
+import asyncio
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import api.chat as chat
+from config import settings
+from database.models import Base, Conversation, Message, User
+from nlp.context import ContextManager, ConversationContext
+from nlp.pipeline import AnalysisResult
+
+
+@pytest.fixture
+def session_factory():
+    """Sessions on a private in-memory database with the full schema"""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as session:
+        session.add(User(id="user-1"))
+        session.add(Conversation(id="conversation-1", user_id="user-1"))
+        session.commit()
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+def test_last_turn_id_survives_serialization():
+    context = ConversationContext("conversation-1", "user-1")
+    context.add_message("user", "hello")
+    context.last_turn_id = "turn-1"
+    
+    restored = ConversationContext.from_dict(context.to_dict())
+    
+    assert restored.last_turn_id == "turn-1"
+
+
+def test_rehydration_recovers_last_turn_id(session_factory):
+    timestamp = datetime.utcnow()
+    with session_factory() as session:
+        session.add(Message(
+            id="turn-1-user", conversation_id="conversation-1",
+            role="user", content="hello", timestamp=timestamp
+        ))
+        session.add(Message(
+            id="turn-1-assistant", conversation_id="conversation-1",
+            role="assistant", content="hi", timestamp=timestamp + timedelta(microseconds=1)
+        ))
+        session.commit()
+    
+    with session_factory() as session:
+        context = ContextManager().rehydrate_context("conversation-1", "user-1", session)
+    
+    assert context.message_count == 2
+    assert context.last_turn_id == "turn-1"
+
+
+def test_retried_analysis_job_adds_turn_once(session_factory, monkeypatch):
+    manager = ContextManager()
+    outcomes = [False, True]  # The first write fails, so the job is retried
+    
+    class Pipeline:
+        async def analyze(self, text):
+            return AnalysisResult(crisis={"crisis_detected": False, "severity": "none", "keywords_found": []})
+    
+    class Writer:
+        def submit(self, *args, **kwargs):
+            future = Future()
+            future.set_result(outcomes.pop(0))
+            return future
+    
+    monkeypatch.setattr(chat, "get_nlp_modules", lambda: (None, None, None, manager))
+    monkeypatch.setattr(chat, "get_analysis_pipeline", lambda: Pipeline())
+    monkeypatch.setattr(chat, "get_message_writer", lambda: Writer())
+    
+    def run_job():
+        return chat.perform_background_analysis_and_save(
+            "user-1", "conversation-1", "hello", "hi there", session_factory(), turn_id="turn-1"
+        )
+    
+    with pytest.raises(RuntimeError):
+        asyncio.run(run_job())
+    asyncio.run(run_job())
+    
+    context = manager.get_context("conversation-1")
+    assert context.message_count == 2
+    assert [msg["role"] for msg in context.get_recent_messages()] == ["user", "assistant"]
+    assert context.last_turn_id == "turn-1"
+
+
+def test_trajectories_keep_complete_history():
+    context = ConversationContext("conversation-1", "user-1")
+    emotions = ["joy", "sadness", "fear"] * 100
+    for emotion in emotions:
+        context.add_message("user", "text", emotion={"primary_emotion": emotion, "confidence": 0.5})
+    
+    assert context.get_emotional_trajectory() == emotions
+    assert len(context.emotion_history) == len(emotions)
+
+
+def test_history_capacity_keeps_latest_entries(monkeypatch):
+    monkeypatch.setattr(settings, "CONTEXT_HISTORY_CAPACITY", 4)
+    context = ConversationContext("conversation-1", "user-1")
+    for severity in ["none", "mild", "moderate", "severe", "mild", "none"]:
+        context.add_message("user", "text", anxiety={"severity": severity, "confidence": 0.5})
+    
+    assert context.get_anxiety_trajectory() == ["moderate", "severe", "mild", "none"]
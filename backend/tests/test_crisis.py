@@ -0,0 +1,80 @@
+"""
+Tests for crisis detection
+"""
+
+import random
+import re
+
+import pytest
+
+from nlp.crisis import CrisisDetector, CrisisPatternScanner
+
+
+@pytest.fixture(scope="module")
+def detector():
+    return CrisisDetector()
+
+
+def _regex_scan(tiers, text):
+    """Reference result: one re.search per pattern, as the scanner replaces"""
+    hits = {}
+    for tier, patterns in tiers.items():
+        hits[tier] = []
+        for pattern in patterns:
+            match = re.search(pattern, text)
+            if match:
+                hits[tier].append(match.group())
+    return hits
+
+
+def _random_text(rng, phrases, fragments):
+    """Random text mixing whole phrases, near misses, word characters, punctuation and spacing"""
+    pieces = []
+    for _ in range(rng.randint(1, 30)):
+        kind = rng.random()
+        if kind < 0.3:
+            pieces.append(rng.choice(phrases))
+        elif kind < 0.6:
+            pieces.append(rng.choice(fragments))
+        elif kind < 0.8:
+            pieces.append(rng.choice(["i", "am", "the", "so", "myself", "to", "can't", "don't", "a"]))
+        else:
+            pieces.append(rng.choice(["_", "1", "é", "-", "'", ".", ",", "!", "\n", ""]))
+    separators = [" ", " ", " ", "", "  ", "\n", "-", "_", "."]
+    return "".join(piece + rng.choice(separators) for piece in pieces)
+
+
+def test_scanner_matches_regex_search(detector):
+    tiers = {
+        "high": detector.high_severity_keywords,
+        "medium": detector.medium_severity_keywords,
+        "low": detector.low_severity_keywords,
+        "protective": detector.protective_factors
+    }
+    scanner = CrisisPatternScanner(tiers)
+    
+    phrases = []
+    for patterns in tiers.values():
+        for pattern in patterns:
+            phrases.extend(CrisisPatternScanner._literal_phrases(pattern) or [])
+    # Near misses: truncated phrases and phrases glued to word characters
+    fragments = (
+        [phrase[:-1] for phrase in phrases] +
+        [phrase + "s" for phrase in phrases] +
+        ["x" + phrase for phrase in phrases] +
+        [phrase.replace(" ", "  ") for phrase in phrases]
+    )
+    
+    rng = random.Random(20240607)
+    for _ in range(20000):
+        text = _random_text(rng, phrases, fragments).lower()
+        assert scanner.scan(text) == _regex_scan(tiers, text), text
+
+
+def test_scanner_handles_non_literal_patterns():
+    tiers = {"high": [r"\b(kill myself)\b", r"\bcan'?t go on\b"], "low": [r"\b(tired)\b"]}
+    scanner = CrisisPatternScanner(tiers)
+    
+    for text in ["i cant go on", "i can't go on, so tired", "killing myself", "kill myself_"]:
+        assert scanner.scan(text) == _regex_scan(tiers, text)
+
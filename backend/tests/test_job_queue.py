@@ -0,0 +1,60 @@
+"""
+Tests for the durable analysis job queue
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database.job_queue import JobQueue
+from database.models import AnalysisJob
+from worker import JobWorker
+
+
+@pytest.fixture
+def session_factory():
+    """Sessions on a private in-memory database holding only analysis_jobs"""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    AnalysisJob.__table__.create(bind=engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+def test_publish_after_expired_reservation_keeps_job_kind(session_factory):
+    # Reservations expire immediately, as if the reply took longer than the reserve timeout
+    queue = JobQueue(session_factory=session_factory, reserve_timeout_seconds=0)
+    job_id = queue.reserve("analyze_message", "conversation-1")
+    
+    # Claim housekeeping drops the expired reservation
+    assert queue.claim() == []
+    with session_factory() as session:
+        assert session.get(AnalysisJob, job_id) is None
+    
+    payload = {"conversation_id": "conversation-1", "user_message": "hello"}
+    queue.publish(job_id, "analyze_message", payload)
+    assert queue.expired_reservations == 2  # dropped by claim(), then re-created by publish()
+    
+    jobs = queue.claim()
+    assert len(jobs) == 1
+    assert jobs[0]["kind"] == "analyze_message"
+    
+    handled = []
+    
+    async def handler(job_payload):
+        handled.append(job_payload)
+    
+    worker = JobWorker(queue, handlers={"analyze_message": handler})
+    asyncio.run(worker._process(jobs[0]))
+    
+    assert handled == [payload]
+    assert worker.succeeded == 1
+    assert worker.errors == 0
+    with session_factory() as session:
+        assert session.query(AnalysisJob).count() == 0
@@ -0,0 +1,58 @@
+"""
+Tests for the write-behind message buffer
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database.models import Base, Conversation, Message, User
+from database.write_behind import MessageWriter
+
+
+@pytest.fixture
+def session_factory():
+    """Sessions on a private in-memory database with one conversation"""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as session:
+        session.add(User(id="user-1"))
+        session.add(Conversation(id="conversation-1", user_id="user-1"))
+        session.commit()
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+def test_cancelled_waiter_does_not_stop_the_writer(session_factory):
+    writer = MessageWriter(session_factory=session_factory, flush_ms=100.0)
+    
+    async def scenario():
+        # The caller gives up while its turn is still buffered
+        waiting = asyncio.ensure_future(writer.submit_async(
+            "conversation-1", {"content": "first"}, {"content": "reply"}, turn_id="turn-1"
+        ))
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        await asyncio.sleep(0.2)
+        
+        # The worker thread is still running, so later turns are saved
+        return await asyncio.wait_for(writer.submit_async(
+            "conversation-1", {"content": "second"}, {"content": "reply"}, turn_id="turn-2"
+        ), timeout=2.0)
+    
+    try:
+        assert asyncio.run(scenario()) is True
+    finally:
+        writer.shutdown()
+    
+    with session_factory() as session:
+        # The cancelled turn was written too
+        assert session.query(Message).count() == 4
+        assert session.get(Conversation, "conversation-1").message_count == 4
@@ -0,0 +1,220 @@
+"""
+Serenia Analysis Worker
+Claims durable analysis jobs from the job queue and runs them
+
+Run standalone with `python worker.py` to scale inference separately from
+the API (set JOB_WORKER_EMBEDDED=false on the API processes), or let each
+API process run one embedded worker (the default).
+"""
+
+import asyncio
+import signal
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from dotenv import load_dotenv
+
+# Load environment variables before the database package reads DATABASE_URL
+load_dotenv()
+
+from config import settings
+from database import SessionLocal, get_job_queue, init_db, shutdown_message_writer
+from database.job_queue import JobDeferred, JobQueue
+from journal import shutdown_reflection_scheduler
+from metrics import register_stats
+
+
+async def _analyze_message(payload: Dict):
+    """Handler for analyze_message jobs: NLP analysis plus persistence of one chat turn"""
+    from api.chat import perform_background_analysis_and_save
+    await perform_background_analysis_and_save(
+        payload["user_id"],
+        payload["conversation_id"],
+        payload["user_message"],
+        payload["ai_response"],
+        SessionLocal(),
+        turn_id=payload.get("turn_id")
+    )
+
+
+# Job type -> async handler taking the job payload
+JOB_HANDLERS: Dict[str, Callable[[Dict], Awaitable]] = {
+    "analyze_message": _analyze_message
+}
+
+
+class JobWorker:
+    """
+    Polling worker for the durable job queue
+    
+    Keeps up to batch_size jobs in flight, each as its own task, and claims
+    more as soon as one finishes, so a slow job only holds its own slot
+    (and its own conversation). The queue never hands out two jobs of the
+    same conversation at once. A handler that raises sends its job back
+    for a retry; one that raises JobDeferred reschedules it without using
+    up an attempt. Database calls run in a thread so the event loop stays
+    free for the handlers.
+    """
+    
+    def __init__(
+        self,
+        queue: JobQueue,
+        handlers: Optional[Dict[str, Callable[[Dict], Awaitable]]] = None,
+        batch_size: int = 16,
+        poll_seconds: float = 0.5
+    ):
+        """
+        Initialize the worker
+        
+        Args:
+            queue: Job queue to claim from
+            handlers: Job type -> async handler (default: JOB_HANDLERS)
+            batch_size: Maximum jobs in flight at once
+            poll_seconds: Wait between claims when the queue is empty
+        """
+        self.queue = queue
+        self.handlers = handlers or JOB_HANDLERS
+        self.batch_size = max(1, batch_size)
+        self.poll_seconds = poll_seconds
+        self._stopping: Optional[asyncio.Event] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._in_flight: Set[asyncio.Task] = set()
+        
+        # Stats
+        self.claims = 0
+        self.succeeded = 0
+        self.errors = 0
+        self.deferred = 0
+        self.running = 0
+    
+    async def run(self):
+        """Claim and process jobs until stop() is called"""
+        self._stopping = asyncio.Event()
+        self._wake = asyncio.Event()
+        print(f"Job worker started (max {self.batch_size} jobs in flight)")
+        while not self._stopping.is_set():
+            # A job finishing from here on wakes the wait below
+            self._wake.clear()
+            jobs = []
+            free = self.batch_size - len(self._in_flight)
+            if free > 0:
+                try:
+                    jobs = await asyncio.to_thread(self.queue.claim, free)
+                except Exception as e:
+                    print(f"Job claim failed: {e}")
+            
+            if jobs:
+                self.claims += 1
+                for job in jobs:
+                    task = asyncio.get_running_loop().create_task(self._process(job))
+                    self._in_flight.add(task)
+                    task.add_done_callback(self._job_done)
+            
+            # Queue drained or all slots busy: wait for a finished job, stop() or the poll interval
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+        
+        if self._in_flight:
+            await asyncio.gather(*list(self._in_flight), return_exceptions=True)
+        print("Job worker stopped")
+    
+    def stop(self):
+        """Stop claiming new jobs (jobs already claimed are finished)"""
+        if self._stopping is not None:
+            self._stopping.set()
+            self._wake.set()
+    
+    def get_stats(self) -> Dict:
+        """
+        Get worker statistics
+        
+        Returns:
+            Dictionary with claim, success, error and in-flight counts
+        """
+        return {
+            "batch_size": self.batch_size,
+            "claims": self.claims,
+            "succeeded": self.succeeded,
+            "errors": self.errors,
+            "deferred": self.deferred,
+            "running": self.running
+        }
+    
+    def _job_done(self, task: asyncio.Task):
+        """Free the finished job's slot and wake the claim loop"""
+        self._in_flight.discard(task)
+        self._wake.set()
+    
+    async def _process(self, job: Dict):
+        """Run one job and record the outcome in the queue"""
+        self.running += 1
+        try:
+            handler = self.handlers.get(job["kind"])
+            if handler is None:
+                raise ValueError(f"No handler for job kind {job['kind']}")
+            await handler(job["payload"])
+        except JobDeferred as e:
+            self.deferred += 1
+            await asyncio.to_thread(self.queue.defer, job, e.delay_seconds)
+        except Exception as e:
+            self.errors += 1
+            await asyncio.to_thread(self.queue.fail, job, f"{type(e).__name__}: {e}")
+        else:
+            self.succeeded += 1
+            await asyncio.to_thread(self.queue.complete, job)
+        finally:
+            self.running -= 1
+
+
+def create_worker() -> JobWorker:
+    """Create a worker from settings and register its stats"""
+    worker = JobWorker(
+        get_job_queue(),
+        batch_size=settings.JOB_WORKER_BATCH_SIZE,
+        poll_seconds=settings.JOB_WORKER_POLL_SECONDS
+    )
+    register_stats("job_worker", worker.get_stats)
+    return worker
+
+
+# Embedded worker (runs inside an API process)
+_embedded_worker: Optional[JobWorker] = None
+_embedded_task: Optional[asyncio.Task] = None
+
+def start_embedded_worker():
+    """Start a worker on the running event loop"""
+    global _embedded_worker, _embedded_task
+    if _embedded_worker is None:
+        _embedded_worker = create_worker()
+        _embedded_task = asyncio.get_running_loop().create_task(_embedded_worker.run())
+
+async def stop_embedded_worker():
+    """Stop the embedded worker and wait for its claimed jobs to finish"""
+    global _embedded_worker, _embedded_task
+    if _embedded_worker is not None:
+        _embedded_worker.stop()
+        await _embedded_task
+        _embedded_worker = None
+        _embedded_task = None
+
+
+async def main():
+    """Standalone worker entry point"""
+    init_db()
+    worker = create_worker()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, worker.stop)
+        except NotImplementedError:
+            pass  # Windows: fall back to KeyboardInterrupt
+    try:
+        await worker.run()
+        await shutdown_reflection_scheduler()
+    finally:
+        shutdown_message_writer()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())